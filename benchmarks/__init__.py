@@ -0,0 +1,5 @@
+"""
+Benchmarks for pathra_preshana
+
+Run from the repository root, e.g. python -m benchmarks.bench_templating
+"""
@@ -0,0 +1,93 @@
+"""
+Threads vs asyncio delivery backends at increasing concurrency
+
+Sends the same synthetic list through EmailSender and AsyncEmailSender with
+1, 16, 64 and 256 concurrent sessions against a local SMTP sink that holds
+each message for --latency seconds, as a remote provider would. Reports
+messages/sec and the peak number of threads in the process; the sink runs
+in-process with one thread per connection, so the sender's own threads are
+the count beyond the number of sessions.
+
+Usage:
+    python -m benchmarks.bench_backends --rows 2000 --latency 0.05 \\
+        --concurrency 1 16 64 256
+"""
+
+import argparse
+import contextlib
+import os
+import sys
+import threading
+import time
+from typing import Dict
+
+from benchmarks.smtp_sink import SMTPSink
+
+
+class ThreadCounter:
+    """Samples threading.active_count() in the background and keeps the peak"""
+
+    def __init__(self, interval: float = 0.01):
+        self.interval = interval
+        self.peak = threading.active_count()
+        self._stop = threading.Event()
+        self._thread = threading.Thread(target=self._run, name="thread-counter", daemon=True)
+
+    def _run(self) -> None:
+        while not self._stop.wait(self.interval):
+            # Not counting the sampler itself
+            self.peak = max(self.peak, threading.active_count() - 1)
+
+    def __enter__(self) -> "ThreadCounter":
+        self._thread.start()
+        return self
+
+    def __exit__(self, exc_type, exc, tb) -> None:
+        self._stop.set()
+        self._thread.join()
+
+
+def run_backend(backend: str, workers: int, rows: int, sink: SMTPSink) -> Dict:
+    from pathra_preshana.email_sender import create_email_sender
+
+    recipients = [{"name": f"Recipient {i}", "email": f"user{i}@example.com"} for i in range(rows)]
+    sender = create_email_sender(backend, smtp_server="127.0.0.1", smtp_port=sink.port, workers=workers)
+    with ThreadCounter() as threads:
+        start = time.perf_counter()
+        with open(os.devnull, "w") as devnull, contextlib.redirect_stdout(devnull):
+            summary = sender.send_bulk_emails(recipients, "Benchmark", "<p>Hello {name}</p>")
+        elapsed = time.perf_counter() - start
+    return {
+        "backend": backend,
+        "workers": workers,
+        "seconds": round(elapsed, 3),
+        "messages_per_sec": round((summary["success"] + summary["failed"]) / elapsed, 1),
+        "failed": summary["failed"],
+        "peak_threads": threads.peak,
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--rows", type=int, default=2000)
+    parser.add_argument("--latency", type=float, default=0.05, help="sink delay per message, seconds")
+    parser.add_argument("--concurrency", type=int, nargs="+", default=[1, 16, 64, 256])
+    parser.add_argument("--backends", nargs="+", choices=["threads", "async"], default=["threads", "async"])
+    args = parser.parse_args()
+
+    os.environ.setdefault("GMAIL_USER", "bench@example.com")
+    os.environ.setdefault("GMAIL_APP_PASSWORD", "bench")
+    # Retries and rate limits would measure the policies, not the backends
+    os.environ["SMTP_MAX_RETRIES"] = "0"
+
+    with SMTPSink(latency=args.latency) as sink:
+        for workers in args.concurrency:
+            for backend in args.backends:
+                run = run_backend(backend, workers, args.rows, sink)
+                print(f"{backend:>7}  sessions {workers:>4}  {run['messages_per_sec']:>8} msg/s  "
+                      f"{run['seconds']:>7}s  threads {run['peak_threads']:>4}  failed {run['failed']}")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
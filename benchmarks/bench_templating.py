@@ -0,0 +1,83 @@
+"""
+Microbenchmark: per-recipient template render cost
+
+Compares the old approach (one str.replace scan per placeholder per
+recipient) with CompiledTemplate.render.
+
+Usage:
+    python -m benchmarks.bench_templating [--rows 10000 1000000] [--template PATH]
+"""
+
+import argparse
+import time
+
+from pathra_preshana.file_reader import FileReader
+from pathra_preshana.templating import CompiledTemplate
+
+COLUMNS = ["name", "email", "company", "city"]
+
+
+def synthetic_rows(count: int):
+    for i in range(count):
+        yield {
+            "name": f"Recipient {i}",
+            "email": f"user{i}@example.com",
+            "company": f"Company {i % 997}",
+            "city": f"City {i % 101}",
+        }
+
+
+def personalize_template(html: str) -> str:
+    """Add a few extra placeholders so the comparison covers several columns"""
+    return html.replace("</body>", "<p>{company}, {city} ({email})</p></body>", 1)
+
+
+def bench_replace(html: str, rows: int) -> float:
+    start = time.perf_counter()
+    for row in synthetic_rows(rows):
+        content = html
+        for column in COLUMNS:
+            content = content.replace("{" + column + "}", row[column])
+    return time.perf_counter() - start
+
+
+def bench_compiled(html: str, rows: int, escape: bool) -> float:
+    start = time.perf_counter()
+    template = CompiledTemplate(html, escape=escape)
+    for row in synthetic_rows(rows):
+        template.render(row)
+    return time.perf_counter() - start
+
+
+def bench_baseline(rows: int) -> float:
+    """Cost of generating the synthetic rows alone, subtracted from each result"""
+    start = time.perf_counter()
+    for _ in synthetic_rows(rows):
+        pass
+    return time.perf_counter() - start
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--rows", type=int, nargs="+", default=[10_000, 1_000_000])
+    parser.add_argument("--template", default="templates/email_template.html")
+    args = parser.parse_args()
+
+    html = personalize_template(FileReader.read_html_template(args.template))
+    print(f"Template: {args.template} ({len(html)} chars, {len(CompiledTemplate(html).slot_fields)} slots)")
+    print(f"{'rows':>10}  {'method':<18} {'total s':>9} {'us/recipient':>13}")
+
+    for rows in args.rows:
+        baseline = bench_baseline(rows)
+        runs = [
+            ("str.replace", bench_replace(html, rows)),
+            ("compiled", bench_compiled(html, rows, escape=False)),
+            ("compiled+escape", bench_compiled(html, rows, escape=True)),
+        ]
+        for method, elapsed in runs:
+            per_recipient = max(0.0, elapsed - baseline) / rows * 1e6
+            print(f"{rows:>10}  {method:<18} {elapsed:>9.3f} {per_recipient:>13.2f}")
+
+
+if __name__ == "__main__":
+    main()
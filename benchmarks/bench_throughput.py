@@ -0,0 +1,214 @@
+"""
+End-to-end throughput benchmark against a local SMTP sink
+
+For each list size it measures, in a fresh process so peak RSS is per run:
+  - CSV reading (FileReader.iter_csv_recipients)
+  - template personalization (CompiledTemplate + MessageBuilder)
+  - delivery (EmailSender.send_bulk_emails, or AsyncEmailSender's with
+    --backend async) to an in-process SMTP stand-in with STARTTLS/AUTH,
+    configurable latency and error injection
+
+Results are written as JSON. With --baseline, the run fails if delivery
+throughput regressed by more than --tolerance.
+
+Usage:
+    python -m benchmarks.bench_throughput --sizes 1000 100000 1000000 \\
+        --workers 4 --latency 0.002 --output bench_results.json
+"""
+
+import argparse
+import contextlib
+import csv
+import json
+import multiprocessing
+import os
+import platform
+import resource
+import sys
+import tempfile
+import time
+from typing import Dict, List
+
+from benchmarks.smtp_sink import SMTPSink
+
+
+def write_synthetic_csv(path: str, rows: int) -> None:
+    with open(path, "w", encoding="utf-8", newline="") as file:
+        writer = csv.writer(file)
+        writer.writerow(["name", "email", "company"])
+        for i in range(rows):
+            writer.writerow([f"Recipient {i}", f"user{i}@example.com", f"Company {i % 997}"])
+
+
+def percentile(sorted_values: List[float], fraction: float) -> float:
+    if not sorted_values:
+        return 0.0
+    index = min(len(sorted_values) - 1, int(round(fraction * (len(sorted_values) - 1))))
+    return sorted_values[index]
+
+
+def peak_rss_mb() -> float:
+    # ru_maxrss is KiB on Linux and bytes on macOS
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    return peak / (1024 * 1024) if sys.platform == "darwin" else peak / 1024
+
+
+def run_scenario(options: Dict) -> Dict:
+    """Run every stage for one list size; executed in a child process"""
+    os.environ.setdefault("GMAIL_USER", "bench@example.com")
+    os.environ.setdefault("GMAIL_APP_PASSWORD", "bench")
+
+    from pathra_preshana.async_sender import AsyncEmailSender
+    from pathra_preshana.email_sender import EmailSender
+    from pathra_preshana.file_reader import FileReader
+    from pathra_preshana.message_builder import MessageBuilder
+    from pathra_preshana.templating import CompiledTemplate
+
+    rows = options["rows"]
+    result = {"rows": rows}
+
+    with tempfile.TemporaryDirectory(prefix="pathra-bench-") as directory:
+        csv_path = os.path.join(directory, "recipients.csv")
+        write_synthetic_csv(csv_path, rows)
+
+        # CSV reading
+        start = time.perf_counter()
+        count = sum(1 for _ in FileReader.iter_csv_recipients(csv_path))
+        elapsed = time.perf_counter() - start
+        result["csv_read"] = {"rows": count, "seconds": round(elapsed, 4), "rows_per_sec": round(count / elapsed)}
+
+        # Personalization: template render plus wire-format message assembly
+        html = FileReader.read_html_template(options["template"])
+        template = CompiledTemplate(html)
+        builder = MessageBuilder("bench@example.com", "Benchmark", template)
+        start = time.perf_counter()
+        for recipient in FileReader.iter_csv_recipients(csv_path):
+            builder.build(recipient)
+        elapsed = time.perf_counter() - start
+        result["personalize"] = {"seconds": round(elapsed, 4), "messages_per_sec": round(rows / elapsed)}
+
+        # Delivery
+        latencies: List[float] = []
+
+        class TimedSender(EmailSender):
+            def _send_one(self, session, builder, recipient):
+                begin = time.perf_counter()
+                outcome = super()._send_one(session, builder, recipient)
+                latencies.append(time.perf_counter() - begin)
+                return outcome
+
+        class TimedAsyncSender(AsyncEmailSender):
+            async def _send_one_async(self, session, recipient, to_addrs, message):
+                begin = time.perf_counter()
+                outcome = await super()._send_one_async(session, recipient, to_addrs, message)
+                latencies.append(time.perf_counter() - begin)
+                return outcome
+
+        with SMTPSink(
+            use_tls=not options["no_tls"],
+            latency=options["latency"],
+            error_rate=options["error_rate"],
+            error_code=options["error_code"],
+            max_messages_per_connection=options["server_max_per_connection"],
+        ) as sink:
+            sender_class = TimedAsyncSender if options["backend"] == "async" else TimedSender
+            sender = sender_class("127.0.0.1", sink.port, workers=options["workers"])
+            start = time.perf_counter()
+            with open(os.devnull, "w") as devnull, contextlib.redirect_stdout(devnull):
+                summary = sender.send_bulk_emails(FileReader.iter_csv_recipients(csv_path), "Benchmark", template)
+            elapsed = time.perf_counter() - start
+            sink_stats = sink.stats.snapshot()
+
+        latencies.sort()
+        delivered = summary["success"] + summary["failed"]
+        result["send"] = {
+            "backend": options["backend"],
+            "workers": options["workers"],
+            "seconds": round(elapsed, 4),
+            "messages_per_sec": round(delivered / elapsed, 1),
+            "latency_p50_ms": round(percentile(latencies, 0.50) * 1000, 3),
+            "latency_p99_ms": round(percentile(latencies, 0.99) * 1000, 3),
+            "success": summary["success"],
+            "failed": summary["failed"],
+            "sessions_opened": summary["sessions_opened"],
+            "handshakes_per_message": round(sink_stats["handshakes"] / max(1, sink_stats["messages"]), 5),
+            "connections": sink_stats["connections"],
+            "bytes_received": sink_stats["bytes_received"],
+        }
+
+    result["peak_rss_mb"] = round(peak_rss_mb(), 1)
+    return result
+
+
+def compare(results: List[Dict], baseline_path: str, tolerance: float) -> List[str]:
+    """Throughput regressions beyond tolerance, as human-readable lines"""
+    with open(baseline_path, "r", encoding="utf-8") as file:
+        baseline = {run["rows"]: run for run in json.load(file)["runs"]}
+
+    regressions = []
+    for run in results:
+        previous = baseline.get(run["rows"])
+        if not previous:
+            continue
+        for stage, metric in (("send", "messages_per_sec"), ("personalize", "messages_per_sec"),
+                              ("csv_read", "rows_per_sec")):
+            before, after = previous[stage][metric], run[stage][metric]
+            if before and after < before * (1 - tolerance):
+                regressions.append(f"{run['rows']} rows {stage}.{metric}: {before} -> {after}")
+    return regressions
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--sizes", type=int, nargs="+", default=[1_000, 100_000, 1_000_000])
+    parser.add_argument("--workers", type=int, default=1, help="concurrent SMTP sessions")
+    parser.add_argument("--backend", choices=["threads", "async"], default="threads",
+                        help="delivery backend (EMAIL_BACKEND)")
+    parser.add_argument("--latency", type=float, default=0.0, help="sink delay per message, seconds")
+    parser.add_argument("--error-rate", type=float, default=0.0, help="fraction of messages the sink rejects")
+    parser.add_argument("--error-code", type=int, default=451, help="reply code for rejected messages")
+    parser.add_argument("--server-max-per-connection", type=int, default=0,
+                        help="sink drops the connection after this many messages (0: never)")
+    parser.add_argument("--no-tls", action="store_true", help="disable STARTTLS on the sink")
+    parser.add_argument("--template", default="templates/email_template.html")
+    parser.add_argument("--output", default="bench_results.json")
+    parser.add_argument("--baseline", help="previous results file to compare against")
+    parser.add_argument("--tolerance", type=float, default=0.10, help="allowed fractional slowdown")
+    args = parser.parse_args()
+
+    runs = []
+    context = multiprocessing.get_context("spawn")
+    for rows in args.sizes:
+        options = dict(vars(args), rows=rows)
+        with context.Pool(1) as pool:
+            run = pool.apply(run_scenario, (options,))
+        send = run["send"]
+        print(f"{rows:>9} rows  csv {run['csv_read']['rows_per_sec']:>9}/s  "
+              f"render {run['personalize']['messages_per_sec']:>8}/s  "
+              f"send {send['messages_per_sec']:>8}/s  p50 {send['latency_p50_ms']}ms  "
+              f"p99 {send['latency_p99_ms']}ms  handshakes/msg {send['handshakes_per_message']}  "
+              f"rss {run['peak_rss_mb']}MB")
+        runs.append(run)
+
+    report = {
+        "created_at": time.strftime("%Y-%m-%dT%H:%M:%S%z"),
+        "python": platform.python_version(),
+        "platform": platform.platform(),
+        "options": {key: value for key, value in vars(args).items() if key not in ("output", "baseline")},
+        "runs": runs,
+    }
+    with open(args.output, "w", encoding="utf-8") as file:
+        json.dump(report, file, indent=2)
+    print(f"Results written to {args.output}")
+
+    if args.baseline:
+        regressions = compare(runs, args.baseline, args.tolerance)
+        for line in regressions:
+            print(f"REGRESSION {line}")
+        if regressions:
+            return 1
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,270 @@
+"""
+In-process SMTP stand-in for benchmarks
+
+Speaks enough ESMTP for smtplib: EHLO/HELO, STARTTLS, AUTH PLAIN/LOGIN,
+MAIL, RCPT, DATA, RSET, NOOP and QUIT. Latency and failures can be
+injected to model a slow or throttling provider.
+"""
+
+import functools
+import os
+import random
+import socketserver
+import ssl
+import subprocess
+import tempfile
+import threading
+import time
+from typing import Dict, Optional
+
+
+@functools.lru_cache(maxsize=None)
+def make_self_signed_context() -> Optional[ssl.SSLContext]:
+    """Create a server TLS context from a throwaway self-signed certificate"""
+    with tempfile.TemporaryDirectory(prefix="smtp-sink-") as directory:
+        cert_path = os.path.join(directory, "cert.pem")
+        key_path = os.path.join(directory, "key.pem")
+        try:
+            subprocess.run(
+                ["openssl", "req", "-x509", "-newkey", "rsa:2048", "-nodes", "-days", "1",
+                 "-subj", "/CN=localhost", "-keyout", key_path, "-out", cert_path],
+                check=True, stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL,
+            )
+        except (OSError, subprocess.CalledProcessError):
+            return None
+
+        context = ssl.SSLContext(ssl.PROTOCOL_TLS_SERVER)
+        context.load_cert_chain(cert_path, key_path)
+        return context
+
+
+class SinkStats:
+    """Counters shared by all sink connections"""
+
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.connections = 0
+        self.handshakes = 0
+        self.logins = 0
+        self.messages = 0
+        self.recipients = 0
+        self.bytes_received = 0
+        self.rejected = 0
+
+    def add(self, **counts) -> None:
+        with self.lock:
+            for name, value in counts.items():
+                setattr(self, name, getattr(self, name) + value)
+
+    def snapshot(self) -> Dict[str, int]:
+        with self.lock:
+            return {
+                "connections": self.connections,
+                "handshakes": self.handshakes,
+                "logins": self.logins,
+                "messages": self.messages,
+                "recipients": self.recipients,
+                "bytes_received": self.bytes_received,
+                "rejected": self.rejected,
+            }
+
+
+class _SinkHandler(socketserver.StreamRequestHandler):
+
+    # Replies to pipelined commands are written one by one; without
+    # TCP_NODELAY each would wait on the client's delayed ACK
+    disable_nagle_algorithm = True
+
+    def setup(self):
+        super().setup()
+        self.tls = False
+        self.messages_on_connection = 0
+
+    def reply(self, line: str) -> None:
+        self.wfile.write(line.encode("ascii") + b"\r\n")
+        self.wfile.flush()
+
+    def readline(self) -> Optional[str]:
+        line = self.rfile.readline(65536)
+        if not line:
+            return None
+        return line.decode("utf-8", "replace").rstrip("\r\n")
+
+    def handle(self):
+        server = self.server
+        server.stats.add(connections=1)
+        self.reply("220 localhost SMTP sink ready")
+        recipients = 0
+
+        while True:
+            line = self.readline()
+            if line is None:
+                return
+            verb, _, argument = line.partition(" ")
+            verb = verb.upper()
+
+            if verb in ("EHLO", "HELO"):
+                if verb == "HELO":
+                    self.reply("250 localhost")
+                    continue
+                extensions = ["localhost", "8BITMIME", "PIPELINING", "SIZE 104857600"]
+                if server.tls_context is not None and not self.tls:
+                    extensions.append("STARTTLS")
+                if self.tls or server.tls_context is None:
+                    extensions.append("AUTH PLAIN LOGIN")
+                lines = ["250-" + ext for ext in extensions[:-1]] + ["250 " + extensions[-1]]
+                for reply_line in lines:
+                    self.reply(reply_line)
+            elif verb == "STARTTLS":
+                if server.tls_context is None or self.tls:
+                    self.reply("502 STARTTLS not available")
+                    continue
+                self.reply("220 Ready to start TLS")
+                self.connection = server.tls_context.wrap_socket(self.connection, server_side=True)
+                self.rfile = self.connection.makefile("rb")
+                self.wfile = self.connection.makefile("wb")
+                self.tls = True
+                server.stats.add(handshakes=1)
+            elif verb == "AUTH":
+                mechanism = argument.split(" ")[0].upper()
+                if mechanism == "LOGIN" and len(argument.split(" ")) == 1:
+                    self.reply("334 VXNlcm5hbWU6")
+                    self.readline()
+                    self.reply("334 UGFzc3dvcmQ6")
+                    self.readline()
+                elif mechanism == "PLAIN" and len(argument.split(" ")) == 1:
+                    self.reply("334 ")
+                    self.readline()
+                server.stats.add(logins=1)
+                self.reply("235 Authentication successful")
+            elif verb == "MAIL":
+                recipients = 0
+                self.reply("250 OK")
+            elif verb == "RCPT":
+                code = server.pick_error("rcpt")
+                if code:
+                    server.stats.add(rejected=1)
+                    self.reply(f"{code} Recipient rejected")
+                    continue
+                recipients += 1
+                self.reply("250 OK")
+            elif verb == "DATA":
+                self.reply("354 End data with <CR><LF>.<CR><LF>")
+                size = 0
+                lines = [] if server.keep_messages else None
+                while True:
+                    data = self.rfile.readline(1 << 20)
+                    if not data:
+                        return
+                    if data == b".\r\n":
+                        break
+                    size += len(data)
+                    if lines is not None:
+                        lines.append(data[1:] if data.startswith(b"..") else data)
+                if server.latency:
+                    time.sleep(server.latency)
+                code = server.pick_error("data")
+                if code:
+                    server.stats.add(rejected=1)
+                    self.reply(f"{code} Message rejected")
+                    continue
+                server.stats.add(messages=1, recipients=recipients, bytes_received=size)
+                if lines is not None:
+                    with server.messages_lock:
+                        server.messages.append(b"".join(lines))
+                if server.pick_error("drop"):
+                    # The message was taken but the reply never arrives
+                    return
+                self.messages_on_connection += 1
+                self.reply("250 OK queued")
+                if server.max_messages_per_connection and \
+                        self.messages_on_connection >= server.max_messages_per_connection:
+                    return
+            elif verb == "RSET":
+                recipients = 0
+                self.reply("250 OK")
+            elif verb == "NOOP":
+                self.reply("250 OK")
+            elif verb == "QUIT":
+                self.reply("221 Bye")
+                return
+            else:
+                self.reply("502 Command not implemented")
+
+
+class SMTPSink(socketserver.ThreadingTCPServer):
+    """Threaded local SMTP server that accepts and (by default) discards mail"""
+
+    daemon_threads = True
+    allow_reuse_address = True
+    # Hundreds of sessions may connect at once; the default backlog of 5
+    # makes the kernel drop SYNs and the clients wait out retransmits
+    request_queue_size = 1024
+
+    def __init__(
+        self,
+        host: str = "127.0.0.1",
+        port: int = 0,
+        use_tls: bool = True,
+        latency: float = 0.0,
+        error_rate: float = 0.0,
+        error_code: int = 451,
+        error_phase: str = "data",
+        max_messages_per_connection: int = 0,
+        keep_messages: bool = False,
+    ):
+        """
+        Args:
+            host: Interface to bind
+            port: Port to bind; 0 picks a free port
+            use_tls: Offer STARTTLS with a self-signed certificate
+            latency: Seconds to sleep before acknowledging each DATA
+            error_rate: Fraction of messages answered with error_code
+            error_code: SMTP reply code used for injected failures
+            error_phase: Where failures are injected: 'rcpt', 'data', or
+                'drop' (accept the message, then hang up before replying)
+            max_messages_per_connection: Drop the connection after this
+                many messages (0 disables the cap)
+            keep_messages: Store received message bytes in self.messages
+        """
+        super().__init__((host, port), _SinkHandler)
+        self.tls_context = make_self_signed_context() if use_tls else None
+        self.latency = latency
+        self.error_rate = error_rate
+        self.error_code = error_code
+        self.error_phase = error_phase
+        self.max_messages_per_connection = max_messages_per_connection
+        self.stats = SinkStats()
+        self.keep_messages = keep_messages
+        self.messages = []
+        self.messages_lock = threading.Lock()
+        self._random = random.Random(1234)
+        self._random_lock = threading.Lock()
+        self._thread = None
+
+    @property
+    def port(self) -> int:
+        return self.server_address[1]
+
+    def pick_error(self, phase: str) -> int:
+        """Reply code to fail the current command with, or 0 to accept it"""
+        if not self.error_rate or phase != self.error_phase:
+            return 0
+        with self._random_lock:
+            failed = self._random.random() < self.error_rate
+        return self.error_code if failed else 0
+
+    def start(self) -> "SMTPSink":
+        self._thread = threading.Thread(target=self.serve_forever, daemon=True)
+        self._thread.start()
+        return self
+
+    def stop(self) -> None:
+        self.shutdown()
+        self.server_close()
+
+    def __enter__(self) -> "SMTPSink":
+        return self.start()
+
+    def __exit__(self, exc_type, exc, tb) -> None:
+        self.stop()
@@ -2,13 +2,32 @@
 Flask web application for Pathra Preshana email sender
 """
 
+import hmac
+import io
+import json
 import os
-from flask import Flask, render_template, request, jsonify, send_file, session, redirect, url_for
+import threading
+from itertools import islice
+from flask import (
+    Flask, Request, Response, render_template, request, jsonify, send_file, send_from_directory, session,
+    redirect, url_for, stream_with_context
+)
 from werkzeug.utils import secure_filename
 from dotenv import load_dotenv
 
-from pathra_preshana.email_sender import EmailSender
+from pathra_preshana import metrics
+from pathra_preshana.assets import ASSET_EXTENSIONS, ASSETS_DIR, asset_path, campaign_assets, cid_references
+from pathra_preshana.campaigns import dispatch_campaign, run_campaign
+from pathra_preshana.catalog import asset_catalog, recipient_catalog, template_catalog
+from pathra_preshana.delivery_report import iter_report, report_csv
+from pathra_preshana.email_sender import create_email_sender
 from pathra_preshana.file_reader import FileReader
+from pathra_preshana.ingest import CSVIngestError, CSVIngestor
+from pathra_preshana.jobs import JobManager
+from pathra_preshana.journal import make_campaign_id, owner_campaign_id
+from pathra_preshana.log import get_logger
+from pathra_preshana.scheduler import CampaignScheduler
+from pathra_preshana.templating import CompiledTemplate
 from pathra_preshana.auth import (
     login_required, 
     verify_google_token, 
@@ -20,38 +39,117 @@ from pathra_preshana.auth import (
 # Load environment variables
 load_dotenv()
 
+log = get_logger(__name__)
+
+# Largest accepted request, and largest recipient file once decompressed
+MAX_UPLOAD_MB = int(os.getenv('MAX_UPLOAD_MB', '512'))
+MAX_UPLOAD_UNCOMPRESSED_MB = int(os.getenv('MAX_UPLOAD_UNCOMPRESSED_MB', '2048'))
+
+CSV_SUFFIXES = ('.csv', '.csv.gz')
+
+
+class UploadRequest(Request):
+    """Request that ingests recipient CSV uploads while they are received"""
+    
+    def _get_file_stream(self, total_content_length, content_type, filename=None, content_length=None):
+        if self.path == '/api/upload' and filename and filename.lower().endswith(CSV_SUFFIXES):
+            ingestor = CSVIngestor(
+                'data',
+                compressed=filename.lower().endswith('.gz'),
+                max_bytes=MAX_UPLOAD_UNCOMPRESSED_MB * 1024 * 1024
+            )
+            # Kept so an upload cut short still has its temporary file removed
+            self.__dict__.setdefault('csv_ingestors', []).append(ingestor)
+            return ingestor
+        return super()._get_file_stream(total_content_length, content_type, filename, content_length)
+    
+    def close(self):
+        super().close()
+        for ingestor in self.__dict__.get('csv_ingestors', ()):
+            ingestor.close()
+
+
 app = Flask(__name__, template_folder='../templates')
+app.request_class = UploadRequest
 app.secret_key = os.environ.get('SECRET_KEY', os.urandom(24))
-app.config['MAX_CONTENT_LENGTH'] = 16 * 1024 * 1024  # 16MB max file size
+app.config['MAX_CONTENT_LENGTH'] = MAX_UPLOAD_MB * 1024 * 1024
 
 # Initialize authentication
 init_auth_module(app)
 
 ALLOWED_EXTENSIONS = {'html', 'csv'}
 
+# Bulk sends run outside the request threads: here, or on sender workers
+# with CAMPAIGN_DELIVERY=worker. The scheduler admits them by priority and
+# send window and shares the account between them
+campaign_jobs = JobManager()
+campaign_scheduler = CampaignScheduler(
+    campaign_jobs,
+    dispatch_campaign if os.getenv('CAMPAIGN_DELIVERY', 'web') == 'worker' else run_campaign
+)
+
+
+@app.before_request
+def start_campaign_scheduler():
+    """Resume scheduled campaigns once the app serves requests (not in the reloader's parent)"""
+    campaign_scheduler.start()
+
 
 def allowed_file(filename):
+    if filename.lower().endswith(('.csv.gz',) + ASSET_EXTENSIONS):
+        return True
     return '.' in filename and filename.rsplit('.', 1)[1].lower() in ALLOWED_EXTENSIONS
 
 
 def get_template_files():
     """Get list of HTML templates in templates directory"""
-    templates_dir = 'templates'
-    if not os.path.exists(templates_dir):
-        os.makedirs(templates_dir)
-    
-    files = [f for f in os.listdir(templates_dir) if f.endswith('.html')]
-    return files
+    return template_catalog.names()
 
 
 def get_recipient_files():
     """Get list of CSV files in data directory"""
-    data_dir = 'data'
-    if not os.path.exists(data_dir):
-        os.makedirs(data_dir)
+    return recipient_catalog.names()
+
+
+def parse_segment(data):
+    """
+    Read the optional segment of a recipient list from a request body
+    
+    Returns:
+        Tuple of (where, offset, limit): column = value filters or None,
+        matching recipients to skip, and the maximum to take or None
+    """
+    where = data.get('where') or None
+    if where is not None and (
+        not isinstance(where, dict)
+        or not all(isinstance(value, (str, int, float)) for value in where.values())
+    ):
+        raise ValueError('where must be an object of column: value pairs')
+    try:
+        offset = max(0, int(data.get('offset') or 0))
+        limit = data.get('limit')
+        limit = max(0, int(limit)) if limit is not None else None
+    except (TypeError, ValueError):
+        raise ValueError('offset and limit must be integers')
+    return where, offset, limit
+
+
+def catalog_response(catalog, key):
+    """
+    Serve a catalog listing, or 304 Not Modified if the client's ETag matches
     
-    files = [f for f in os.listdir(data_dir) if f.endswith('.csv')]
-    return files
+    The response keeps the bare name list under `key` for existing clients
+    and adds per-file metadata under 'files'.
+    """
+    etag, files = catalog.listing()
+    if etag in request.if_none_match:
+        response = Response(status=304)
+    else:
+        response = jsonify({key: [entry['name'] for entry in files], 'files': files})
+    response.set_etag(etag)
+    # Let browsers keep the listing but always revalidate it
+    response.headers['Cache-Control'] = 'no-cache'
+    return response
 
 
 @app.route('/')
@@ -65,26 +163,50 @@ def index():
 
 @app.route('/api/templates')
 def get_templates():
-    """Get list of available templates"""
-    templates = get_template_files()
-    return jsonify({'templates': templates})
+    """Get available templates with size, mtime and placeholders"""
+    return catalog_response(template_catalog, 'templates')
 
 
 @app.route('/api/recipients')
 def get_recipients():
-    """Get list of available recipient files"""
-    recipients = get_recipient_files()
-    return jsonify({'recipients': recipients})
+    """Get available recipient files with size, mtime, row count and columns"""
+    return catalog_response(recipient_catalog, 'recipients')
+
+
+@app.route('/api/assets')
+def get_assets():
+    """Get available images and attachments with size, mtime and content type"""
+    return catalog_response(asset_catalog, 'assets')
+
+
+@app.route('/api/assets/<name>')
+def get_asset(name):
+    """Serve an image or attachment, e.g. for template previews"""
+    try:
+        asset_path(name)
+    except ValueError as e:
+        return jsonify({'error': str(e)}), 400
+    return send_from_directory(os.path.abspath(ASSETS_DIR), name)
 
 
 @app.route('/api/upload', methods=['POST'])
 def upload_file():
-    """Handle file uploads for templates and recipients"""
-    if 'file' not in request.files:
+    """
+    Handle file uploads for templates, recipients and assets (inline images and attachments)
+    
+    Recipient CSVs (optionally .csv.gz) are validated while they stream in;
+    the first malformed row aborts the upload with its line number.
+    """
+    try:
+        files = request.files
+    except CSVIngestError as e:
+        return jsonify({'error': f'Invalid CSV file: {e}', 'line': e.line}), 400
+    
+    if 'file' not in files:
         return jsonify({'error': 'No file uploaded'}), 400
     
-    file = request.files['file']
-    file_type = request.form.get('type')  # 'template' or 'recipients'
+    file = files['file']
+    file_type = request.form.get('type')  # 'template', 'recipients' or 'asset'
     
     if file.filename == '':
         return jsonify({'error': 'No file selected'}), 400
@@ -98,23 +220,43 @@ def upload_file():
                 return jsonify({'error': 'Template must be a .html file'}), 400
             upload_dir = 'templates'
         elif file_type == 'recipients':
-            if not filename.endswith('.csv'):
-                return jsonify({'error': 'Recipients file must be a .csv file'}), 400
+            if not filename.endswith(CSV_SUFFIXES):
+                return jsonify({'error': 'Recipients file must be a .csv or .csv.gz file'}), 400
             upload_dir = 'data'
+        elif file_type == 'asset':
+            if not filename.lower().endswith(ASSET_EXTENSIONS):
+                return jsonify({'error': f"Assets must be one of: {', '.join(ASSET_EXTENSIONS)}"}), 400
+            upload_dir = ASSETS_DIR
         else:
             return jsonify({'error': 'Invalid file type specified'}), 400
         
         if not os.path.exists(upload_dir):
             os.makedirs(upload_dir)
         
-        filepath = os.path.join(upload_dir, filename)
-        file.save(filepath)
+        response = {'message': 'File uploaded successfully', 'type': file_type}
+        if isinstance(file.stream, CSVIngestor):
+            # Already on disk and validated; stored decompressed
+            filename = filename[:-len('.gz')] if filename.endswith('.gz') else filename
+            filepath = os.path.join(upload_dir, filename)
+            try:
+                summary = file.stream.commit(filepath)
+            except CSVIngestError as e:
+                return jsonify({'error': f'Invalid CSV file: {e}', 'line': e.line}), 400
+            # Converted in the background; until then reads fall back to the CSV
+            threading.Thread(
+                target=FileReader.build_recipient_store, args=(filepath,), name='recipient-store', daemon=True
+            ).start()
+            response['rows'] = summary['recipients']
+        else:
+            filepath = os.path.join(upload_dir, filename)
+            file.save(filepath)
         
-        return jsonify({
-            'message': 'File uploaded successfully',
-            'filename': filename,
-            'type': file_type
-        })
+        FileReader.invalidate(filepath)
+        catalogs = {'template': template_catalog, 'recipients': recipient_catalog, 'asset': asset_catalog}
+        catalogs[file_type].invalidate(filename)
+        
+        response['filename'] = filename
+        return jsonify(response)
     
     return jsonify({'error': 'Invalid file type'}), 400
 
@@ -124,50 +266,129 @@ def preview_template():
     """Preview HTML template with sample data"""
     data = request.json
     template_path = data.get('template_path')
+    recipients_path = data.get('recipients_path')
     
     if not template_path:
         return jsonify({'error': 'Template path required'}), 400
     
     try:
         file_reader = FileReader()
-        html_content = file_reader.read_html_template(template_path)
+        template = CompiledTemplate(file_reader.read_html_template(template_path))
         
-        # Replace {name} with sample data
-        preview_content = html_content.replace('{name}', 'John Doe')
+        # Fill {name} with sample data and show other placeholders as-is,
+        # or use the first recipient when a recipients file is given
+        sample = {field: '{' + field + '}' for field in template.fields}
+        sample['name'] = 'John Doe'
+        if recipients_path:
+            sample.update(next(file_reader.iter_csv_recipients(recipients_path), {}))
+        preview_content = template.render(sample)
+        # Inline images (cid:logo.png) are shown from the assets directory
+        for content_id in cid_references(template):
+            preview_content = preview_content.replace(
+                f'cid:{content_id}', url_for('get_asset', name=content_id)
+            )
         
-        return jsonify({'html': preview_content})
+        return jsonify({'html': preview_content, 'fields': template.fields})
     except Exception as e:
         return jsonify({'error': str(e)}), 500
 
 
 @app.route('/api/recipients-data', methods=['POST'])
 def get_recipients_data():
-    """Get recipients data from CSV file"""
+    """
+    Get recipients data from CSV file
+    
+    Optional body fields:
+        where: only recipients whose columns equal these values, e.g. {"city": "Pune"}
+        offset, limit: return one page plus 'next_offset' (null on the last page)
+        include_count: add the total 'count' to a page (scans the file once)
+        count_only: return only the recipient count, without building rows
+        format: 'ndjson' to stream one recipient per line instead of JSON
+    """
     data = request.json
     csv_path = data.get('csv_path')
     
     if not csv_path:
         return jsonify({'error': 'CSV path required'}), 400
     
+    try:
+        where, offset, limit = parse_segment(data)
+    except ValueError as e:
+        return jsonify({'error': str(e)}), 400
+    
     try:
         file_reader = FileReader()
-        recipients = file_reader.read_csv_recipients(csv_path)
         
-        return jsonify({
+        if data.get('format') == 'ndjson':
+            if where:
+                recipients = file_reader.select_csv_recipients(csv_path, where, offset, limit)
+            else:
+                end = offset + limit if limit is not None else None
+                recipients = islice(file_reader.iter_csv_recipients(csv_path), offset, end)
+            
+            def generate():
+                for recipient in recipients:
+                    yield json.dumps(recipient) + '\n'
+            
+            return Response(stream_with_context(generate()), mimetype='application/x-ndjson')
+        
+        if data.get('count_only'):
+            return jsonify({'count': file_reader.count_csv_recipients(csv_path, where)})
+        
+        if limit is None:
+            if where:
+                recipients = list(file_reader.select_csv_recipients(csv_path, where, offset))
+            else:
+                recipients = file_reader.read_csv_recipients(csv_path)[offset:]
+            return jsonify({
+                'recipients': recipients,
+                'count': len(recipients)
+            })
+        
+        # Read one extra row to learn whether there is a next page, so the
+        # first page never waits for the whole file to be scanned
+        recipients = file_reader.read_csv_recipient_page(csv_path, offset, limit + 1, where=where)
+        has_more = len(recipients) > limit
+        recipients = recipients[:limit]
+        
+        response = {
             'recipients': recipients,
-            'count': len(recipients)
-        })
+            'offset': offset,
+            'limit': limit,
+            'next_offset': offset + limit if has_more else None
+        }
+        if data.get('include_count'):
+            response['count'] = file_reader.count_csv_recipients(csv_path, where)
+        return jsonify(response)
+    except ValueError as e:
+        return jsonify({'error': str(e)}), 400
     except Exception as e:
         return jsonify({'error': str(e)}), 500
 
 
+@app.route('/api/cache/stats')
+@login_required
+def cache_stats():
+    """File cache hit/miss counters"""
+    return jsonify(FileReader.cache_stats())
+
+
+@app.route('/metrics')
+def prometheus_metrics():
+    """Delivery metrics in Prometheus text format; bearer METRICS_TOKEN required when set"""
+    token = os.getenv('METRICS_TOKEN', '')
+    if token:
+        supplied = request.headers.get('Authorization', '')
+        if not hmac.compare_digest(supplied.encode(), f'Bearer {token}'.encode()):
+            return jsonify({'error': 'Invalid token'}), 401
+    return Response(metrics.REGISTRY.render(), mimetype='text/plain; version=0.0.4')
+
+
 @app.route('/login')
 def login():
     """Login page"""
     client_id = os.getenv('GOOGLE_CLIENT_ID', '')
-    print(f"GOOGLE_CLIENT_ID from env: {'SET' if client_id else 'NOT SET'}")
-    if client_id:
-        print(f"Client ID: {client_id[:30]}...")
+    log.debug("Login page", extra={'google_client_id': f"{client_id[:30]}..." if client_id else 'NOT SET'})
     return render_template('login.html', google_client_id=client_id)
 
 @app.route('/logout')
@@ -191,7 +412,7 @@ def google_auth_callback():
         data = request.json
         token = data.get('credential')  # Google ID token
         
-        print(f"Received token: {token[:50] if token else 'None'}...")
+        log.debug("Received Google credential", extra={'present': bool(token)})
         
         if not token:
             return jsonify({'error': 'No credential provided'}), 400
@@ -205,20 +426,18 @@ def google_auth_callback():
             session['user_name'] = user_info['name']
             session['user_picture'] = user_info.get('picture', '')
             
-            print(f"Authentication successful for: {user_info['email']}")
+            log.info("Authentication successful", extra={'email': user_info['email']})
             
             return jsonify({
                 'success': True,
                 'user': user_info
             })
         else:
-            print("Authentication failed: Invalid token or verification error")
+            log.warning("Authentication failed: invalid token or verification error")
             return jsonify({'error': 'Invalid token'}), 401
             
     except Exception as e:
-        print(f"Exception in google_auth_callback: {e}")
-        import traceback
-        traceback.print_exc()
+        log.exception("Exception in google_auth_callback")
         return jsonify({'error': str(e)}), 500
 
 @app.route('/api/auth/status')
@@ -233,7 +452,7 @@ def auth_status():
 @app.route('/api/send', methods=['POST'])
 @login_required
 def send_emails():
-    """Send emails to recipients"""
+    """Queue a campaign for background sending and return its job id"""
     data = request.json
     template_path = data.get('template_path')
     recipients_path = data.get('recipients_path')
@@ -243,32 +462,171 @@ def send_emails():
         return jsonify({'error': 'Template and recipients paths required'}), 400
     
     try:
-        # Read template
+        # Compile the template once and check its placeholders against the CSV columns
         file_reader = FileReader()
-        html_template = file_reader.read_html_template(template_path)
+        html_template = CompiledTemplate(
+            file_reader.read_html_template(template_path),
+            escape=bool(data.get('escape_values', False))
+        )
+        try:
+            html_template.validate(file_reader.read_csv_columns(recipients_path))
+        except ValueError as e:
+            return jsonify({'error': str(e)}), 400
         
-        # Read recipients
-        recipients = file_reader.read_csv_recipients(recipients_path)
+        # An optional segment (filters and/or a slice) sends to part of the list
+        try:
+            where, offset, limit = parse_segment(data)
+            segmented = bool(where) or offset > 0 or limit is not None
+            
+            # Count recipients cheaply; the rows themselves are streamed while sending
+            total = max(0, file_reader.count_csv_recipients(recipients_path, where) - offset)
+        except ValueError as e:
+            return jsonify({'error': str(e)}), 400
+        if limit is not None:
+            total = min(total, limit)
         
-        if not recipients:
+        if not total:
             return jsonify({'error': 'No recipients found'}), 400
         
-        # Send emails
-        email_sender = EmailSender()
-        results = email_sender.send_bulk_emails(
-            recipients=recipients,
-            subject=subject,
-            html_template=html_template
-        )
+        # Inline images the template references (cid:...) and attachments,
+        # encoded once and shared by every message
+        attachments = data.get('attachments') or []
+        if not isinstance(attachments, list):
+            return jsonify({'error': 'attachments must be a list of asset file names'}), 400
+        try:
+            assets = campaign_assets(html_template, attachments)
+        except (FileNotFoundError, ValueError) as e:
+            return jsonify({'error': str(e)}), 400
+        
+        # Create the sender now so configuration errors are reported immediately
+        create_email_sender()
+        
+        # Every outcome is journaled; re-sending with resume=true skips
+        # recipients who already received the same campaign
+        campaign_parts = [template_path, recipients_path, subject]
+        if segmented:
+            campaign_parts.append(json.dumps({'where': where, 'offset': offset, 'limit': limit}, sort_keys=True))
+        campaign_id = data.get('campaign_id') or make_campaign_id(*campaign_parts)
+        if not isinstance(campaign_id, str):
+            return jsonify({'error': 'campaign_id must be a string'}), 400
+        # Journal entries are per user: another user's (or a reused) id never
+        # makes this campaign skip recipients as already sent
+        campaign_id = owner_campaign_id(session.get('user_email'), campaign_id)
+        
+        # The scheduler persists this and rebuilds the send from it, also after a restart
+        spec = {
+            'template_path': template_path,
+            'recipients_path': recipients_path,
+            'subject': subject,
+            'escape_values': bool(data.get('escape_values', False)),
+            'where': where,
+            'offset': offset,
+            'limit': limit,
+            'attachments': attachments,
+            'campaign_id': campaign_id,
+            'resume': bool(data.get('resume', False)),
+        }
+        try:
+            job = campaign_scheduler.submit(
+                spec,
+                total=total,
+                owner=session.get('user_email'),
+                priority=data.get('priority') or 'normal',
+                window=data.get('window') or None
+            )
+        except ValueError as e:
+            return jsonify({'error': str(e)}), 400
         
         return jsonify({
             'success': True,
-            'results': results
-        })
+            'job_id': job.job_id,
+            'campaign_id': campaign_id,
+            'status_url': url_for('get_job', job_id=job.job_id)
+        }), 202
     except Exception as e:
         return jsonify({'error': str(e)}), 500
 
 
+def get_owned_job(job_id):
+    """Get a campaign job if it belongs to the current user"""
+    job = campaign_jobs.get(job_id)
+    if job is None or job.owner != session.get('user_email'):
+        return None
+    return job
+
+
+@app.route('/api/jobs')
+@login_required
+def list_jobs():
+    """List the current user's campaign jobs"""
+    jobs = campaign_jobs.list(owner=session.get('user_email'))
+    return jsonify({'jobs': [job.progress() for job in jobs]})
+
+
+@app.route('/api/jobs/<job_id>')
+@login_required
+def get_job(job_id):
+    """Get live progress of a campaign job"""
+    job = get_owned_job(job_id)
+    if job is None:
+        return jsonify({'error': 'Job not found'}), 404
+    return jsonify(job.progress())
+
+
+@app.route('/api/jobs/<job_id>/rejections')
+@login_required
+def get_job_rejections(job_id):
+    """Download the recipients a campaign rejected before sending, as CSV"""
+    job = get_owned_job(job_id)
+    if job is None or job.validator is None:
+        return jsonify({'error': 'Job not found'}), 404
+    
+    report = io.StringIO()
+    job.validator.write_report(report)
+    return Response(
+        report.getvalue(),
+        mimetype='text/csv',
+        headers={'Content-Disposition': f'attachment; filename=rejected-{job_id}.csv'}
+    )
+
+
+@app.route('/api/jobs/<job_id>/report')
+@login_required
+def get_job_report(job_id):
+    """Download a campaign's per-recipient delivery report, as CSV or (format=jsonl) JSON lines"""
+    job = get_owned_job(job_id)
+    if job is None:
+        return jsonify({'error': 'Job not found'}), 404
+    
+    report_format = request.args.get('format', 'csv')
+    rows = iter_report(job_id)
+    if report_format == 'jsonl':
+        body = (json.dumps(row, ensure_ascii=False) + '\n' for row in rows)
+        mimetype = 'application/x-ndjson'
+    elif report_format == 'csv':
+        body = report_csv(rows)
+        mimetype = 'text/csv'
+    else:
+        return jsonify({'error': 'format must be csv or jsonl'}), 400
+    return Response(
+        stream_with_context(body),
+        mimetype=mimetype,
+        headers={'Content-Disposition': f'attachment; filename=delivery-{job_id}.{report_format}'}
+    )
+
+
+@app.route('/api/jobs/<job_id>/cancel', methods=['POST'])
+@login_required
+def cancel_job(job_id):
+    """Cancel a running, paused or queued campaign job"""
+    job = get_owned_job(job_id)
+    if job is None:
+        return jsonify({'error': 'Job not found'}), 404
+    if not campaign_scheduler.cancel(job_id):
+        return jsonify({'error': 'Job already finished'}), 409
+    return jsonify({'success': True, 'job_id': job_id})
+
+
 if __name__ == '__main__':
     # Use PORT environment variable if available (for production)
     port = int(os.environ.get('PORT', 5001))
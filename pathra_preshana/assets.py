@@ -0,0 +1,144 @@
+"""
+Inline images and attachments shared by every message of a campaign
+
+Each file is read and base64-encoded once into a complete MIME part; the
+message builder then splices the same bytes into every recipient's message.
+"""
+
+import base64
+import mimetypes
+import os
+import re
+from email.utils import encode_rfc2231
+from typing import Iterable, List, Optional, Union
+
+from pathra_preshana.file_reader import file_cache
+from pathra_preshana.templating import CompiledTemplate
+
+ASSETS_DIR = "assets"
+
+# File types accepted as images or attachments
+ASSET_EXTENSIONS = (
+    ".png", ".jpg", ".jpeg", ".gif", ".webp", ".pdf", ".txt", ".ics",
+    ".doc", ".docx", ".xls", ".xlsx", ".ppt", ".pptx", ".zip",
+)
+
+# Encoded size of all of a campaign's assets; providers reject larger messages
+MAX_ASSETS_BYTES = int(os.getenv("MAX_ATTACHMENTS_MB", "20")) * 1024 * 1024
+
+# src="cid:logo.png", url(cid:logo.png)
+_CID_REFERENCE = re.compile(r"""cid:([^"'\s)>]+)""", re.IGNORECASE)
+
+
+class Asset:
+    """One file encoded as a MIME part; part is shared, read-only, by every message"""
+
+    __slots__ = ("filename", "content_type", "content_id", "part")
+
+    def __init__(self, filename: str, content_type: str, content_id: Optional[str], part: bytes):
+        self.filename = filename
+        self.content_type = content_type
+        self.content_id = content_id
+        self.part = part
+
+    @property
+    def inline(self) -> bool:
+        return self.content_id is not None
+
+
+def _parameter(name: str, value: str) -> str:
+    if value.isascii() and '"' not in value and "\\" not in value:
+        return f'{name}="{value}"'
+    return f"{name}*={encode_rfc2231(value, 'utf-8')}"
+
+
+def encode_asset(path: str, content_id: Optional[str] = None) -> Asset:
+    """
+    Read a file and encode it as a base64 MIME part
+
+    Args:
+        path: File to encode
+        content_id: Content-ID for an inline image referenced as cid:<id>;
+            None makes it an attachment
+
+    Returns:
+        Asset holding the part's headers and wrapped base64 body
+    """
+    filename = os.path.basename(path)
+    content_type = mimetypes.guess_type(filename)[0] or "application/octet-stream"
+    with open(path, "rb") as file:
+        data = file.read()
+
+    headers = [
+        f"Content-Type: {content_type}; {_parameter('name', filename)}",
+        "Content-Transfer-Encoding: base64",
+    ]
+    if content_id is not None:
+        headers.append(f"Content-ID: <{content_id}>")
+    headers.append(f"Content-Disposition: {'inline' if content_id is not None else 'attachment'}; "
+                   f"{_parameter('filename', filename)}")
+    # encodebytes wraps at 76 characters; SMTP wants CRLF line endings
+    body = base64.encodebytes(data).replace(b"\n", b"\r\n")
+    part = ("\r\n".join(headers) + "\r\n\r\n").encode("ascii") + body
+    return Asset(filename, content_type, content_id, part)
+
+
+def load_asset(path: str, content_id: Optional[str] = None) -> Asset:
+    """encode_asset through the file cache, so an unchanged file is encoded only once"""
+    kind = f"asset-cid:{content_id}" if content_id is not None else "asset"
+    # base64 grows the data by a third
+    return file_cache.get(kind, path, lambda file_path: encode_asset(file_path, content_id), weight_factor=1.4)
+
+
+def cid_references(html: Union[str, CompiledTemplate]) -> List[str]:
+    """Content-IDs referenced by a template (cid:...), in order of first use"""
+    if isinstance(html, CompiledTemplate):
+        html = "".join(html.segments)
+    return list(dict.fromkeys(_CID_REFERENCE.findall(html)))
+
+
+def asset_path(name: str, directory: str = ASSETS_DIR) -> str:
+    """Path of an asset by file name; names cannot point outside the directory"""
+    filename = os.path.basename(name)
+    if not filename or filename != name or filename.startswith("."):
+        raise ValueError(f"Invalid asset name: {name}")
+    return os.path.join(directory, filename)
+
+
+def campaign_assets(template: Union[str, CompiledTemplate], attachments: Iterable[str] = (),
+                    directory: str = ASSETS_DIR) -> List[Asset]:
+    """
+    Inline images a template references and the requested attachments
+
+    Every cid:<name> in the template must name a file in the assets
+    directory; it is embedded with Content-ID <name>.
+
+    Args:
+        template: HTML template, or CompiledTemplate
+        attachments: File names in the assets directory to attach
+        directory: Assets directory
+
+    Returns:
+        List of Asset, inline images first
+
+    Raises:
+        FileNotFoundError: A referenced image or attachment is missing
+        ValueError: An invalid name, or assets over MAX_ATTACHMENTS_MB
+    """
+    assets = []
+    for content_id in cid_references(template):
+        path = asset_path(content_id, directory)
+        if not os.path.isfile(path):
+            raise FileNotFoundError(f"Inline image cid:{content_id} is not in {directory}/")
+        assets.append(load_asset(path, content_id))
+    for name in dict.fromkeys(attachments):
+        path = asset_path(name, directory)
+        if not os.path.isfile(path):
+            raise FileNotFoundError(f"Attachment {name} is not in {directory}/")
+        assets.append(load_asset(path))
+
+    total = sum(len(asset.part) for asset in assets)
+    if total > MAX_ASSETS_BYTES:
+        raise ValueError(f"Images and attachments add {total // (1024 * 1024)} MB to every message "
+                         f"(limit {MAX_ASSETS_BYTES // (1024 * 1024)} MB)")
+    return assets
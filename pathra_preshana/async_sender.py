@@ -0,0 +1,319 @@
+"""
+Asyncio email sending backend
+
+Drives many SMTP sessions from a single event loop instead of one thread
+per session. Reading recipients, journal lookups and MIME building run in
+a worker thread, a chunk at a time, so the loop only moves bytes.
+"""
+
+import asyncio
+import smtplib
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from itertools import islice
+from typing import Any, Callable, Dict, Iterable, List, Optional, Sequence, Tuple, Union
+
+from pathra_preshana import metrics
+from pathra_preshana.assets import Asset
+from pathra_preshana.async_smtp import AsyncSMTPSession
+from pathra_preshana.email_sender import EmailSender, _batched, _BulkCampaign
+from pathra_preshana.journal import SendJournal
+from pathra_preshana.message_builder import MessageBuilder
+from pathra_preshana.retry import is_throttling
+from pathra_preshana.templating import CompiledTemplate, compile_template
+
+# Recipients read, prechecked and built per trip to the worker thread
+PREPARE_CHUNK = 64
+
+# Longest a waiting retry goes without checking for cancellation
+POLL_INTERVAL = 0.2
+
+_DEFERRED = object()
+_SKIPPED = object()
+
+
+class AsyncEmailSender(EmailSender):
+    """
+    EmailSender backed by asyncio; self.workers sessions share one event loop
+
+    send_email and send_bulk_emails keep the blocking contract (they run
+    their own event loop); code already inside a loop should await
+    send_email_async and send_bulk_emails_async instead.
+    """
+
+    def open_session(self) -> AsyncSMTPSession:
+        """
+        Create a reusable asyncio SMTP session for this sender
+
+        Returns:
+            AsyncSMTPSession bound to this sender's server and credentials
+        """
+        return AsyncSMTPSession(
+            self.smtp_server,
+            self.smtp_port,
+            self.sender_email,
+            self.sender_password,
+            max_messages_per_connection=self.max_messages_per_connection
+        )
+
+    def send_email(self, recipient_email: str, recipient_name: str, subject: str, html_content: str,
+                   session: Optional[AsyncSMTPSession] = None) -> bool:
+        """Blocking wrapper around send_email_async; sessions cannot be shared between calls"""
+        if session is not None:
+            raise ValueError("Reusing a session requires send_email_async")
+        return asyncio.run(self.send_email_async(recipient_email, recipient_name, subject, html_content))
+
+    async def send_email_async(self, recipient_email: str, recipient_name: str, subject: str, html_content: str,
+                               session: Optional[AsyncSMTPSession] = None) -> bool:
+        """
+        Send an email to a single recipient
+
+        Args:
+            recipient_email: Email address of recipient
+            recipient_name: Name of recipient
+            subject: Email subject line
+            html_content: HTML formatted email content
+            session: Optional AsyncSMTPSession to reuse; a one-off
+                connection is used when omitted
+
+        Returns:
+            bool: True if email sent successfully, False otherwise
+        """
+        builder = MessageBuilder(self.sender_email, subject, CompiledTemplate.literal(html_content))
+        recipient = {"email": recipient_email, "name": recipient_name}
+        to_addrs, message = builder.build(recipient)
+
+        if session is not None:
+            result = await self._send_one_async(session, recipient, to_addrs, message)
+        else:
+            async with self.open_session() as one_off_session:
+                result = await self._send_one_async(one_off_session, recipient, to_addrs, message)
+        return result["status"] == "sent"
+
+    async def _send_one_async(self, session: AsyncSMTPSession, recipient: Dict[str, str],
+                              to_addrs: List[str], message: bytes) -> Dict[str, Any]:
+        started = time.perf_counter()
+        try:
+            await session.sendmail(self.sender_email, to_addrs, message)
+        except Exception as e:
+            return self._settle_one(recipient, e, time.perf_counter() - started)
+        return self._settle_one(recipient, latency=time.perf_counter() - started)
+
+    async def _send_shared_async(self, session: AsyncSMTPSession, batch, message: bytes) -> Dict[str, Any]:
+        # The shared message never names its recipients, so a retry of the
+        # still-pending ones reuses the same bytes
+        to_addrs = [recipient["email"] for recipient in batch.pending]
+        started = time.perf_counter()
+        try:
+            refused = await session.sendmail(self.sender_email, to_addrs, message)
+        except smtplib.SMTPRecipientsRefused as e:
+            return self._settle_shared(batch, e.recipients, latency=time.perf_counter() - started)
+        except Exception as e:
+            return self._settle_shared(batch, error=e, latency=time.perf_counter() - started)
+        return self._settle_shared(batch, refused, latency=time.perf_counter() - started)
+
+    def send_bulk_emails(self, recipients: Iterable[Dict[str, str]], subject: str,
+                         html_template: Union[str, CompiledTemplate],
+                         on_result: Optional[Callable[[Dict[str, str]], None]] = None,
+                         cancel_event: Optional[threading.Event] = None,
+                         journal: Optional[SendJournal] = None, campaign_id: Optional[str] = None,
+                         resume: bool = False, assets: Sequence[Asset] = ()) -> Dict[str, int]:
+        """Blocking wrapper around send_bulk_emails_async, with the same contract as EmailSender's"""
+        return asyncio.run(self.send_bulk_emails_async(
+            recipients, subject, html_template, on_result=on_result, cancel_event=cancel_event,
+            journal=journal, campaign_id=campaign_id, resume=resume, assets=assets
+        ))
+
+    async def send_bulk_emails_async(self, recipients: Iterable[Dict[str, str]], subject: str,
+                                     html_template: Union[str, CompiledTemplate],
+                                     on_result: Optional[Callable[[Dict[str, str]], None]] = None,
+                                     cancel_event: Optional[threading.Event] = None,
+                                     journal: Optional[SendJournal] = None, campaign_id: Optional[str] = None,
+                                     resume: bool = False, assets: Sequence[Asset] = ()) -> Dict[str, int]:
+        """
+        Send emails to multiple recipients over self.workers concurrent sessions
+
+        Arguments, results and retry, batching and rate limiting behaviour
+        are those of EmailSender.send_bulk_emails.
+        """
+        loop = asyncio.get_running_loop()
+        template = compile_template(html_template)
+        builder = MessageBuilder(self.sender_email, subject, template, assets)
+        campaign = _BulkCampaign(on_result, journal, campaign_id, resume)
+        shared = template.is_static and self.max_recipients_per_message > 1
+        tasks = iter(_batched(recipients, self.max_recipients_per_message, self.rate_limiter)
+                     if shared else recipients)
+        precheck = None
+        if campaign.resuming:
+            precheck = campaign.already_sent_batch if shared else campaign.already_sent
+
+        sessions = max(1, self.workers)
+        window = asyncio.Semaphore(sessions * 8)
+        work: "asyncio.Queue" = asyncio.Queue()
+        retry_policy = self.retry_policy
+        limiter = self.rate_limiter
+        pending: Dict[int, Any] = {}
+        state = {"next_seq": 0, "outstanding": 0, "fed": False}
+        sessions_opened = [0] * sessions
+        retry_tasks = set()
+
+        def cancelled() -> bool:
+            return cancel_event is not None and cancel_event.is_set()
+
+        def prepare(start: int) -> List[Tuple[int, Any, Any, Optional[Dict]]]:
+            """Worker thread: read, precheck and build the next chunk of tasks"""
+            prepared = []
+            for seq, task in enumerate(islice(tasks, PREPARE_CHUNK), start):
+                result = precheck(task) if precheck else None
+                if result is not None:
+                    prepared.append((seq, task, None, result))
+                    continue
+                try:
+                    with metrics.render_seconds.time():
+                        payload = builder.build_shared(task.pending)[1] if shared else builder.build(task)
+                except Exception as e:
+                    payload = e
+                prepared.append((seq, task, payload, None))
+            return prepared
+
+        def emit_in_order(seq: int, outcome: Any) -> None:
+            pending[seq] = outcome
+            while state["next_seq"] in pending:
+                result = pending.pop(state["next_seq"])
+                state["next_seq"] += 1
+                window.release()
+                if result is not _DEFERRED and result is not _SKIPPED:
+                    campaign.record(result)
+
+        def finish_one() -> None:
+            state["outstanding"] -= 1
+            if state["fed"] and not state["outstanding"]:
+                for _ in range(sessions):
+                    work.put_nowait(None)
+
+        async def retry_later(item, result) -> None:
+            seq, task, attempt, payload = item
+            remaining = retry_policy.delay(attempt)
+            while remaining > 0 and not cancelled():
+                await asyncio.sleep(min(remaining, POLL_INTERVAL))
+                remaining -= POLL_INTERVAL
+            if cancelled():
+                campaign.record(result)
+                finish_one()
+            else:
+                work.put_nowait((seq, task, attempt + 1, payload, result))
+
+        def settle(seq, task, attempt, payload, result, is_retry) -> None:
+            if limiter is not None:
+                if result["status"] == "sent":
+                    limiter.succeeded()
+                elif is_throttling(result):
+                    limiter.throttled()
+
+            if not cancelled() and retry_policy.should_retry(result, attempt):
+                metrics.retries.inc()
+                retry = asyncio.ensure_future(retry_later((seq, task, attempt, payload), result))
+                retry_tasks.add(retry)
+                retry.add_done_callback(retry_tasks.discard)
+                if not is_retry:
+                    emit_in_order(seq, _DEFERRED)
+                return
+
+            if is_retry:
+                campaign.record(result)
+            else:
+                emit_in_order(seq, result)
+            finish_one()
+
+        async def attempt_delivery(session, task, attempt, payload) -> Optional[Dict]:
+            count = len(task.pending) if shared else 1
+            if getattr(limiter, "blocking", False):
+                # Limiters shared between campaigns wait for a turn; do it off the loop
+                wait = 0.0 if await loop.run_in_executor(None, limiter.acquire, count) else None
+                if wait is not None and cancelled():
+                    return None
+            else:
+                wait = limiter.reserve(count) if limiter is not None else 0.0
+            if wait is None:
+                result = campaign.reject_batch(task, "Daily sending quota exhausted") if shared \
+                    else campaign.reject(task, "Daily sending quota exhausted")
+            else:
+                if wait:
+                    await asyncio.sleep(wait)
+                if isinstance(payload, Exception):
+                    result = self._settle_shared(task, error=payload) if shared else self._settle_one(task, payload)
+                elif shared:
+                    result = await self._send_shared_async(session, task, payload)
+                else:
+                    result = await self._send_one_async(session, task, payload[0], payload[1])
+            result["attempts"] = attempt
+            return result
+
+        async def run_session(index: int) -> None:
+            async with self.open_session() as session:
+                try:
+                    while True:
+                        item = await work.get()
+                        if item is None:
+                            return
+                        seq, task, attempt, payload, last = item
+                        is_retry = last is not None
+                        result = None if cancelled() else await attempt_delivery(session, task, attempt, payload)
+                        if result is None:
+                            # Cancelled; a cancelled retry still reports its last failure
+                            if is_retry:
+                                campaign.record(last)
+                            else:
+                                emit_in_order(seq, _SKIPPED)
+                            finish_one()
+                            continue
+                        settle(seq, task, attempt, payload, result, is_retry)
+                finally:
+                    sessions_opened[index] = session.sessions_opened
+
+        async def feed(executor) -> None:
+            seq = 0
+            try:
+                while not cancelled():
+                    chunk = await loop.run_in_executor(executor, prepare, seq)
+                    if not chunk:
+                        break
+                    for seq, task, payload, result in chunk:
+                        await window.acquire()
+                        if cancelled():
+                            window.release()
+                            break
+                        state["outstanding"] += 1
+                        if result is not None:
+                            emit_in_order(seq, result)
+                            finish_one()
+                        else:
+                            await work.put((seq, task, 1, payload, None))
+                    seq += 1
+            finally:
+                state["fed"] = True
+                state["outstanding"] += 1
+                finish_one()
+
+        executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix="async-prepare")
+        workers = [asyncio.ensure_future(run_session(index)) for index in range(sessions)]
+        workers.append(asyncio.ensure_future(feed(executor)))
+        try:
+            # A failing session or feeder must not leave the others waiting
+            done, _ = await asyncio.wait(workers, return_when=asyncio.FIRST_EXCEPTION)
+            for task in done:
+                task.result()
+            # After a cancel, skipped tasks leave gaps; report what was sent
+            for seq in sorted(pending):
+                if pending[seq] is not _DEFERRED and pending[seq] is not _SKIPPED:
+                    campaign.record(pending[seq])
+        finally:
+            for task in workers + list(retry_tasks):
+                task.cancel()
+            await asyncio.gather(*workers, *retry_tasks, return_exceptions=True)
+            executor.shutdown(wait=True)
+            campaign.flush()
+
+        campaign.results["sessions_opened"] = sum(sessions_opened)
+        return campaign.results
@@ -0,0 +1,295 @@
+"""
+Minimal asyncio SMTP client for the async delivery backend
+
+Speaks just what bulk sending needs: EHLO, STARTTLS, AUTH PLAIN/LOGIN,
+pipelined MAIL/RCPT, DATA, RSET and QUIT. Failures are raised as the
+smtplib exception types, so classification and reporting are shared with
+the blocking backend.
+"""
+
+import asyncio
+import base64
+import functools
+import re
+import smtplib
+import socket
+import ssl
+from typing import Dict, List, Optional, Sequence, Tuple
+
+from pathra_preshana import metrics
+
+CRLF = b"\r\n"
+_BARE_EOL = re.compile(rb"(?:\r\n|\n|\r(?!\n))")
+_LEADING_DOT = re.compile(rb"(?m)^\.")
+
+
+def _unverified_tls_context() -> ssl.SSLContext:
+    # Same as smtplib.SMTP.starttls() without a context, which the blocking
+    # backend uses; pass tls_context to verify the server certificate
+    context = ssl.SSLContext(ssl.PROTOCOL_TLS_CLIENT)
+    context.check_hostname = False
+    context.verify_mode = ssl.CERT_NONE
+    return context
+
+
+@functools.lru_cache(maxsize=1)
+def _local_hostname() -> bytes:
+    return socket.getfqdn().encode("idna")
+
+
+def prepare_data(message: bytes) -> bytes:
+    """CRLF-normalize and dot-stuff a message, appending the end-of-data marker"""
+    data = _LEADING_DOT.sub(b"..", _BARE_EOL.sub(CRLF, message))
+    if not data.endswith(CRLF):
+        data += CRLF
+    return data + b".\r\n"
+
+
+class AsyncSMTPSession:
+    """Long-lived, logged-in SMTP connection driven from an event loop"""
+
+    def __init__(
+        self,
+        smtp_server: str,
+        smtp_port: int,
+        username: str,
+        password: str,
+        max_messages_per_connection: int = 100,
+        timeout: float = 60.0,
+        tls_context: Optional[ssl.SSLContext] = None,
+    ):
+        """
+        Args:
+            smtp_server: SMTP server hostname
+            smtp_port: SMTP server port (STARTTLS)
+            username: Login user name
+            password: Login password
+            max_messages_per_connection: Messages sent before the connection
+                is recycled
+            timeout: Seconds to wait for any single server reply
+            tls_context: SSL context for STARTTLS
+        """
+        self.smtp_server = smtp_server
+        self.smtp_port = smtp_port
+        self.username = username
+        self.password = password
+        self.max_messages_per_connection = max(1, max_messages_per_connection)
+        self.timeout = timeout
+        self.tls_context = tls_context
+
+        self.messages_on_connection = 0
+        self.sessions_opened = 0
+        # Whether the current transaction got as far as DATA
+        self.data_started = False
+        self._reader: Optional[asyncio.StreamReader] = None
+        self._writer: Optional[asyncio.StreamWriter] = None
+        self._extensions: Dict[str, str] = {}
+
+    async def __aenter__(self) -> "AsyncSMTPSession":
+        return self
+
+    async def __aexit__(self, exc_type, exc, tb) -> None:
+        await self.close()
+
+    async def connect(self) -> None:
+        """Open a new connection, run STARTTLS and log in"""
+        await self.close()
+
+        phases = metrics.smtp_phase_seconds
+        try:
+            with phases.time("connect"):
+                self._reader, self._writer = await asyncio.wait_for(
+                    asyncio.open_connection(self.smtp_server, self.smtp_port), self.timeout
+                )
+                code, reply = await self._read_reply()
+                if code != 220:
+                    raise smtplib.SMTPConnectError(code, reply)
+                await self._ehlo()
+
+            with phases.time("starttls"):
+                if "starttls" not in self._extensions:
+                    raise smtplib.SMTPNotSupportedError("STARTTLS extension not supported by server.")
+                code, reply = await self._command(b"STARTTLS")
+                if code != 220:
+                    raise smtplib.SMTPResponseException(code, reply)
+                await asyncio.wait_for(
+                    self._writer.start_tls(self.tls_context or _unverified_tls_context(),
+                                           server_hostname=self.smtp_server),
+                    self.timeout
+                )
+                await self._ehlo()
+
+            with phases.time("login"):
+                await self._login()
+        except BaseException:
+            self._abort()
+            raise
+
+        self.messages_on_connection = 0
+        self.sessions_opened += 1
+        metrics.sessions_opened.inc()
+
+    async def close(self) -> None:
+        """Politely end the current connection, if any"""
+        if self._writer is None:
+            return
+        try:
+            await self._command(b"QUIT")
+        except (smtplib.SMTPException, OSError, asyncio.TimeoutError):
+            pass
+        self._abort()
+
+    def _abort(self) -> None:
+        writer, self._writer, self._reader = self._writer, None, None
+        if writer is not None:
+            writer.close()
+
+    async def _ehlo(self) -> None:
+        # getfqdn may block on DNS, so it runs (once) off the event loop
+        local_name = await asyncio.get_running_loop().run_in_executor(None, _local_hostname)
+        code, reply = await self._command(b"EHLO " + local_name)
+        if code != 250:
+            raise smtplib.SMTPHeloError(code, reply)
+        extensions = {}
+        for line in reply.decode("latin-1").split("\n")[1:]:
+            keyword, _, params = line.strip().partition(" ")
+            extensions[keyword.lower()] = params
+        self._extensions = extensions
+
+    async def _login(self) -> None:
+        mechanisms = self._extensions.get("auth", "").upper().split()
+        user, password = self.username.encode("utf-8"), self.password.encode("utf-8")
+        if "PLAIN" in mechanisms or not mechanisms:
+            token = base64.b64encode(b"\0" + user + b"\0" + password)
+            code, reply = await self._command(b"AUTH PLAIN " + token)
+        else:
+            code, reply = await self._command(b"AUTH LOGIN")
+            if code == 334:
+                code, reply = await self._command(base64.b64encode(user))
+            if code == 334:
+                code, reply = await self._command(base64.b64encode(password))
+        if code not in (235, 503):
+            raise smtplib.SMTPAuthenticationError(code, reply)
+
+    async def _read_reply(self) -> Tuple[int, bytes]:
+        lines: List[bytes] = []
+        while True:
+            try:
+                line = await asyncio.wait_for(self._reader.readline(), self.timeout)
+            except asyncio.TimeoutError:
+                self._abort()
+                raise TimeoutError(f"No reply from {self.smtp_server} within {self.timeout}s")
+            if not line:
+                self._abort()
+                raise smtplib.SMTPServerDisconnected("Connection unexpectedly closed")
+            lines.append(line[4:].rstrip(b"\r\n"))
+            if line[3:4] != b"-":
+                try:
+                    return int(line[:3]), b"\n".join(lines)
+                except ValueError:
+                    return -1, b"\n".join(lines)
+
+    async def _write(self, data: bytes) -> None:
+        if self._writer is None:
+            raise smtplib.SMTPServerDisconnected("please run connect() first")
+        try:
+            self._writer.write(data)
+            await self._writer.drain()
+        except ConnectionError as error:
+            self._abort()
+            raise smtplib.SMTPServerDisconnected(f"Connection lost: {error}")
+
+    async def _command(self, line: bytes) -> Tuple[int, bytes]:
+        await self._write(line + CRLF)
+        return await self._read_reply()
+
+    async def rset(self) -> Tuple[int, bytes]:
+        return await self._command(b"RSET")
+
+    async def _ensure_ready(self) -> None:
+        """Make sure a logged-in connection with a clean transaction is available"""
+        if self._writer is None or self.messages_on_connection >= self.max_messages_per_connection:
+            await self.connect()
+            return
+
+        if self.messages_on_connection:
+            try:
+                with metrics.smtp_phase_seconds.time("rset"):
+                    code, _ = await self.rset()
+            except (smtplib.SMTPServerDisconnected, OSError):
+                code = -1
+            if code != 250:
+                await self.connect()
+
+    async def sendmail(self, from_addr: str, to_addrs: Sequence[str], msg: bytes) -> Dict[str, Tuple[int, bytes]]:
+        """
+        Send a pre-serialized message, reconnecting once if the server hung up
+
+        Returns:
+            Dictionary of refused recipients, like smtplib's sendmail
+        """
+        await self._ensure_ready()
+        self.data_started = False
+        try:
+            try:
+                with metrics.smtp_phase_seconds.time("data"):
+                    return await self._transaction(from_addr, to_addrs, msg)
+            except smtplib.SMTPServerDisconnected:
+                if self.data_started:
+                    # The server may have accepted the message before hanging
+                    # up; sending it again could deliver it twice, so leave
+                    # the retry to the caller's journal and retry queue
+                    raise
+                # Dropped before the message: reconnect once and retry
+                await self.connect()
+                with metrics.smtp_phase_seconds.time("data"):
+                    return await self._transaction(from_addr, to_addrs, msg)
+        finally:
+            self.messages_on_connection += 1
+
+    async def _transaction(self, from_addr: str, to_addrs: Sequence[str], msg: bytes) -> Dict[str, Tuple[int, bytes]]:
+        commands = [f"MAIL FROM:<{from_addr}>".encode("utf-8")]
+        commands.extend(f"RCPT TO:<{address}>".encode("utf-8") for address in to_addrs)
+
+        # With PIPELINING the envelope costs one round trip instead of 1 + N
+        replies = []
+        if "pipelining" in self._extensions:
+            await self._write(b"".join(command + CRLF for command in commands))
+            for _ in commands:
+                replies.append(await self._read_reply())
+        else:
+            for command in commands:
+                replies.append(await self._command(command))
+                if len(replies) == 1 and replies[0][0] != 250:
+                    break
+
+        code, reply = replies[0]
+        if code != 250:
+            await self._reset_quietly()
+            raise smtplib.SMTPSenderRefused(code, reply, from_addr)
+
+        refused = {
+            address: (code, reply)
+            for address, (code, reply) in zip(to_addrs, replies[1:])
+            if code not in (250, 251)
+        }
+        if len(refused) == len(to_addrs):
+            await self._reset_quietly()
+            raise smtplib.SMTPRecipientsRefused(refused)
+
+        self.data_started = True
+        code, reply = await self._command(b"DATA")
+        if code != 354:
+            await self._reset_quietly()
+            raise smtplib.SMTPDataError(code, reply)
+        await self._write(prepare_data(msg))
+        code, reply = await self._read_reply()
+        if code != 250:
+            raise smtplib.SMTPDataError(code, reply)
+        return refused
+
+    async def _reset_quietly(self) -> None:
+        try:
+            await self.rset()
+        except (smtplib.SMTPServerDisconnected, OSError):
+            pass
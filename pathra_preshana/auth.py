@@ -2,14 +2,209 @@
 Google OAuth authentication module
 """
 
+import hashlib
+import json
 import os
+import re
+import threading
+import time
+from collections import OrderedDict
 from flask import session, redirect, url_for, request
 from functools import wraps
-from google.oauth2 import id_token
+import requests
+from requests.adapters import HTTPAdapter
+from google.auth import jwt
 from google.auth.transport import requests as google_requests
-from google.auth.exceptions import GoogleAuthError
+from google.auth.exceptions import GoogleAuthError, TransportError
+
+from pathra_preshana.log import get_logger
+
+log = get_logger(__name__)
 
 GOOGLE_CLIENT_ID = os.getenv('GOOGLE_CLIENT_ID')
+GOOGLE_CERTS_URL = os.getenv('GOOGLE_CERTS_URL', 'https://www.googleapis.com/oauth2/v1/certs')
+GOOGLE_ISSUERS = ('accounts.google.com', 'https://accounts.google.com')
+
+# Used when the certs response carries no usable Cache-Control max-age
+DEFAULT_CERTS_MAX_AGE = 3600
+# Start a background refresh this long before the cached certs expire
+CERTS_REFRESH_AHEAD = 300
+# Verified claims are reused for at most this long (and never past 'exp')
+CLAIMS_CACHE_TTL = 300
+CLAIMS_CACHE_MAX_ENTRIES = 1024
+# An unknown key id forces a refetch at most this often
+CERTS_MIN_REFETCH_INTERVAL = 60
+# Tolerated clock difference for 'iat'/'exp' checks
+CLOCK_SKEW_SECONDS = 10
+
+_MAX_AGE = re.compile(r'max-age=(\d+)')
+
+
+def _create_http_session():
+    """Pooled, keep-alive HTTP session shared by every verification"""
+    http = requests.Session()
+    adapter = HTTPAdapter(pool_connections=4, pool_maxsize=16, max_retries=2)
+    http.mount('https://', adapter)
+    http.mount('http://', adapter)
+    return http
+
+
+_transport = google_requests.Request(session=_create_http_session())
+
+
+class CertCache:
+    """
+    Google's token signing certificates, cached for their Cache-Control max-age
+
+    Once the certs are within refresh_ahead seconds of expiring, the next
+    lookup starts a refresh in a background thread and keeps answering from
+    the cached copy; only an empty or fully expired cache makes a caller wait.
+    """
+
+    def __init__(self, url, transport, refresh_ahead=CERTS_REFRESH_AHEAD):
+        """
+        Args:
+            url: Endpoint returning {'key id': 'x509 certificate'} JSON
+            transport: google.auth transport Request used for fetching
+            refresh_ahead: Seconds before expiry to refresh in the background
+        """
+        self.url = url
+        self.transport = transport
+        self.refresh_ahead = refresh_ahead
+        self.fetches = 0
+
+        self._lock = threading.Lock()
+        self._certs = None
+        self._expires_at = 0.0
+        self._fetched_at = float('-inf')
+        self._refreshing = False
+
+    def get(self):
+        """
+        Current certificates, fetching them first if none are usable
+        
+        Returns:
+            dict: Key id to PEM certificate
+        """
+        now = time.monotonic()
+        with self._lock:
+            certs, expires_at = self._certs, self._expires_at
+            start_refresh = (
+                certs is not None and now < expires_at
+                and expires_at - now <= self.refresh_ahead and not self._refreshing
+            )
+            if start_refresh:
+                self._refreshing = True
+        if certs is not None and now < expires_at:
+            if start_refresh:
+                threading.Thread(target=self._background_refresh, name='google-certs-refresh', daemon=True).start()
+            return certs
+        return self.refresh()
+
+    def refresh(self):
+        """Fetch the certificates now and cache them"""
+        response = self.transport(self.url, method='GET')
+        if response.status != 200:
+            raise TransportError(f"Could not fetch certificates at {self.url}")
+        certs = json.loads(response.data.decode('utf-8'))
+
+        max_age = DEFAULT_CERTS_MAX_AGE
+        match = _MAX_AGE.search(response.headers.get('Cache-Control', ''))
+        if match:
+            max_age = int(match.group(1))
+
+        with self._lock:
+            self._certs = certs
+            self._fetched_at = time.monotonic()
+            self._expires_at = self._fetched_at + max_age
+            self.fetches += 1
+        return certs
+
+    def refresh_for_unknown_key(self):
+        """
+        Refetch after a token named a key id missing from the cache (Google
+        rotated its keys), unless the certs were fetched only moments ago;
+        this stops forged key ids from turning every login into a fetch
+        """
+        with self._lock:
+            certs, fetched_at = self._certs, self._fetched_at
+        if certs is not None and time.monotonic() - fetched_at < CERTS_MIN_REFETCH_INTERVAL:
+            return certs
+        return self.refresh()
+
+    def _background_refresh(self):
+        try:
+            self.refresh()
+        except Exception as e:
+            # The cached certs stay valid until they expire; the next lookup retries
+            log.warning("Background refresh of Google certificates failed", extra={"error": str(e)})
+        finally:
+            with self._lock:
+                self._refreshing = False
+
+
+class ClaimsCache:
+    """Short-lived LRU cache of verified token claims, keyed by token hash"""
+
+    def __init__(self, ttl=CLAIMS_CACHE_TTL, max_entries=CLAIMS_CACHE_MAX_ENTRIES):
+        self.ttl = ttl
+        self.max_entries = max_entries
+        self._lock = threading.Lock()
+        self._entries = OrderedDict()
+
+    @staticmethod
+    def _key(token):
+        if isinstance(token, str):
+            token = token.encode('utf-8')
+        return hashlib.sha256(token).digest()
+
+    def get(self, token):
+        key = self._key(token)
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                return None
+            claims, expires_at = entry
+            if time.time() >= expires_at:
+                del self._entries[key]
+                return None
+            self._entries.move_to_end(key)
+            return claims
+
+    def put(self, token, claims):
+        expires_at = min(time.time() + self.ttl, float(claims.get('exp', 0)))
+        if expires_at <= time.time():
+            return
+        with self._lock:
+            self._entries[self._key(token)] = (claims, expires_at)
+            self._entries.move_to_end(self._key(token))
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+
+
+google_certs = CertCache(GOOGLE_CERTS_URL, _transport)
+verified_claims = ClaimsCache()
+
+
+def _decode_id_token(token):
+    """Check the token's signature, audience, expiry and issuer"""
+    try:
+        idinfo = jwt.decode(token, certs=google_certs.get(), audience=GOOGLE_CLIENT_ID,
+                            clock_skew_in_seconds=CLOCK_SKEW_SECONDS)
+    except ValueError as e:
+        # Google rotates keys; a token signed with a key we have not seen yet
+        # gets one forced refresh before it is rejected
+        if 'Certificate for key id' not in str(e):
+            raise
+        idinfo = jwt.decode(token, certs=google_certs.refresh_for_unknown_key(), audience=GOOGLE_CLIENT_ID,
+                            clock_skew_in_seconds=CLOCK_SKEW_SECONDS)
+    if idinfo.get('iss') not in GOOGLE_ISSUERS:
+        raise ValueError(f"Wrong issuer: {idinfo.get('iss')}")
+    return idinfo
 
 
 def login_required(f):
@@ -35,19 +230,18 @@ def verify_google_token(token):
     try:
         # Check if GOOGLE_CLIENT_ID is set
         if not GOOGLE_CLIENT_ID:
-            print("ERROR: GOOGLE_CLIENT_ID not set in environment")
+            log.error("GOOGLE_CLIENT_ID not set in environment")
             return None
         
-        print(f"Verifying token with Client ID: {GOOGLE_CLIENT_ID[:20]}...")
-        
-        # Verify the token
-        idinfo = id_token.verify_oauth2_token(
-            token,
-            google_requests.Request(),
-            GOOGLE_CLIENT_ID
-        )
-        
-        print(f"Token verified successfully for: {idinfo.get('email')}")
+        idinfo = verified_claims.get(token)
+        if idinfo is None:
+            log.debug("Verifying token", extra={"client_id": f"{GOOGLE_CLIENT_ID[:20]}..."})
+            
+            # Verify the token against the cached signing certificates
+            idinfo = _decode_id_token(token)
+            verified_claims.put(token, idinfo)
+            
+            log.info("Token verified", extra={"email": idinfo.get('email')})
         
         return {
             'email': idinfo['email'],
@@ -56,15 +250,13 @@ def verify_google_token(token):
             'sub': idinfo['sub']
         }
     except ValueError as e:
-        print(f"Token verification failed - ValueError: {e}")
+        log.warning("Token verification failed", extra={"error": f"ValueError: {e}"})
         return None
     except GoogleAuthError as e:
-        print(f"Token verification failed - GoogleAuthError: {e}")
+        log.warning("Token verification failed", extra={"error": f"GoogleAuthError: {e}"})
         return None
     except Exception as e:
-        print(f"Token verification failed - Unexpected error: {e}")
-        import traceback
-        traceback.print_exc()
+        log.exception("Token verification failed")
         return None
 
 
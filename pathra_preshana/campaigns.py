@@ -0,0 +1,195 @@
+"""
+Running scheduled campaigns, in the web process or on sender workers
+"""
+
+import os
+import time
+from typing import Any, Callable, Dict, List, Optional
+
+from pathra_preshana.assets import campaign_assets
+from pathra_preshana.delivery_report import DeliveryReport
+from pathra_preshana.email_sender import create_email_sender
+from pathra_preshana.file_reader import FileReader
+from pathra_preshana.jobs import CampaignJob
+from pathra_preshana.journal import SendJournal
+from pathra_preshana.rate_limit import RateLimiter
+from pathra_preshana.recipient_filter import RecipientValidator, SeenAddresses, is_valid_email, normalize_email
+from pathra_preshana.task_queue import TaskQueue
+from pathra_preshana.templating import CompiledTemplate
+
+# Recipients per delivery task handed to sender workers
+DELIVERY_CHUNK_SIZE = int(os.getenv("DELIVERY_CHUNK_SIZE", "1000"))
+
+# Seconds between progress checks of a campaign sent by workers
+DISPATCH_POLL_INTERVAL = 1.0
+
+# Longest a cancelled campaign waits for workers to stop sending its tasks
+CANCEL_GRACE_SECONDS = 60.0
+
+_send_journal = None
+_task_queue = None
+
+
+def get_send_journal() -> SendJournal:
+    """Shared delivery journal, opened on first use"""
+    global _send_journal
+    if _send_journal is None:
+        _send_journal = SendJournal()
+    return _send_journal
+
+
+def get_task_queue() -> TaskQueue:
+    """Shared delivery task queue, opened on first use"""
+    global _task_queue
+    if _task_queue is None:
+        _task_queue = TaskQueue()
+    return _task_queue
+
+
+def run_campaign(spec: Dict[str, Any], job: CampaignJob,
+                 share_limiter: Optional[Callable[[RateLimiter], Any]] = None, report_part: str = "web") -> Dict:
+    """
+    Send a campaign described by its spec in this process
+
+    Args:
+        spec: Send specification stored by /api/send
+        job: CampaignJob reporting progress and carrying the cancel event
+        share_limiter: Optional wrapper of the sender's rate limiter, so
+            concurrent campaigns take fair turns at the account
+        report_part: Name of this process's file in the job's delivery report
+
+    Returns:
+        Bulk results from send_bulk_emails
+    """
+    file_reader = FileReader()
+    html_template = CompiledTemplate(
+        file_reader.read_html_template(spec["template_path"]),
+        escape=spec["escape_values"]
+    )
+    assets = campaign_assets(html_template, spec["attachments"])
+    email_sender = create_email_sender()
+    if share_limiter is not None:
+        email_sender.share_rate_limiter(share_limiter)
+
+    # Normalize, validate and de-duplicate addresses before they reach SMTP
+    job.validator = RecipientValidator()
+    where, offset, limit = spec["where"], spec["offset"], spec["limit"]
+    if where or offset or limit is not None:
+        recipients = file_reader.select_csv_recipients(spec["recipients_path"], where, offset, limit)
+    else:
+        recipients = file_reader.iter_csv_recipients(spec["recipients_path"])
+
+    # A re-run of the same part (a resumed window, a restored job, a
+    # re-leased task) appends to it; reading the report keeps each
+    # recipient's latest real outcome
+    with DeliveryReport(job.job_id, spec["campaign_id"], report_part) as report:
+        def on_result(result):
+            report.record(result)
+            job.record(result)
+
+        return email_sender.send_bulk_emails(
+            recipients=job.validator.filter(recipients, set(spec.get("duplicates", ()))),
+            subject=spec["subject"],
+            html_template=html_template,
+            on_result=on_result,
+            cancel_event=job.cancel_event,
+            journal=get_send_journal(),
+            campaign_id=spec["campaign_id"],
+            resume=spec["resume"],
+            assets=assets
+        )
+
+
+def chunk_specs(spec: Dict[str, Any], total: int, chunk_size: int = DELIVERY_CHUNK_SIZE) -> List[Dict[str, Any]]:
+    """
+    Split a campaign's spec into specs of consecutive slices of at most chunk_size recipients
+
+    Chunks are sent independently, so each chunk's spec lists the positions
+    of addresses that already appear in an earlier chunk, to be skipped as
+    duplicates (see chunk_duplicates).
+    """
+    duplicates = chunk_duplicates(spec, total, chunk_size)
+    chunks = []
+    for number, start in enumerate(range(0, max(total, 1), chunk_size)):
+        chunks.append(dict(spec, offset=spec["offset"] + start, limit=min(chunk_size, total - start),
+                           duplicates=duplicates.get(number, [])))
+    return chunks
+
+
+def chunk_duplicates(spec: Dict[str, Any], total: int, chunk_size: int) -> Dict[int, List[int]]:
+    """
+    Find repeated addresses of a campaign, one pass over its recipients
+
+    Returns:
+        Positions within their chunk of every repeat of an address, by chunk number
+    """
+    seen = SeenAddresses()
+    duplicates: Dict[int, List[int]] = {}
+    if not total:
+        return duplicates
+    recipients = FileReader.select_csv_recipients(spec["recipients_path"], spec["where"], spec["offset"], total)
+    for position, recipient in enumerate(recipients):
+        email = normalize_email(recipient["email"])
+        if not is_valid_email(email):
+            continue
+        if not seen.add(email):
+            duplicates.setdefault(position // chunk_size, []).append(position % chunk_size)
+    seen.close()
+    return duplicates
+
+
+def merge_results(results: List[Dict]) -> Dict:
+    """Add up the bulk results of several sends, including nested counts"""
+    merged: Dict[str, Any] = {}
+    for result in results:
+        for key, value in result.items():
+            if isinstance(value, dict):
+                merged[key] = merge_results([merged.get(key, {}), value])
+            elif isinstance(value, (int, float)):
+                merged[key] = merged.get(key, 0) + value
+    return merged
+
+
+def dispatch_campaign(spec: Dict[str, Any], job: CampaignJob,
+                      share_limiter: Optional[Callable[[RateLimiter], Any]] = None) -> Dict:
+    """
+    Send a campaign on sender workers (python -m pathra_preshana.worker)
+
+    The campaign is queued as DELIVERY_CHUNK_SIZE-recipient tasks, unless
+    its tasks are still queued or leased from before a restart; the job's
+    counts follow the workers' progress until every task has settled.
+    Workers take fair turns and pace their sends themselves, with limits
+    counted across all of them, so share_limiter is not used.
+
+    Returns:
+        Bulk results added up over the tasks
+
+    Raises:
+        RuntimeError: A task failed; the others are still sent
+    """
+    queue = get_task_queue()
+    if not queue.has_unfinished(job.job_id):
+        priority = (job.schedule or {}).get("priority", "normal")
+        queue.put(job.job_id, job.owner, priority, chunk_specs(spec, job.total))
+
+    cancelled_at = None
+    while True:
+        tasks = queue.job_tasks(job.job_id)
+        progress = [task["progress"] for task in tasks if task["progress"]]
+        counts = merge_results(progress)
+        job.update_counts(counts.get("sent", 0), counts.get("failed", 0), counts.get("skipped", 0),
+                          counts.get("failures", {}), counts.get("rejected"))
+
+        if all(task["status"] not in ("queued", "leased") for task in tasks):
+            break
+        if cancelled_at is None and job.cancel_event.is_set():
+            queue.cancel(job.job_id)
+            cancelled_at = time.monotonic()
+        elif cancelled_at is not None and time.monotonic() - cancelled_at > CANCEL_GRACE_SECONDS:
+            break
+        time.sleep(DISPATCH_POLL_INTERVAL)
+
+    errors = [task["error"] for task in tasks if task["status"] == "failed"]
+    if errors:
+        raise RuntimeError(f"{len(errors)} of {len(tasks)} delivery tasks failed: {errors[0]}")
+    return merge_results([task["results"] for task in tasks if task["results"]])
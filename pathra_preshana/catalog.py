@@ -0,0 +1,135 @@
+"""
+In-process catalog of the template and recipient directories
+"""
+
+import hashlib
+import mimetypes
+import os
+import threading
+from typing import Any, Callable, Dict, List, Optional, Tuple, Union
+
+from pathra_preshana.assets import ASSET_EXTENSIONS, ASSETS_DIR
+from pathra_preshana.file_reader import FileReader
+from pathra_preshana.templating import CompiledTemplate
+
+
+class FileCatalog:
+    """
+    Metadata for the files of one extension in a directory
+
+    The directory is only rescanned when its mtime changes (a file was
+    added, removed or renamed) or after invalidate(); on a rescan, entries
+    whose file mtime and size are unchanged are reused without reopening the
+    file. Each listing carries an ETag so unchanged listings can be answered
+    with 304 Not Modified.
+    """
+
+    def __init__(self, directory: str, extension: Union[str, Tuple[str, ...]],
+                 describe: Callable[[str], Dict[str, Any]]):
+        """
+        Args:
+            directory: Directory to catalog; created if missing
+            extension: File extension (or tuple of them) to include, e.g. '.csv'
+            describe: Called with a file path to produce its extra metadata
+        """
+        self.directory = directory
+        self.extension = extension
+        self.describe = describe
+        self.scans = 0
+
+        self._lock = threading.Lock()
+        self._directory_mtime: Optional[int] = None
+        self._entries: Dict[str, Tuple[Tuple[int, int], Dict[str, Any]]] = {}
+        self._listing: List[Dict[str, Any]] = []
+        self._etag = ""
+        self._dirty = True
+
+    def invalidate(self, filename: Optional[str] = None) -> None:
+        """
+        Force a rescan on the next listing, e.g. after an upload overwrote a
+        file in place (which leaves the directory mtime unchanged)
+
+        Args:
+            filename: File to re-describe; every file is rechecked by its
+                mtime and size either way
+        """
+        with self._lock:
+            if filename is not None:
+                self._entries.pop(filename, None)
+            self._dirty = True
+
+    def listing(self) -> Tuple[str, List[Dict[str, Any]]]:
+        """
+        Current file metadata, sorted by name
+
+        Returns:
+            Tuple of (ETag, list of dicts with 'name', 'size', 'modified'
+            and the describe() fields)
+        """
+        with self._lock:
+            try:
+                directory_mtime = os.stat(self.directory).st_mtime_ns
+            except FileNotFoundError:
+                os.makedirs(self.directory, exist_ok=True)
+                directory_mtime = os.stat(self.directory).st_mtime_ns
+
+            if self._dirty or directory_mtime != self._directory_mtime:
+                self._rescan()
+                self._directory_mtime = directory_mtime
+                self._dirty = False
+            return self._etag, self._listing
+
+    def names(self) -> List[str]:
+        """File names only, as the listing endpoints have always returned"""
+        return [entry["name"] for entry in self.listing()[1]]
+
+    def _rescan(self) -> None:
+        self.scans += 1
+        entries = {}
+        with os.scandir(self.directory) as scan:
+            for item in scan:
+                if not item.name.lower().endswith(self.extension) or not item.is_file():
+                    continue
+                stat = item.stat()
+                signature = (stat.st_mtime_ns, stat.st_size)
+                previous = self._entries.get(item.name)
+                if previous is not None and previous[0] == signature:
+                    entries[item.name] = previous
+                    continue
+
+                entry = {"name": item.name, "size": stat.st_size, "modified": int(stat.st_mtime)}
+                try:
+                    entry.update(self.describe(item.path))
+                except Exception as e:
+                    entry["error"] = str(e)
+                entries[item.name] = (signature, entry)
+
+        self._entries = entries
+        self._listing = [entries[name][1] for name in sorted(entries)]
+        digest = hashlib.sha1()
+        for name in sorted(entries):
+            digest.update(f"{name}\0{entries[name][0]}\0".encode("utf-8"))
+        self._etag = digest.hexdigest()
+
+
+def describe_template(path: str) -> Dict[str, Any]:
+    """Placeholders used by an HTML template"""
+    return {"placeholders": CompiledTemplate(FileReader.read_html_template(path)).fields}
+
+
+def describe_recipients(path: str) -> Dict[str, Any]:
+    """Recipient count and available columns of a CSV file"""
+    return {
+        "rows": FileReader.count_csv_recipients(path),
+        "columns": FileReader.read_csv_columns(path),
+    }
+
+
+def describe_asset(path: str) -> Dict[str, Any]:
+    """Content type of an image or attachment"""
+    return {"content_type": mimetypes.guess_type(path)[0] or "application/octet-stream"}
+
+
+template_catalog = FileCatalog("templates", ".html", describe_template)
+recipient_catalog = FileCatalog("data", ".csv", describe_recipients)
+asset_catalog = FileCatalog(ASSETS_DIR, ASSET_EXTENSIONS, describe_asset)
@@ -0,0 +1,357 @@
+"""
+Concurrent delivery engine driving a pool of SMTP sessions
+"""
+
+import queue
+import threading
+import time
+from typing import Any, Callable, Dict, Iterable, Optional
+
+from pathra_preshana import metrics
+from pathra_preshana.rate_limit import RateLimiter
+from pathra_preshana.retry import RetryPolicy, RetryQueue, is_throttling
+from pathra_preshana.smtp_session import SMTPSession
+
+_DONE = object()
+_FED = object()
+_SKIPPED = object()
+_DEFERRED = object()
+_END = object()
+
+# Longest the coordinator waits without checking for cancellation or due retries
+POLL_INTERVAL = 0.2
+
+
+class DeliveryEngine:
+    """
+    Fan tasks out over N SMTP sessions fed from a shared work queue
+
+    Results are handed to on_result in the calling thread and in the same
+    order as the input, whatever order the workers finish in. Tasks that
+    fail transiently wait out a backoff in a retry queue without holding up
+    the others; their final result is reported when their last attempt ends.
+    """
+
+    def __init__(
+        self,
+        session_factory: Callable[[], SMTPSession],
+        workers: int = 1,
+        rate_limiter: Optional[RateLimiter] = None,
+        window: Optional[int] = None,
+        retry_policy: Optional[RetryPolicy] = None,
+    ):
+        """
+        Args:
+            session_factory: Callable returning a new (unconnected) SMTPSession
+            workers: Number of concurrent SMTP sessions
+            rate_limiter: Optional limiter shared by all workers; it is told
+                about successes and throttling replies so it can adapt
+            window: Maximum tasks in flight or awaiting in-order delivery;
+                bounds memory for arbitrarily large inputs
+            retry_policy: Optional policy for retrying transient failures;
+                without one every result is final
+        """
+        self.session_factory = session_factory
+        self.workers = max(1, workers)
+        self.rate_limiter = rate_limiter
+        self.window = window or self.workers * 8
+        self.retry_policy = retry_policy or RetryPolicy(max_retries=0)
+        self._weight: Optional[Callable[[Any], int]] = None
+
+    def run(
+        self,
+        tasks: Iterable[Any],
+        deliver: Callable[[SMTPSession, Any], Dict],
+        on_result: Callable[[Dict], None],
+        reject: Callable[[Any, str], Dict],
+        cancel_event: Optional[threading.Event] = None,
+        precheck: Optional[Callable[[Any], Optional[Dict]]] = None,
+        weight: Optional[Callable[[Any], int]] = None,
+    ) -> int:
+        """
+        Deliver every task and report each result in input order
+
+        Args:
+            tasks: Iterable of tasks, consumed lazily
+            deliver: Sends one task over a session and returns its result;
+                failed results carry a 'category' used to decide on retries.
+                Returning None hands the task back untried, for another
+                worker (e.g. when this session's account is unavailable)
+            on_result: Called with each final result, in input order except
+                for retried tasks; results carry the number of 'attempts'
+            reject: Builds the result for a task that was not attempted,
+                given the task and the reason
+            cancel_event: Optional event; once set, no new tasks or retries
+                are started, results of tasks already sent are still
+                reported, and tasks waiting to be retried report their last
+                failure
+            precheck: Optional callable returning a result for tasks that
+                need no delivery (e.g. already sent), or None to deliver;
+                such tasks skip the rate limiter and the SMTP workers
+            weight: Optional callable giving the number of recipients of a
+                task, counted against the daily quota (default 1)
+
+        Returns:
+            int: Number of SMTP sessions opened
+        """
+        self._weight = weight
+        if self.workers == 1:
+            return self._run_inline(tasks, deliver, on_result, reject, cancel_event, precheck)
+        return self._run_pool(tasks, deliver, on_result, reject, cancel_event, precheck)
+
+    def _attempt(self, session, task, attempt, deliver, reject, cancelled=None) -> Optional[Dict]:
+        count = self._weight(task) if self._weight else 1
+        if self.rate_limiter is not None and not self.rate_limiter.acquire(count):
+            result = reject(task, "Daily sending quota exhausted")
+        elif cancelled is not None and cancelled():
+            # Cancelled while waiting for the limiter: hand the task back untried
+            return None
+        else:
+            result = deliver(session, task)
+            if result is None:
+                return None
+        result["attempts"] = attempt
+        return result
+
+    def _observe(self, result: Dict) -> None:
+        """Feed a delivery outcome back into the adaptive rate limiter"""
+        if self.rate_limiter is None:
+            return
+        if result["status"] == "sent":
+            self.rate_limiter.succeeded()
+        elif is_throttling(result):
+            self.rate_limiter.throttled()
+
+    def _should_retry(self, result: Dict, attempt: int, cancelled: bool) -> bool:
+        if cancelled or not self.retry_policy.should_retry(result, attempt):
+            return False
+        metrics.retries.inc()
+        return True
+
+    def _run_inline(self, tasks, deliver, on_result, reject, cancel_event, precheck) -> int:
+        retries = RetryQueue(self.retry_policy)
+
+        def cancelled():
+            return cancel_event is not None and cancel_event.is_set()
+
+        def attempt(seq, task, number, last=None):
+            result = self._attempt(session, task, number, deliver, reject, cancelled)
+            while result is None:
+                # Handed back, but this is the only worker: try again shortly
+                if cancel_event is not None:
+                    if cancel_event.wait(POLL_INTERVAL):
+                        # A cancelled retry still reports its last failure
+                        if last is not None:
+                            on_result(last)
+                        return
+                else:
+                    time.sleep(POLL_INTERVAL)
+                result = self._attempt(session, task, number, deliver, reject, cancelled)
+            self._observe(result)
+            if self._should_retry(result, number, cancelled()):
+                retries.push(seq, task, number, result)
+            else:
+                on_result(result)
+
+        with self.session_factory() as session:
+            remaining = iter(tasks)
+            seq = 0
+            while not cancelled():
+                for retry_seq, task, number, last in retries.pop_due():
+                    attempt(retry_seq, task, number, last)
+
+                task = next(remaining, _END) if remaining is not None else _END
+                if task is _END:
+                    remaining = None
+                    wait = retries.next_due()
+                    if wait is None:
+                        break
+                    # Only retries left: sleep until the next one, waking for cancel
+                    if cancel_event is not None:
+                        cancel_event.wait(min(wait, POLL_INTERVAL))
+                    else:
+                        time.sleep(wait)
+                    continue
+
+                result = precheck(task) if precheck else None
+                if result is not None:
+                    on_result(result)
+                else:
+                    attempt(seq, task, 1)
+                seq += 1
+
+            for _, _, _, result in retries.drain():
+                on_result(result)
+        return session.sessions_opened
+
+    def _run_pool(self, tasks, deliver, on_result, reject, cancel_event, precheck) -> int:
+        work: "queue.Queue" = queue.Queue()
+        done: "queue.Queue" = queue.Queue()
+        slots = threading.Semaphore(self.window)
+        stop = threading.Event()
+        feed_error = []
+        sessions_opened = [0] * self.workers
+
+        def stopped():
+            return stop.is_set() or (cancel_event is not None and cancel_event.is_set())
+
+        # done carries (seq, outcome, task, attempt, is_retry)
+        def feed():
+            fed = 0
+            try:
+                for seq, task in enumerate(tasks):
+                    while not slots.acquire(timeout=POLL_INTERVAL):
+                        if stopped():
+                            break
+                    if stopped():
+                        break
+                    fed += 1
+                    result = precheck(task) if precheck else None
+                    if result is not None:
+                        done.put((seq, result, None, 0, False))
+                    else:
+                        work.put((seq, task, 1, None))
+            except BaseException as error:
+                feed_error.append(error)
+            finally:
+                done.put((None, _FED, fed, 0, False))
+
+        def work_loop(worker_index):
+            with self.session_factory() as session:
+                try:
+                    while True:
+                        item = work.get()
+                        if item is _DONE:
+                            break
+                        seq, task, attempt, last = item
+                        is_retry = last is not None
+                        if stopped():
+                            # A cancelled retry still reports its last failure
+                            done.put((seq, last if is_retry else _SKIPPED, None, attempt, is_retry))
+                            continue
+                        try:
+                            result = self._attempt(session, task, attempt, deliver, reject, stopped)
+                        except BaseException as error:
+                            done.put((seq, error, None, attempt, is_retry))
+                            continue
+                        if result is None:
+                            # Handed back: queue it again and pause, so another
+                            # worker picks it up rather than this one
+                            work.put(item)
+                            stop.wait(POLL_INTERVAL)
+                            continue
+                        done.put((seq, result, task, attempt, is_retry))
+                finally:
+                    sessions_opened[worker_index] = session.sessions_opened
+                    done.put((None, _DONE, None, 0, False))
+
+        feeder = threading.Thread(target=feed, name="delivery-feeder", daemon=True)
+        threads = [
+            threading.Thread(target=work_loop, args=(index,), name=f"delivery-worker-{index}", daemon=True)
+            for index in range(self.workers)
+        ]
+        feeder.start()
+        for thread in threads:
+            thread.start()
+
+        retries = RetryQueue(self.retry_policy)
+        pending: Dict[int, Any] = {}
+        next_seq = 0
+        fed = None
+        resolved = 0
+        retries_in_flight = 0
+        running = self.workers
+        workers_released = False
+        error = None
+
+        def release_workers():
+            nonlocal workers_released
+            if not workers_released:
+                workers_released = True
+                for _ in range(self.workers):
+                    work.put(_DONE)
+
+        try:
+            while running:
+                if stopped() and len(retries):
+                    for _, _, _, result in retries.drain():
+                        on_result(result)
+                for seq, task, attempt, last in retries.pop_due():
+                    retries_in_flight += 1
+                    work.put((seq, task, attempt, last))
+
+                if fed is not None and resolved == fed and not len(retries) and not retries_in_flight:
+                    release_workers()
+
+                wait = retries.next_due()
+                try:
+                    seq, outcome, task, attempt, is_retry = done.get(
+                        timeout=min(wait, POLL_INTERVAL) if wait is not None else None
+                    )
+                except queue.Empty:
+                    continue
+
+                if outcome is _DONE:
+                    running -= 1
+                    continue
+                if outcome is _FED:
+                    fed = task
+                    continue
+
+                if is_retry:
+                    retries_in_flight -= 1
+                    if isinstance(outcome, BaseException):
+                        raise outcome
+                else:
+                    resolved += 1
+
+                if task is not None:
+                    self._observe(outcome)
+                    if self._should_retry(outcome, attempt, stopped()):
+                        retries.push(seq, task, attempt, outcome)
+                        outcome = _DEFERRED
+
+                if is_retry:
+                    if outcome is not _DEFERRED:
+                        on_result(outcome)
+                    continue
+
+                pending[seq] = outcome
+                # Emit everything that is now contiguous with the last result
+                while next_seq in pending:
+                    result = pending.pop(next_seq)
+                    next_seq += 1
+                    slots.release()
+                    if isinstance(result, BaseException):
+                        raise result
+                    if result is not _DEFERRED and result is not _SKIPPED:
+                        on_result(result)
+
+            # After a cancel, skipped tasks leave gaps; report what was sent
+            for seq in sorted(pending):
+                result = pending[seq]
+                if isinstance(result, BaseException):
+                    raise result
+                if result is not _DEFERRED and result is not _SKIPPED:
+                    on_result(result)
+            for _, _, _, result in retries.drain():
+                on_result(result)
+        except BaseException as exc:
+            error = exc
+            stop.set()
+            release_workers()
+            # Drain the workers so every thread exits
+            while running:
+                _, result, _, _, _ = done.get()
+                if result is _DONE:
+                    running -= 1
+        finally:
+            feeder.join()
+            for thread in threads:
+                thread.join()
+
+        if error is not None:
+            raise error
+        if feed_error:
+            raise feed_error[0]
+        return sum(sessions_opened)
@@ -0,0 +1,154 @@
+"""
+Per-recipient delivery reports of campaign jobs
+
+Every recipient's outcome is buffered and appended in batches to a JSON
+lines file under the job's report directory; each process sending part of
+a job (the web app, or a sender worker per task) writes its own file. A
+report is read back as one stream of rows, as JSON lines or CSV, with each
+recipient's latest real outcome.
+"""
+
+import csv
+import io
+import json
+import os
+import threading
+import time
+from datetime import datetime, timezone
+from typing import Any, Dict, Iterator, List, Optional, Tuple
+
+REPORTS_DIR = os.getenv("DELIVERY_REPORTS_DIR", os.path.join("data", "reports"))
+
+REPORT_FIELDS = (
+    "timestamp", "campaign_id", "email", "name", "status", "code", "category", "error",
+    "attempts", "latency_ms", "account",
+)
+
+
+class DeliveryReport:
+    """Buffered writer of one job's per-recipient outcomes"""
+
+    def __init__(self, job_id: str, campaign_id: Optional[str] = None, part: str = "web",
+                 directory: Optional[str] = None, batch_size: int = 500, flush_interval: float = 1.0):
+        """
+        Args:
+            job_id: Job the outcomes belong to
+            campaign_id: Campaign key written on every row
+            part: File name (without extension) of this writer within the job's
+                report; an existing file of that name (from an earlier run
+                of the same part) is appended to
+            directory: Reports directory (env DELIVERY_REPORTS_DIR, default data/reports)
+            batch_size: Rows buffered before they are written
+            flush_interval: Maximum seconds a row stays buffered
+        """
+        self.campaign_id = campaign_id
+        self.path = os.path.join(report_dir(job_id, directory), f"{part}.jsonl")
+        os.makedirs(os.path.dirname(self.path), exist_ok=True)
+        self.batch_size = batch_size
+        self.flush_interval = flush_interval
+
+        self._lock = threading.Lock()
+        self._rows: List[str] = []
+        self._last_flush = time.monotonic()
+
+    def record(self, result: Dict[str, Any]) -> None:
+        """Buffer one recipient's result, writing the batch when it is due"""
+        row = {"timestamp": datetime.now(timezone.utc).isoformat(timespec="milliseconds"),
+               "campaign_id": self.campaign_id}
+        for field in REPORT_FIELDS[2:]:
+            if field in result:
+                row[field] = result[field]
+        line = json.dumps(row, ensure_ascii=False)
+        with self._lock:
+            self._rows.append(line)
+            if len(self._rows) >= self.batch_size or time.monotonic() - self._last_flush >= self.flush_interval:
+                self._flush_locked()
+
+    def flush(self) -> None:
+        with self._lock:
+            self._flush_locked()
+
+    def _flush_locked(self) -> None:
+        self._last_flush = time.monotonic()
+        if not self._rows:
+            return
+        with open(self.path, "a", encoding="utf-8") as file:
+            file.write("\n".join(self._rows) + "\n")
+        self._rows.clear()
+
+    def close(self) -> None:
+        self.flush()
+
+    def __enter__(self) -> "DeliveryReport":
+        return self
+
+    def __exit__(self, exc_type, exc, tb) -> None:
+        self.close()
+
+
+def report_dir(job_id: str, directory: Optional[str] = None) -> str:
+    """Directory holding a job's report files"""
+    if not job_id.isalnum():
+        raise ValueError(f"Invalid job id: {job_id}")
+    return os.path.join(directory or REPORTS_DIR, job_id)
+
+
+def iter_report(job_id: str, directory: Optional[str] = None) -> Iterator[Dict[str, Any]]:
+    """
+    Every recipient's row of a job's report, file by file; nothing if there is no report
+
+    A part is appended to by every run of its send (resumed after a pause
+    or a restart, or a re-leased task), so a recipient may have several
+    rows. The latest real outcome is kept; a 'skipped' row, written when a
+    re-run finds the recipient already sent, is only kept if there is no
+    other. Two passes over the files keep just one key per recipient in
+    memory.
+    """
+    path = report_dir(job_id, directory)
+    if not os.path.isdir(path):
+        return
+    # task-2 before task-10
+    names = sorted((name for name in os.listdir(path) if name.endswith(".jsonl")),
+                   key=lambda name: (len(name), name))
+    files = [os.path.join(path, name) for name in names]
+
+    chosen: Dict[str, Tuple[Tuple[int, int], bool]] = {}
+    for position, row in _iter_rows(files):
+        key = row.get("email", "").strip().lower()
+        real = row.get("status") != "skipped"
+        previous = chosen.get(key)
+        if previous is None or real or not previous[1]:
+            chosen[key] = (position, real)
+
+    keep = {position for position, _ in chosen.values()}
+    del chosen
+    for position, row in _iter_rows(files):
+        if position in keep:
+            yield row
+
+
+def _iter_rows(files: List[str]) -> Iterator[Tuple[Tuple[int, int], Dict[str, Any]]]:
+    """Rows of report files with their (file, line) position"""
+    for file_number, file_path in enumerate(files):
+        try:
+            file = open(file_path, encoding="utf-8")
+        except FileNotFoundError:
+            continue
+        with file:
+            for line_number, line in enumerate(file):
+                if line.strip():
+                    yield (file_number, line_number), json.loads(line)
+
+
+def report_csv(rows: Iterator[Dict[str, Any]], batch_rows: int = 1000) -> Iterator[str]:
+    """Render report rows as CSV text, a header and then chunks of batch_rows rows"""
+    buffer = io.StringIO()
+    writer = csv.DictWriter(buffer, fieldnames=REPORT_FIELDS, extrasaction="ignore")
+    writer.writeheader()
+    for count, row in enumerate(rows, 1):
+        writer.writerow(row)
+        if not count % batch_rows:
+            yield buffer.getvalue()
+            buffer.seek(0)
+            buffer.truncate()
+    yield buffer.getvalue()
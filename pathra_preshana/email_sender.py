@@ -2,26 +2,237 @@
 Email sending functionality using Gmail SMTP
 """
 
-import smtplib
 import os
-from email.mime.text import MIMEText
-from email.mime.multipart import MIMEMultipart
-from typing import List, Dict
+import smtplib
+import threading
+import time
+from itertools import islice
+from typing import Any, Callable, Dict, Iterable, Iterator, List, Optional, Sequence, Union
+
+from pathra_preshana import metrics
+from pathra_preshana.assets import Asset
+from pathra_preshana.delivery import DeliveryEngine
+from pathra_preshana.journal import SendJournal
+from pathra_preshana.log import get_logger
+from pathra_preshana.message_builder import MessageBuilder
+from pathra_preshana.rate_limit import RateLimiter, get_rate_limiter
+from pathra_preshana.retry import PERMANENT, QUOTA, TRANSIENT, RetryPolicy, classify_failure
+from pathra_preshana.smtp_session import SMTPSession
+from pathra_preshana.templating import CompiledTemplate, compile_template
+
+log = get_logger(__name__)
+
+
+def _env_number(name: str, cast):
+    value = os.getenv(name, "").strip()
+    return cast(value) if value else None
+
+
+def _result(recipient: Dict[str, str], status: str, error: str = "", category: str = "",
+            code: str = "", **extra) -> Dict[str, Any]:
+    return {"email": recipient["email"], "name": recipient.get("name", ""), "status": status,
+            "error": error, "category": category, "code": code, **extra}
+
+
+class _RecipientBatch:
+    """Recipients sharing one message: those still to deliver and results settled so far"""
+
+    __slots__ = ("pending", "settled", "attempts")
+
+    def __init__(self, recipients: List[Dict[str, str]]):
+        self.pending = recipients
+        self.settled: List[Dict[str, Any]] = []
+        self.attempts = 0
+
+    def outcome(self, failed: List[Dict[str, Any]], accepted: bool) -> Dict[str, Any]:
+        """Batch-level result for the delivery engine, carrying per-recipient 'results'"""
+        if failed and failed[0]["category"] == TRANSIENT:
+            status, category, code = "failed", TRANSIENT, failed[0]["code"]
+        elif accepted:
+            status, category, code = "sent", "", "250"
+        else:
+            status, category, code = "failed", PERMANENT, failed[0]["code"] if failed else ""
+        return {"status": status, "category": category, "code": code, "results": self.settled + failed}
+
+
+def _batched(recipients: Iterable[Dict[str, str]], size: int,
+             rate_limiter: Optional[RateLimiter] = None) -> Iterator[_RecipientBatch]:
+    """
+    Group recipients for shared messages
+
+    A message counts all of its recipients against the daily quota at once,
+    so with a rate_limiter no batch is cut larger than the quota left at
+    that moment; otherwise one over-sized batch could never be sent.
+    """
+    iterator = iter(recipients)
+    while True:
+        limit = size
+        remaining = rate_limiter.remaining_today() if rate_limiter is not None else None
+        if remaining:
+            limit = min(size, remaining)
+        chunk = list(islice(iterator, limit))
+        if not chunk:
+            return
+        yield _RecipientBatch(chunk)
+
+
+class _BulkCampaign:
+    """Result counting, journaling and resume checks shared by the sending backends"""
+
+    def __init__(self, on_result: Optional[Callable[[Dict[str, str]], None]], journal: Optional[SendJournal],
+                 campaign_id: Optional[str], resume: bool):
+        if journal is not None and not campaign_id:
+            raise ValueError("campaign_id is required when a journal is used")
+        self.on_result = on_result
+        self.journal = journal
+        self.campaign_id = campaign_id
+        self.resuming = resume and journal is not None
+        self.results: Dict[str, Any] = {
+            "success": 0, "failed": 0, "failures": {TRANSIENT: 0, PERMANENT: 0, QUOTA: 0}, "retries": 0
+        }
+        if resume:
+            self.results["skipped"] = 0
+
+    @staticmethod
+    def reject(recipient: Dict[str, str], reason: str) -> Dict[str, Any]:
+        log.warning("Not sending", extra={"email": recipient["email"], "recipient": recipient["name"],
+                                          "reason": reason})
+        return _result(recipient, "failed", reason, QUOTA)
+
+    def already_sent(self, recipient: Dict[str, str]) -> Optional[Dict[str, Any]]:
+        if not self.journal.is_delivered(self.campaign_id, recipient["email"]):
+            return None
+        return _result(recipient, "skipped")
+
+    def reject_batch(self, batch: _RecipientBatch, reason: str) -> Dict[str, Any]:
+        failed = [self.reject(recipient, reason) for recipient in batch.pending]
+        return {"status": "failed", "category": QUOTA, "code": "", "results": batch.settled + failed}
+
+    def already_sent_batch(self, batch: _RecipientBatch) -> Optional[Dict[str, Any]]:
+        pending = []
+        for recipient in batch.pending:
+            skipped = self.already_sent(recipient)
+            if skipped is None:
+                pending.append(recipient)
+            else:
+                batch.settled.append(skipped)
+        batch.pending = pending
+        if pending:
+            return None
+        return {"status": "skipped", "category": "", "code": "", "results": batch.settled}
+
+    def record(self, result: Dict[str, Any]) -> None:
+        """Count a final result, or each recipient's result of a shared message"""
+        for recipient_result in result["results"] if "results" in result else (result,):
+            self._record_one(recipient_result)
+
+    def _record_one(self, result: Dict[str, Any]) -> None:
+        results = self.results
+        if result["status"] == "sent":
+            results["success"] += 1
+        elif result["status"] == "skipped":
+            results["skipped"] += 1
+        else:
+            results["failed"] += 1
+            results["failures"][result.get("category") or PERMANENT] += 1
+        results["retries"] += max(0, result.get("attempts", 1) - 1)
+        if self.journal is not None and result["status"] != "skipped":
+            self.journal.record(self.campaign_id, result)
+        if self.on_result:
+            self.on_result(result)
+
+    def flush(self) -> None:
+        if self.journal is not None:
+            self.journal.flush()
 
 
 class EmailSender:
     """Class to handle email sending via Gmail"""
     
-    def __init__(self, smtp_server: str = "smtp.gmail.com", smtp_port: int = 587):
+    def __init__(self, smtp_server: str = "smtp.gmail.com", smtp_port: int = 587,
+                 max_messages_per_connection: int = 100, workers: Optional[int] = None,
+                 rate_per_second: Optional[float] = None, rate_per_day: Optional[int] = None,
+                 max_retries: Optional[int] = None, max_recipients_per_message: Optional[int] = None):
+        """
+        Args:
+            smtp_server: SMTP server hostname
+            smtp_port: SMTP server port (STARTTLS)
+            max_messages_per_connection: Messages per SMTP connection before it is recycled
+            workers: Concurrent SMTP sessions for bulk sends (env SMTP_WORKERS, default 1)
+            rate_per_second: Messages/sec cap (env SMTP_RATE_PER_SECOND, default
+                unlimited); 0 disables a configured cap
+            rate_per_day: Messages cap in any 24 hours (env SMTP_RATE_PER_DAY,
+                default unlimited); 0 disables a configured cap
+            max_retries: Retries of transient (4xx) failures per recipient
+                (env SMTP_MAX_RETRIES, default 3); backoff starts at
+                SMTP_RETRY_BASE_DELAY seconds (default 2) and is capped at
+                SMTP_RETRY_MAX_DELAY (default 60)
+            max_recipients_per_message: RCPT TO cap when one message is shared
+                by many recipients of a template without placeholders
+                (env SMTP_MAX_RECIPIENTS_PER_MESSAGE, default 50; 1 disables)
+        """
         self.smtp_server = smtp_server
         self.smtp_port = smtp_port
+        self.max_messages_per_connection = max_messages_per_connection
         self.sender_email = os.getenv("GMAIL_USER")
         self.sender_password = os.getenv("GMAIL_APP_PASSWORD")
         
         if not self.sender_email or not self.sender_password:
             raise ValueError("GMAIL_USER and GMAIL_APP_PASSWORD must be set in environment variables")
+        
+        self.rate_limiter = get_rate_limiter(
+            self.sender_email,
+            per_second=rate_per_second if rate_per_second is not None else _env_number("SMTP_RATE_PER_SECOND", float),
+            per_day=rate_per_day if rate_per_day is not None else _env_number("SMTP_RATE_PER_DAY", int)
+        )
+        self._configure_delivery(workers or _env_number("SMTP_WORKERS", int) or 1,
+                                 max_retries, max_recipients_per_message)
+    
+    def _configure_delivery(self, workers: int, max_retries: Optional[int],
+                            max_recipients_per_message: Optional[int]) -> None:
+        """Worker count, retry policy and batching shared by every kind of sender"""
+        self.workers = workers
+        if max_retries is None:
+            max_retries = _env_number("SMTP_MAX_RETRIES", int)
+        self.retry_policy = RetryPolicy(
+            max_retries=3 if max_retries is None else max_retries,
+            base_delay=_env_number("SMTP_RETRY_BASE_DELAY", float) or 2.0,
+            max_delay=_env_number("SMTP_RETRY_MAX_DELAY", float) or 60.0
+        )
+        self.max_recipients_per_message = max(1, max_recipients_per_message
+                                              or _env_number("SMTP_MAX_RECIPIENTS_PER_MESSAGE", int) or 50)
+    
+    def share_rate_limiter(self, wrap: Callable[[RateLimiter], Any]) -> None:
+        """
+        Route this sender's pacing through a wrapper of its rate limiter
+        
+        Args:
+            wrap: Called with the account's limiter, returning the limiter
+                to send with, e.g. a campaign's turn at a FairShare
+        """
+        if self.rate_limiter is not None:
+            self.rate_limiter = wrap(self.rate_limiter)
+    
+    def open_session(self) -> SMTPSession:
+        """
+        Create a reusable SMTP session for this sender
+        
+        The connection is opened lazily on the first message and recycled
+        after max_messages_per_connection messages.
+        
+        Returns:
+            SMTPSession bound to this sender's server and credentials
+        """
+        return SMTPSession(
+            self.smtp_server,
+            self.smtp_port,
+            self.sender_email,
+            self.sender_password,
+            max_messages_per_connection=self.max_messages_per_connection
+        )
     
-    def send_email(self, recipient_email: str, recipient_name: str, subject: str, html_content: str) -> bool:
+    def send_email(self, recipient_email: str, recipient_name: str, subject: str, html_content: str,
+                   session: Optional[SMTPSession] = None) -> bool:
         """
         Send an email to a single recipient
         
@@ -30,61 +241,226 @@ class EmailSender:
             recipient_name: Name of recipient
             subject: Email subject line
             html_content: HTML formatted email content
+            session: Optional open SMTPSession to reuse; a one-off
+                connection is used when omitted
             
         Returns:
             bool: True if email sent successfully, False otherwise
         """
+        builder = MessageBuilder(self.sender_email, subject, CompiledTemplate.literal(html_content))
+        recipient = {"email": recipient_email, "name": recipient_name}
+        
+        if session is not None:
+            result = self._send_one(session, builder, recipient)
+        else:
+            with self.open_session() as one_off_session:
+                result = self._send_one(one_off_session, builder, recipient)
+        return result["status"] == "sent"
+    
+    def _send_one(self, session: SMTPSession, builder: MessageBuilder, recipient: Dict[str, str]) -> Dict[str, str]:
+        """Send one recipient's message and return its result"""
+        started = time.perf_counter()
         try:
-            # Create message
-            message = MIMEMultipart("alternative")
-            message["Subject"] = subject
-            message["From"] = self.sender_email
-            message["To"] = recipient_email
-            
-            # Create HTML message
-            html_message = MIMEText(html_content, "html")
-            message.attach(html_message)
-            
-            # Send email via SMTP
-            with smtplib.SMTP(self.smtp_server, self.smtp_port) as server:
-                server.starttls()
-                server.login(self.sender_email, self.sender_password)
-                server.send_message(message)
-            
-            print(f"✓ Email sent successfully to {recipient_name} ({recipient_email})")
-            return True
-            
+            # Build the message from the campaign skeleton and send it as bytes
+            with metrics.render_seconds.time():
+                to_addrs, message = builder.build(recipient)
+            started = time.perf_counter()
+            session.sendmail(builder.sender_email, to_addrs, message)
+        except Exception as e:
+            return self._settle_one(recipient, e, time.perf_counter() - started)
+        return self._settle_one(recipient, latency=time.perf_counter() - started)
+    
+    @staticmethod
+    def _settle_one(recipient: Dict[str, str], error: Optional[Exception] = None,
+                    latency: float = 0.0) -> Dict[str, str]:
+        """Report and classify the outcome of one recipient's message; latency is its SMTP time in seconds"""
+        latency_ms = round(latency * 1000, 1)
+        recipient_email = recipient["email"]
+        recipient_name = recipient.get("name", "")
+        
+        if error is None:
+            metrics.messages_sent.inc()
+            log.info("Email sent", extra={"email": recipient_email, "recipient": recipient_name, "code": "250"})
+            return _result(recipient, "sent", code="250", latency_ms=latency_ms)
+        
+        category, code = classify_failure(error)
+        metrics.messages_failed.inc(1, code)
+        log.warning("Email failed", extra={"email": recipient_email, "recipient": recipient_name,
+                                           "category": category, "code": code, "error": str(error)})
+        return _result(recipient, "failed", str(error), category, code, latency_ms=latency_ms)
+    
+    def _send_shared(self, session: SMTPSession, builder: MessageBuilder, batch: _RecipientBatch) -> Dict[str, Any]:
+        """
+        Send one message to a batch of recipients with a RCPT TO each
+        
+        Recipients the server refuses individually get their own result;
+        those refused with a 4xx reply stay pending for a retry, so a retry
+        never repeats the message to recipients that already accepted it.
+        """
+        refused: Dict[str, tuple] = {}
+        started = time.perf_counter()
+        try:
+            with metrics.render_seconds.time():
+                to_addrs, message = builder.build_shared(batch.pending)
+            started = time.perf_counter()
+            refused = session.sendmail(builder.sender_email, to_addrs, message)
+        except smtplib.SMTPRecipientsRefused as e:
+            refused = e.recipients
         except Exception as e:
-            print(f"✗ Failed to send email to {recipient_name} ({recipient_email}): {str(e)}")
-            return False
+            return self._settle_shared(batch, error=e, latency=time.perf_counter() - started)
+        return self._settle_shared(batch, refused, latency=time.perf_counter() - started)
+    
+    @staticmethod
+    def _settle_shared(batch: _RecipientBatch, refused: Optional[Dict[str, tuple]] = None,
+                       error: Optional[Exception] = None, latency: float = 0.0) -> Dict[str, Any]:
+        """Per-recipient outcomes of one shared message, from its refused recipients or error"""
+        batch.attempts += 1
+        latency_ms = round(latency * 1000, 1)
+        refused = refused or {}
+        failed, retry = [], []
+        accepted = 0
+        for recipient in batch.pending:
+            email, name = recipient["email"], recipient.get("name", "")
+            if error is not None:
+                category, code = classify_failure(error)
+                reason = str(error)
+            elif email in refused:
+                reply_code, reply = refused[email]
+                code = str(reply_code)
+                category = TRANSIENT if code.startswith("4") else PERMANENT
+                reason = f"{code} {reply.decode('utf-8', 'replace') if isinstance(reply, bytes) else reply}"
+            else:
+                accepted += 1
+                log.info("Email sent", extra={"email": email, "recipient": name, "code": "250"})
+                batch.settled.append(_result(recipient, "sent", code="250", attempts=batch.attempts,
+                                             latency_ms=latency_ms))
+                continue
+            
+            metrics.messages_failed.inc(1, code)
+            log.warning("Email failed", extra={"email": email, "recipient": name, "category": category,
+                                               "code": code, "error": reason})
+            result = _result(recipient, "failed", reason, category, code, attempts=batch.attempts,
+                             latency_ms=latency_ms)
+            if category == TRANSIENT:
+                failed.append(result)
+                retry.append(recipient)
+            else:
+                batch.settled.append(result)
+        
+        metrics.messages_sent.inc(accepted)
+        batch.pending = retry
+        return batch.outcome(failed, accepted > 0)
     
-    def send_bulk_emails(self, recipients: List[Dict[str, str]], subject: str, html_template: str) -> Dict[str, int]:
+    def send_bulk_emails(self, recipients: Iterable[Dict[str, str]], subject: str,
+                         html_template: Union[str, CompiledTemplate],
+                         on_result: Optional[Callable[[Dict[str, str]], None]] = None,
+                         cancel_event: Optional[threading.Event] = None,
+                         journal: Optional[SendJournal] = None, campaign_id: Optional[str] = None,
+                         resume: bool = False, assets: Sequence[Asset] = ()) -> Dict[str, int]:
         """
         Send emails to multiple recipients
         
+        Messages are spread over self.workers logged-in SMTP sessions, each
+        reused for many messages, and paced by the account's rate limiter,
+        which slows down while the server replies with throttling codes.
+        Transient failures (4xx, dropped connections) are retried with
+        jittered exponential backoff; permanent ones (5xx) are not. A
+        template without placeholders is sent as one message per batch of
+        up to max_recipients_per_message hidden recipients, with each
+        recipient's RCPT TO outcome still reported separately.
+        
         Args:
-            recipients: List of dictionaries with 'email' and 'name' keys
+            recipients: Iterable of dictionaries with 'email' and 'name' keys
             subject: Email subject line
-            html_template: HTML template with {name} placeholder
+            html_template: HTML template, or CompiledTemplate, with {column}
+                placeholders filled from each recipient's CSV row
+            on_result: Optional callback receiving each recipient's final
+                result ('email', 'name', 'status', 'error', 'category',
+                'code', 'attempts'), in input order except for retried ones
+            cancel_event: Optional event that stops the send once set;
+                recipients not yet attempted are left out of the counts
+            journal: Optional SendJournal recording each outcome under campaign_id
+            campaign_id: Campaign key in the journal
+            resume: Skip recipients the journal shows already received this
+                campaign; they are reported with status 'skipped'
+            assets: Inline images and attachments for every message, as
+                returned by assets.campaign_assets (encoded once, shared)
             
         Returns:
-            Dictionary with 'success' and 'failed' counts
+            Dictionary with 'success' and 'failed' counts, 'failures' broken
+            down by category ('transient' after exhausting retries,
+            'permanent', 'quota'), the number of 'retries', the number of
+            SMTP sessions opened as 'sessions_opened' and, when resuming,
+            the number of recipients 'skipped'
         """
-        results = {"success": 0, "failed": 0}
-        
-        for recipient in recipients:
-            # Replace {name} placeholder with actual name
-            personalized_content = html_template.replace("{name}", recipient.get("name", ""))
-            
-            if self.send_email(
-                recipient_email=recipient["email"],
-                recipient_name=recipient["name"],
-                subject=subject,
-                html_content=personalized_content
-            ):
-                results["success"] += 1
-            else:
-                results["failed"] += 1
-        
-        return results
+        template = compile_template(html_template)
+        campaign = _BulkCampaign(on_result, journal, campaign_id, resume)
+        try:
+            campaign.results["sessions_opened"] = self._deliver(recipients, subject, template, assets,
+                                                                campaign, cancel_event)
+        finally:
+            campaign.flush()
+        return campaign.results
+    
+    def _deliver(self, recipients: Iterable[Dict[str, str]], subject: str, template: CompiledTemplate,
+                 assets: Sequence[Asset], campaign: _BulkCampaign, cancel_event: Optional[threading.Event]) -> int:
+        """Run a campaign's deliveries through the engine; returns the SMTP sessions opened"""
+        builder = MessageBuilder(self.sender_email, subject, template, assets)
+        engine = DeliveryEngine(self.open_session, workers=self.workers, rate_limiter=self.rate_limiter,
+                                retry_policy=self.retry_policy)
+        # Without placeholders every recipient gets the same bytes, so one
+        # message with many RCPT TO replaces many identical DATA transfers
+        if template.is_static and self.max_recipients_per_message > 1:
+            return engine.run(
+                _batched(recipients, self.max_recipients_per_message, self.rate_limiter),
+                lambda session, batch: self._send_shared(session, builder, batch),
+                campaign.record, campaign.reject_batch,
+                cancel_event=cancel_event,
+                precheck=campaign.already_sent_batch if campaign.resuming else None,
+                weight=lambda batch: len(batch.pending)
+            )
+        return engine.run(
+            recipients,
+            lambda session, recipient: self._send_one(session, builder, recipient),
+            campaign.record, campaign.reject,
+            cancel_event=cancel_event,
+            precheck=campaign.already_sent if campaign.resuming else None
+        )
 
+
+def create_email_sender(backend: Optional[str] = None, **kwargs) -> EmailSender:
+    """
+    Build the EmailSender for the configured delivery backend
+    
+    When env SMTP_ACCOUNTS_FILE names a JSON list of sender accounts, bulk
+    sends are spread over all of them (see sender_pool.PooledEmailSender).
+    
+    Args:
+        backend: 'threads' (smtplib sessions, one thread each) or 'async'
+            (asyncio sessions sharing one event loop); env EMAIL_BACKEND,
+            default 'threads'
+        **kwargs: EmailSender arguments
+        
+    Returns:
+        EmailSender, AsyncEmailSender for the async backend, or
+        PooledEmailSender for a pool of accounts
+    """
+    backend = (backend or os.getenv("EMAIL_BACKEND", "") or "threads").strip().lower()
+    if backend not in ("threads", "async"):
+        raise ValueError(f"Unknown EMAIL_BACKEND '{backend}' (expected 'threads' or 'async')")
+    
+    accounts_file = os.getenv("SMTP_ACCOUNTS_FILE", "").strip()
+    if accounts_file:
+        if backend != "threads":
+            raise ValueError("SMTP_ACCOUNTS_FILE requires EMAIL_BACKEND=threads")
+        # Imported here because both build on this module
+        from pathra_preshana.sender_pool import PooledEmailSender, load_accounts
+        return PooledEmailSender(load_accounts(accounts_file), **{
+            key: value for key, value in kwargs.items()
+            if key in ("workers", "max_retries", "max_recipients_per_message")
+        })
+    
+    if backend == "async":
+        from pathra_preshana.async_sender import AsyncEmailSender
+        return AsyncEmailSender(**kwargs)
+    return EmailSender(**kwargs)
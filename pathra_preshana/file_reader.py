@@ -3,8 +3,154 @@ File reading functionality for HTML templates and CSV email lists
 """
 
 import csv
+import json
+import os
+import threading
+import time
+from collections import OrderedDict
+from itertools import islice
 from pathlib import Path
-from typing import List, Dict
+from typing import Any, Callable, Dict, Iterator, List, Optional, Tuple
+
+from pathra_preshana import metrics
+from pathra_preshana.log import get_logger
+from pathra_preshana.recipient_filter import SourceRow
+from pathra_preshana.recipient_store import RecipientStore
+
+log = get_logger(__name__)
+
+# Parsed recipient dicts take roughly this many times the CSV's size in memory
+CSV_MEMORY_FACTOR = 8
+
+# Rows parsed between updates of the CSV parse metrics
+METRICS_BATCH_ROWS = 1000
+
+# Sidecar written next to ingested CSVs: the byte offset of every
+# CSV_INDEX_STRIDE-th recipient, so pages can seek instead of scanning
+CSV_INDEX_SUFFIX = ".idx"
+CSV_INDEX_STRIDE = 1000
+
+
+class FileCache:
+    """
+    Process-wide LRU cache of file contents and parse results
+    
+    Entries are keyed by kind and path and are only served while the file's
+    mtime and size are unchanged. Eviction is bounded both by entry count
+    and by (estimated) bytes held. A load returning None (e.g. no recipient
+    store yet) is not cached, since the missing file may appear without the
+    source file changing.
+    """
+    
+    def __init__(self, max_entries: int = 64, max_bytes: int = 64 * 1024 * 1024):
+        self.max_entries = max_entries
+        self.max_bytes = max_bytes
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self._entries: "OrderedDict[Tuple[str, str], Tuple[Tuple[int, int], Any, int]]" = OrderedDict()
+        self._bytes = 0
+        self._lock = threading.Lock()
+    
+    @staticmethod
+    def _key(kind: str, file_path) -> Tuple[str, str]:
+        return kind, os.path.abspath(file_path)
+    
+    @staticmethod
+    def _signature(file_path) -> Tuple[int, int]:
+        stat = os.stat(file_path)
+        return stat.st_mtime_ns, stat.st_size
+    
+    def peek(self, kind: str, file_path) -> Optional[Any]:
+        """Return a fresh cached value without loading on a miss"""
+        key = self._key(kind, file_path)
+        signature = self._signature(file_path)
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None or entry[0] != signature:
+                return None
+            self._entries.move_to_end(key)
+            self.hits += 1
+            return entry[1]
+    
+    def get(self, kind: str, file_path, load: Callable[[Any], Any], weight_factor: float = 1.0) -> Any:
+        """
+        Return the cached value for a file, loading it on a miss
+        
+        Args:
+            kind: What was derived from the file (e.g. 'template', 'recipients')
+            file_path: Path to the file
+            load: Called with file_path to produce the value on a miss
+            weight_factor: Estimated memory held, as a multiple of the file size
+            
+        Returns:
+            The cached or freshly loaded value
+        """
+        key = self._key(kind, file_path)
+        signature = self._signature(file_path)
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None and entry[0] == signature:
+                self._entries.move_to_end(key)
+                self.hits += 1
+                return entry[1]
+            self.misses += 1
+        
+        value = load(file_path)
+        if value is None:
+            return None
+        weight = int(signature[1] * weight_factor) + 256
+        
+        with self._lock:
+            self._discard(key)
+            if weight <= self.max_bytes:
+                self._entries[key] = (signature, value, weight)
+                self._bytes += weight
+                while len(self._entries) > self.max_entries or self._bytes > self.max_bytes:
+                    self._discard(next(iter(self._entries)))
+                    self.evictions += 1
+        return value
+    
+    def invalidate(self, file_path) -> None:
+        """Drop every cached entry for a file"""
+        path = os.path.abspath(file_path)
+        with self._lock:
+            for key in [key for key in self._entries if key[1] == path]:
+                self._discard(key)
+    
+    def clear(self) -> None:
+        with self._lock:
+            self._entries.clear()
+            self._bytes = 0
+    
+    def stats(self) -> Dict[str, int]:
+        with self._lock:
+            return {
+                "hits": self.hits,
+                "misses": self.misses,
+                "evictions": self.evictions,
+                "entries": len(self._entries),
+                "bytes": self._bytes,
+            }
+    
+    def _discard(self, key) -> None:
+        entry = self._entries.pop(key, None)
+        if entry is not None:
+            self._bytes -= entry[2]
+
+
+file_cache = FileCache(
+    max_entries=int(os.getenv("FILE_CACHE_MAX_ENTRIES", "64")),
+    max_bytes=int(os.getenv("FILE_CACHE_MAX_MB", "64")) * 1024 * 1024
+)
+
+# One recipient store build at a time; a second caller waits and reuses it
+_store_build_lock = threading.Lock()
+
+metrics.REGISTRY.gauge("pathra_file_cache_entries", "Entries held by the file cache",
+                       lambda: file_cache.stats()["entries"])
+metrics.REGISTRY.gauge("pathra_file_cache_bytes", "Estimated bytes held by the file cache",
+                       lambda: file_cache.stats()["bytes"])
 
 
 class FileReader:
@@ -26,59 +172,395 @@ class FileReader:
             if not path.exists():
                 raise FileNotFoundError(f"HTML template file not found: {file_path}")
             
-            with open(path, "r", encoding="utf-8") as file:
-                return file.read()
+            return file_cache.get("template", path, FileReader._load_text)
         
         except Exception as e:
             raise Exception(f"Error reading HTML template: {str(e)}")
     
     @staticmethod
-    def read_csv_recipients(file_path: str) -> List[Dict[str, str]]:
+    def _load_text(path) -> str:
+        with open(path, "r", encoding="utf-8") as file:
+            return file.read()
+    
+    @staticmethod
+    def invalidate(file_path: str) -> None:
+        """Forget cached contents of a file, e.g. after it was replaced by an upload"""
+        file_cache.invalidate(file_path)
+    
+    @staticmethod
+    def cache_stats() -> Dict[str, int]:
+        """Hit/miss/eviction counters and current size of the file cache"""
+        return file_cache.stats()
+    
+    @staticmethod
+    def iter_csv_recipients(file_path: str) -> Iterator[Dict[str, str]]:
         """
-        Read CSV file with email recipients
+        Stream recipients from a CSV file one row at a time
         
-        Expected CSV format:
-        name,email
-        John Doe,john@example.com
-        Jane Smith,jane@example.com
+        The file is opened and its header validated immediately; rows are
+        then read lazily, so memory use does not depend on the file size.
         
         Args:
             file_path: Path to CSV file
             
         Returns:
-            List of dictionaries with 'name' and 'email' keys
+            Iterator of dictionaries with 'name' and 'email' keys plus
+            every other CSV column
         """
-        recipients = []
-        
+        file = None
         try:
             path = Path(file_path)
             if not path.exists():
                 raise FileNotFoundError(f"CSV file not found: {file_path}")
             
-            with open(path, "r", encoding="utf-8") as file:
-                reader = csv.DictReader(file)
-                
-                # Validate headers
-                if "email" not in reader.fieldnames:
-                    raise ValueError("CSV file must contain 'email' column")
-                
-                # Read rows
+            # Serve already-parsed files from the cache, but never fill it
+            # from here so that streaming large files stays constant-memory
+            cached = file_cache.peek("recipients", path)
+            if cached is not None:
+                return iter(cached)
+            
+            file = open(path, "r", encoding="utf-8", newline="")
+            reader = csv.DictReader(file)
+            
+            # Validate headers
+            if not reader.fieldnames or "email" not in reader.fieldnames:
+                raise ValueError("CSV file must contain 'email' column")
+        
+        except Exception as e:
+            if file is not None:
+                file.close()
+            raise Exception(f"Error reading CSV file: {str(e)}")
+        
+        return FileReader._iter_rows(file_path, file, reader)
+    
+    @staticmethod
+    def _iter_rows(file_path, file, reader: csv.DictReader, lines: bool = True) -> Iterator[Dict[str, str]]:
+        # Rows are SourceRows carrying their CSV line number, unless the
+        # reader did not start at the top of the file (lines=False)
+        # Parse time excludes time spent by the consumer between rows and is
+        # reported in batches to keep per-row overhead to two clock reads
+        clock = time.perf_counter
+        parse_seconds = 0.0
+        rows = 0
+        try:
+            with file:
+                started = clock()
                 for row in reader:
-                    email = row.get("email", "").strip()
-                    name = row.get("name", "").strip()
+                    rows += 1
+                    email = (row.get("email") or "").strip()
+                    name = (row.get("name") or "").strip()
                     
                     if not email:
-                        print(f"Warning: Skipping row with empty email: {row}")
+                        log.warning("Skipping row with empty email",
+                                    extra={"path": str(file_path), "line": reader.line_num})
                         continue
                     
-                    recipients.append({
-                        "name": name if name else email.split("@")[0],
-                        "email": email
-                    })
+                    # Keep every column so templates can use any of them
+                    recipient = SourceRow({key: (value or "").strip() for key, value in row.items() if key},
+                                          reader.line_num if lines else None)
+                    recipient["name"] = name if name else email.split("@")[0]
+                    recipient["email"] = email
+                    parse_seconds += clock() - started
+                    if rows >= METRICS_BATCH_ROWS:
+                        metrics.csv_rows.inc(rows)
+                        metrics.csv_parse_seconds.inc(parse_seconds)
+                        rows, parse_seconds = 0, 0.0
+                    yield recipient
+                    started = clock()
+                parse_seconds += clock() - started
+        
+        except csv.Error as e:
+            raise Exception(f"Error reading CSV file: line {reader.line_num}: {str(e)}")
+        finally:
+            if rows:
+                metrics.csv_rows.inc(rows)
+                metrics.csv_parse_seconds.inc(parse_seconds)
+    
+    @staticmethod
+    def iter_csv_recipient_chunks(file_path: str, chunk_size: int = 1000) -> Iterator[List[Dict[str, str]]]:
+        """
+        Stream recipients from a CSV file in lists of up to chunk_size rows
+        
+        Args:
+            file_path: Path to CSV file
+            chunk_size: Maximum recipients per chunk
+            
+        Returns:
+            Iterator of recipient lists
+        """
+        recipients = FileReader.iter_csv_recipients(file_path)
+        while True:
+            chunk = list(islice(recipients, chunk_size))
+            if not chunk:
+                return
+            yield chunk
+    
+    @staticmethod
+    def read_csv_recipient_page(file_path: str, offset: int = 0, limit: int = 100,
+                                where: Optional[Dict[str, str]] = None) -> List[Dict[str, str]]:
+        """
+        Read one page of recipients, stopping as soon as the page is full
+        
+        Pages come from the file's recipient store when it has one, and
+        filtered pages always do (building it on first use).
+        
+        Args:
+            file_path: Path to CSV file
+            offset: Number of (matching) recipients to skip
+            limit: Maximum recipients to return
+            where: Optional column = value filters
+            
+        Returns:
+            List of recipient dictionaries
+        """
+        store = FileReader.recipient_store(file_path, build=bool(where))
+        if store is not None:
+            return list(store.select(where, offset, limit))
+        
+        index = FileReader.read_csv_index(file_path)
+        if index is not None and offset >= CSV_INDEX_STRIDE and file_cache.peek("recipients", file_path) is None:
+            recipients = FileReader._iter_indexed(file_path, index, offset)
+            offset %= CSV_INDEX_STRIDE
+        else:
+            recipients = FileReader.iter_csv_recipients(file_path)
+        try:
+            return list(islice(recipients, offset, offset + limit))
+        finally:
+            # Release the file handle right away instead of at garbage collection
+            close = getattr(recipients, "close", None)
+            if close:
+                close()
+    
+    @staticmethod
+    def select_csv_recipients(file_path: str, where: Optional[Dict[str, str]] = None, offset: int = 0,
+                              limit: Optional[int] = None) -> Iterator[Dict[str, str]]:
+        """
+        Stream a slice and/or segment of a recipient list
+        
+        Reads from the file's recipient store, building it on first use, so
+        slices start without scanning and filters use an index.
+        
+        Args:
+            file_path: Path to CSV file
+            where: Optional column = value filters; every one must match
+            offset: Number of matching recipients to skip
+            limit: Maximum recipients to return
             
-            print(f"✓ Successfully loaded {len(recipients)} recipients from CSV")
-            return recipients
+        Returns:
+            Iterator of recipient dictionaries
+        """
+        return FileReader.recipient_store(file_path, build=True).select(where, offset, limit)
+    
+    @staticmethod
+    def recipient_store(file_path: str, build: bool = False) -> Optional[RecipientStore]:
+        """
+        Get the recipient store of a CSV file
         
+        Args:
+            file_path: Path to CSV file
+            build: Build the store if it is missing or out of date
+            
+        Returns:
+            RecipientStore, or None when there is no up-to-date store and build is False
+        """
+        if not Path(file_path).exists():
+            raise Exception(f"Error reading CSV file: CSV file not found: {file_path}")
+        store = file_cache.get("store", file_path, RecipientStore.open, weight_factor=0)
+        if store is None and build:
+            store = FileReader.build_recipient_store(file_path)
+        return store
+    
+    @staticmethod
+    def build_recipient_store(file_path: str) -> RecipientStore:
+        """
+        Convert a CSV file into its compact recipient store (<file>.db)
+        
+        Does nothing if the file already has an up-to-date store.
+        
+        Args:
+            file_path: Path to CSV file
+            
+        Returns:
+            The file's RecipientStore
+        """
+        with _store_build_lock:
+            store = RecipientStore.open(file_path)
+            if store is None:
+                store = RecipientStore.build(
+                    file_path,
+                    FileReader.read_csv_columns(file_path),
+                    FileReader.iter_csv_recipients(file_path)
+                )
+            file_cache.invalidate(file_path)
+        return store
+    
+    @staticmethod
+    def _iter_indexed(file_path: str, index: Dict[str, Any], offset: int) -> Iterator[Dict[str, str]]:
+        """Stream recipients starting from the indexed one at or before offset"""
+        file = open(file_path, "r", encoding="utf-8", newline="")
+        try:
+            # Offsets are byte positions; seeking a text file to them is
+            # only valid because each one starts a record
+            file.seek(index["offsets"][offset // CSV_INDEX_STRIDE])
+            reader = csv.DictReader(file, fieldnames=index["header"])
+        except Exception:
+            file.close()
+            raise
+        return FileReader._iter_rows(file_path, file, reader, lines=False)
+    
+    @staticmethod
+    def csv_index_path(file_path: str) -> str:
+        return str(file_path) + CSV_INDEX_SUFFIX
+    
+    @staticmethod
+    def write_csv_index(file_path: str, header: List[str], recipients: int, offsets: List[int]) -> None:
+        """
+        Write the offset index sidecar for a CSV file
+        
+        The index records the file's mtime and size and is ignored once
+        the file changes.
+        
+        Args:
+            file_path: Path to the CSV file, already in place
+            header: Column names from the header row
+            recipients: Rows with a non-empty email
+            offsets: Byte offset of every CSV_INDEX_STRIDE-th such row
+        """
+        stat = os.stat(file_path)
+        index = {
+            "mtime_ns": stat.st_mtime_ns,
+            "size": stat.st_size,
+            "stride": CSV_INDEX_STRIDE,
+            "header": header,
+            "recipients": recipients,
+            "offsets": offsets,
+        }
+        index_path = FileReader.csv_index_path(file_path)
+        temp_path = index_path + ".tmp"
+        with open(temp_path, "w", encoding="utf-8") as file:
+            json.dump(index, file, separators=(",", ":"))
+        os.replace(temp_path, index_path)
+    
+    @staticmethod
+    def read_csv_index(file_path: str) -> Optional[Dict[str, Any]]:
+        """
+        Load the offset index of a CSV file
+        
+        Args:
+            file_path: Path to CSV file
+            
+        Returns:
+            The index, or None if there is none or it no longer matches the file
+        """
+        try:
+            return file_cache.get("index", file_path, FileReader._load_index, weight_factor=0)
+        except OSError:
+            return None
+    
+    @staticmethod
+    def _load_index(path) -> Optional[Dict[str, Any]]:
+        try:
+            with open(FileReader.csv_index_path(path), "r", encoding="utf-8") as file:
+                index = json.load(file)
+        except (OSError, ValueError):
+            return None
+        stat = os.stat(path)
+        if (index.get("mtime_ns"), index.get("size"), index.get("stride")) != \
+                (stat.st_mtime_ns, stat.st_size, CSV_INDEX_STRIDE):
+            return None
+        return index
+    
+    @staticmethod
+    def read_csv_columns(file_path: str) -> List[str]:
+        """
+        Read the column names available to templates for a CSV file
+        
+        Args:
+            file_path: Path to CSV file
+            
+        Returns:
+            Header column names, always including 'name' and 'email'
+        """
+        try:
+            return list(file_cache.get("columns", file_path, FileReader._load_columns, weight_factor=0))
         except Exception as e:
             raise Exception(f"Error reading CSV file: {str(e)}")
-
+    
+    @staticmethod
+    def _load_columns(path) -> Tuple[str, ...]:
+        with open(path, "r", encoding="utf-8", newline="") as file:
+            header = [column for column in next(csv.reader(file), []) if column]
+        return tuple(dict.fromkeys(header + ["name", "email"]))
+    
+    @staticmethod
+    def count_csv_recipients(file_path: str, where: Optional[Dict[str, str]] = None) -> int:
+        """
+        Count rows with a non-empty email without building recipient dicts
+        
+        Args:
+            file_path: Path to CSV file
+            where: Optional column = value filters, counted with the
+                recipient store (built on first use)
+            
+        Returns:
+            Number of recipients read_csv_recipients would return
+        """
+        if where:
+            return FileReader.recipient_store(file_path, build=True).count_matching(where)
+        try:
+            path = Path(file_path)
+            if not path.exists():
+                raise FileNotFoundError(f"CSV file not found: {file_path}")
+            
+            store = file_cache.get("store", path, RecipientStore.open, weight_factor=0)
+            if store is not None:
+                return store.count
+            index = FileReader.read_csv_index(path)
+            if index is not None:
+                return index["recipients"]
+            return file_cache.get("count", path, FileReader._count_rows, weight_factor=0)
+        
+        except Exception as e:
+            raise Exception(f"Error reading CSV file: {str(e)}")
+    
+    @staticmethod
+    def _count_rows(path) -> int:
+        with open(path, "r", encoding="utf-8", newline="") as file:
+            reader = csv.reader(file)
+            header = next(reader, [])
+            if "email" not in header:
+                raise ValueError("CSV file must contain 'email' column")
+            
+            email_index = header.index("email")
+            return sum(1 for row in reader if len(row) > email_index and row[email_index].strip())
+    
+    @staticmethod
+    def read_csv_recipients(file_path: str) -> List[Dict[str, str]]:
+        """
+        Read CSV file with email recipients
+        
+        Expected CSV format:
+        name,email
+        John Doe,john@example.com
+        Jane Smith,jane@example.com
+        
+        Args:
+            file_path: Path to CSV file
+            
+        Returns:
+            List of dictionaries with 'name' and 'email' keys plus every
+            other CSV column; the dictionaries are shared with the file
+            cache and must not be modified
+        """
+        if not Path(file_path).exists():
+            raise Exception(f"Error reading CSV file: CSV file not found: {file_path}")
+        
+        cached = file_cache.get(
+            "recipients",
+            file_path,
+            lambda path: tuple(FileReader.iter_csv_recipients(path)),
+            weight_factor=CSV_MEMORY_FACTOR
+        )
+        recipients = list(cached)
+        log.info("Loaded recipients from CSV", extra={"path": str(file_path), "count": len(recipients)})
+        return recipients
@@ -0,0 +1,259 @@
+"""
+Streaming ingestion of uploaded recipient CSV files
+
+Uploads are written to disk as they arrive and parsed on the way in, so a
+malformed file is rejected at its first bad row and memory use does not
+depend on the file size. Gzip-compressed uploads are inflated on the fly.
+"""
+
+import csv
+import os
+import tempfile
+import zlib
+from typing import Any, Dict, List, Optional, Tuple
+
+from pathra_preshana.file_reader import CSV_INDEX_STRIDE, FileReader
+
+GZIP_MAGIC = b"\x1f\x8b"
+UTF8_BOM = b"\xef\xbb\xbf"
+
+# Largest decompressed output produced per inflate call
+INFLATE_CHUNK = 256 * 1024
+
+# A record this long is almost certainly an unbalanced quote swallowing the file
+MAX_RECORD_BYTES = 1024 * 1024
+
+
+class CSVIngestError(Exception):
+    """An uploaded CSV was rejected; line is the 1-based line of the problem, if known"""
+
+    def __init__(self, message: str, line: Optional[int] = None):
+        super().__init__(f"line {line}: {message}" if line else message)
+        self.line = line
+
+
+class CSVIngestor:
+    """
+    Writable stream that validates and stores an uploaded CSV as it arrives
+
+    Data goes to a temporary file next to the destination; commit() moves
+    it into place and writes the offset index, while discard() (or close()
+    before a commit) removes it.
+    """
+
+    def __init__(self, directory: str, compressed: bool = False, max_bytes: Optional[int] = None):
+        """
+        Args:
+            directory: Directory the file will be committed to
+            compressed: The upload is gzip-compressed
+            max_bytes: Largest accepted (decompressed) size
+        """
+        os.makedirs(directory, exist_ok=True)
+        fd, self.temp_path = tempfile.mkstemp(prefix=".upload-", suffix=".part", dir=directory)
+        self._file = os.fdopen(fd, "wb")
+        self.compressed = compressed
+        self.max_bytes = max_bytes
+
+        self.header: Optional[List[str]] = None
+        self.rows = 0
+        self.recipients = 0
+        self.offsets: List[int] = []
+        self.bytes_written = 0
+
+        self._decompressor = zlib.decompressobj(16 + zlib.MAX_WBITS) if compressed else None
+        self._received = 0
+        self._started = False
+        self._pending = b""
+        self._pending_line = 1
+        self._email_index = 0
+        self._finished = False
+        self._committed = False
+        self._error: Optional[CSVIngestError] = None
+
+    # File-like surface used by the multipart parser
+
+    def write(self, data: bytes) -> int:
+        if self._error is not None:
+            raise self._error
+        try:
+            if self._decompressor is not None:
+                self._inflate(data)
+            else:
+                self._consume(data)
+        except CSVIngestError as e:
+            self._error = e
+            self.discard()
+            raise
+        return len(data)
+
+    def seek(self, offset: int, whence: int = 0) -> int:
+        # The parser rewinds finished uploads; the data is already on disk
+        return 0
+
+    def read(self, size: int = -1) -> bytes:
+        return b""
+
+    def close(self) -> None:
+        if not self._committed:
+            self.discard()
+
+    # Ingestion
+
+    def _inflate(self, data: bytes) -> None:
+        if self._received < len(GZIP_MAGIC) and \
+                not data.startswith(GZIP_MAGIC[self._received:self._received + len(data)]):
+            raise CSVIngestError("File is not gzip-compressed")
+        self._received += len(data)
+        try:
+            while data:
+                decompressor = self._decompressor
+                if decompressor.eof:
+                    # Concatenated gzip members are one file
+                    decompressor = self._decompressor = zlib.decompressobj(16 + zlib.MAX_WBITS)
+                self._consume(decompressor.decompress(data, INFLATE_CHUNK))
+                data = decompressor.unused_data if decompressor.eof else decompressor.unconsumed_tail
+        except zlib.error as e:
+            raise CSVIngestError(f"Invalid gzip data: {e}")
+
+    def _consume(self, data: bytes) -> None:
+        if not data:
+            return
+        if not self._started:
+            self._started = True
+            if data.startswith(UTF8_BOM):
+                data = data[len(UTF8_BOM):]
+        if self.max_bytes is not None and self.bytes_written + len(data) > self.max_bytes:
+            raise CSVIngestError(f"File exceeds {self.max_bytes // (1024 * 1024)} MB")
+
+        offset = self.bytes_written - len(self._pending)
+        self._file.write(data)
+        self.bytes_written += len(data)
+
+        buffer = self._pending + data if self._pending else data
+        lines = buffer.split(b"\n")
+        tail = lines.pop()
+        line_number = self._pending_line
+        records: List[Tuple[int, int, bytes]] = []
+
+        if b'"' not in buffer:
+            for line in lines:
+                records.append((offset, line_number, line))
+                offset += len(line) + 1
+                line_number += 1
+        else:
+            # A newline only ends a record outside quotes; with RFC 4180
+            # quoting that is wherever the count of quotes so far is even
+            start, start_line, parts, quotes = offset, line_number, [], 0
+            for line in lines:
+                parts.append(line)
+                quotes += line.count(b'"')
+                offset += len(line) + 1
+                line_number += 1
+                if not quotes % 2:
+                    records.append((start, start_line, b"\n".join(parts)))
+                    start, start_line, parts, quotes = offset, line_number, [], 0
+            parts.append(tail)
+            tail = b"\n".join(parts)
+            offset, line_number = start, start_line
+
+        if len(tail) > MAX_RECORD_BYTES:
+            raise CSVIngestError("Row is longer than 1 MB; is a quote left open?", line_number)
+        self._pending = tail
+        self._pending_line = line_number
+        self._validate(records)
+
+    def _validate(self, records: List[Tuple[int, int, bytes]]) -> None:
+        texts = []
+        positions = []
+        for offset, line_number, raw in records:
+            if not raw.strip():
+                continue
+            try:
+                texts.append(raw.decode("utf-8"))
+            except UnicodeDecodeError:
+                raise CSVIngestError("Not valid UTF-8 text", line_number)
+            positions.append((offset, line_number))
+
+        # Every text is one complete record, so the reader yields exactly one
+        # row for each; a quote inside an unquoted field breaks that and is
+        # reported as malformed
+        reader = csv.reader(texts, strict=True)
+        for offset, line_number in positions:
+            try:
+                row = next(reader)
+            except csv.Error as e:
+                raise CSVIngestError(f"Malformed CSV ({e}); quote fields containing quotes or line breaks",
+                                     line_number)
+
+            if self.header is None:
+                if "email" not in row:
+                    raise CSVIngestError("CSV file must contain 'email' column", line_number)
+                self.header = row
+                # DictReader keeps the last of duplicate columns
+                self._email_index = len(row) - 1 - row[::-1].index("email")
+                continue
+
+            self.rows += 1
+            if len(row) > len(self.header) and any(value.strip() for value in row[len(self.header):]):
+                raise CSVIngestError(
+                    f"Row has {len(row)} fields but the header has {len(self.header)}; "
+                    f"quote fields containing commas", line_number
+                )
+            if len(row) > self._email_index and row[self._email_index].strip():
+                if not self.recipients % CSV_INDEX_STRIDE:
+                    self.offsets.append(offset)
+                self.recipients += 1
+
+    def finish(self) -> Dict[str, Any]:
+        """
+        Validate the end of the upload
+
+        Returns:
+            Summary with the number of 'rows', 'recipients' and 'bytes'
+        """
+        if self._error is not None:
+            raise self._error
+        if not self._finished:
+            try:
+                if self._decompressor is not None and not self._decompressor.eof:
+                    raise CSVIngestError("Compressed file is truncated")
+                if self._pending:
+                    if self._pending.count(b'"') % 2:
+                        raise CSVIngestError("Quoted field is never closed", self._pending_line)
+                    pending, self._pending = self._pending, b""
+                    self._validate([(self.bytes_written - len(pending), self._pending_line, pending)])
+                if self.header is None:
+                    raise CSVIngestError("File is empty")
+                self._file.close()
+            except CSVIngestError as e:
+                self._error = e
+                self.discard()
+                raise
+            self._finished = True
+        return {"rows": self.rows, "recipients": self.recipients, "bytes": self.bytes_written}
+
+    def commit(self, file_path: str) -> Dict[str, Any]:
+        """
+        Move the validated upload to file_path and write its offset index
+
+        Args:
+            file_path: Destination path, replaced if it exists
+
+        Returns:
+            Summary from finish()
+        """
+        summary = self.finish()
+        os.replace(self.temp_path, file_path)
+        self._committed = True
+        FileReader.write_csv_index(file_path, self.header, self.recipients, self.offsets)
+        return summary
+
+    def discard(self) -> None:
+        """Remove the temporary file of an upload that will not be committed"""
+        if self._committed:
+            return
+        self._file.close()
+        try:
+            os.remove(self.temp_path)
+        except FileNotFoundError:
+            pass
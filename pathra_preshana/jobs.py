@@ -0,0 +1,233 @@
+"""
+Background campaign jobs so bulk sends run outside the HTTP request
+"""
+
+import os
+import threading
+import time
+import uuid
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
+from typing import Callable, Dict, List, Optional
+
+from pathra_preshana.log import get_logger
+from pathra_preshana.recipient_filter import RecipientValidator
+
+log = get_logger(__name__)
+
+
+class CampaignJob:
+    """Progress and control state of one background campaign"""
+
+    def __init__(self, total: int, owner: Optional[str] = None, campaign_id: Optional[str] = None,
+                 validator: Optional[RecipientValidator] = None, job_id: Optional[str] = None):
+        self.job_id = job_id or uuid.uuid4().hex
+        self.owner = owner
+        self.campaign_id = campaign_id
+        self.validator = validator
+        self.total = total
+        self.status = "queued"
+        self.sent = 0
+        self.failed = 0
+        self.skipped = 0
+        self.failures: Dict[str, int] = {}
+        self.results: Optional[Dict] = None
+        self.error: Optional[str] = None
+        self.created_at = time.time()
+        self.started_at: Optional[float] = None
+        self.finished_at: Optional[float] = None
+        self.schedule: Optional[Dict] = None
+        # Rejection counts reported by sender workers, when there is no local validator
+        self.rejected: Optional[Dict[str, int]] = None
+        self.cancel_event = threading.Event()
+        self._lock = threading.Lock()
+
+    def record(self, result: Dict[str, str]) -> None:
+        """Count one recipient result; used as send_bulk_emails' on_result"""
+        with self._lock:
+            if result["status"] == "sent":
+                self.sent += 1
+            elif result["status"] == "skipped":
+                self.skipped += 1
+            else:
+                self.failed += 1
+                category = result.get("category") or "permanent"
+                self.failures[category] = self.failures.get(category, 0) + 1
+
+    def update_counts(self, sent: int, failed: int, skipped: int, failures: Dict[str, int],
+                      rejected: Optional[Dict[str, int]] = None) -> None:
+        """Set the counts of a job whose recipients are sent elsewhere (by sender workers)"""
+        with self._lock:
+            self.sent = sent
+            self.failed = failed
+            self.skipped = skipped
+            self.failures = dict(failures)
+            self.rejected = rejected
+
+    def pause(self) -> None:
+        """
+        Return a stopped job to the queue
+
+        Counts restart with the next run, which resumes from the journal and
+        reports recipients already sent as skipped.
+        """
+        with self._lock:
+            self.status = "paused"
+            self.sent = self.failed = self.skipped = 0
+            self.failures = {}
+            self.rejected = None
+            self.cancel_event = threading.Event()
+            self.finished_at = None
+
+    @property
+    def finished(self) -> bool:
+        return self.status in ("completed", "cancelled", "failed")
+
+    def progress(self) -> Dict:
+        """
+        Snapshot of the job's progress
+
+        Returns:
+            Dictionary with counts, throughput (messages/sec) and ETA (seconds)
+        """
+        with self._lock:
+            processed = self.sent + self.failed + self.skipped
+            if self.validator is not None:
+                rejected = self.validator.summary()
+                rejected_count = self.validator.rejected_count
+            else:
+                rejected = self.rejected
+                rejected_count = sum(count for reason, count in (rejected or {}).items() if reason != "accepted")
+            end = self.finished_at or time.time()
+            elapsed = end - self.started_at if self.started_at else 0.0
+            throughput = processed / elapsed if elapsed > 0 else 0.0
+            remaining = max(0, self.total - processed - rejected_count)
+            eta = remaining / throughput if throughput > 0 and not self.finished else None
+
+            return {
+                "job_id": self.job_id,
+                "campaign_id": self.campaign_id,
+                "status": self.status,
+                "total": self.total,
+                "sent": self.sent,
+                "failed": self.failed,
+                "failures": dict(self.failures),
+                "skipped": self.skipped,
+                "rejected": rejected,
+                "remaining": remaining,
+                "throughput": round(throughput, 2),
+                "eta_seconds": round(eta, 1) if eta is not None else None,
+                "elapsed_seconds": round(elapsed, 1),
+                "results": self.results,
+                "error": self.error,
+                "schedule": self.schedule,
+            }
+
+
+class JobManager:
+    """Runs campaign jobs on a small executor outside the request threads"""
+
+    def __init__(self, max_workers: Optional[int] = None, max_finished_jobs: int = 100):
+        """
+        Args:
+            max_workers: Campaigns that may send at the same time
+                (env CAMPAIGN_WORKERS, default 4)
+            max_finished_jobs: Finished jobs kept around for status queries
+        """
+        self.max_workers = max_workers or int(os.getenv("CAMPAIGN_WORKERS", "4"))
+        self._executor = ThreadPoolExecutor(max_workers=self.max_workers, thread_name_prefix="campaign")
+        self._jobs: "OrderedDict[str, CampaignJob]" = OrderedDict()
+        self._lock = threading.Lock()
+        self.max_finished_jobs = max_finished_jobs
+
+    def submit(self, run: Callable[[CampaignJob], Dict], total: int, owner: Optional[str] = None,
+               campaign_id: Optional[str] = None, validator: Optional[RecipientValidator] = None) -> CampaignJob:
+        """
+        Queue a campaign for background sending
+
+        Args:
+            run: Callable that performs the send for the given job and returns
+                the bulk results; it should report progress via job.record
+                and honour job.cancel_event
+            total: Number of recipients, for progress reporting
+            owner: Email of the user who started the campaign
+            campaign_id: Journal key of the campaign, if any
+            validator: RecipientValidator filtering the job's recipients,
+                for rejection counts and the rejection report
+
+        Returns:
+            The queued CampaignJob
+        """
+        job = self.create(total, owner=owner, campaign_id=campaign_id, validator=validator)
+        self.start(job, run)
+        return job
+
+    def create(self, total: int, owner: Optional[str] = None, campaign_id: Optional[str] = None,
+               validator: Optional[RecipientValidator] = None, job_id: Optional[str] = None) -> CampaignJob:
+        """Register a job for status queries without starting it; see submit for the arguments"""
+        job = CampaignJob(total=total, owner=owner, campaign_id=campaign_id, validator=validator, job_id=job_id)
+        with self._lock:
+            self._jobs[job.job_id] = job
+            self._evict_finished()
+        return job
+
+    def start(self, job: CampaignJob, run: Callable[[CampaignJob], Dict],
+              on_finish: Optional[Callable[[CampaignJob], None]] = None) -> None:
+        """
+        Run a created job in the background
+
+        Args:
+            job: Job from create
+            run: Callable that performs the send, as for submit
+            on_finish: Optional callable given the job once it has finished
+        """
+        self._executor.submit(self._run, job, run, on_finish)
+
+    def get(self, job_id: str) -> Optional[CampaignJob]:
+        with self._lock:
+            return self._jobs.get(job_id)
+
+    def list(self, owner: Optional[str] = None) -> List[CampaignJob]:
+        with self._lock:
+            return [job for job in self._jobs.values() if owner is None or job.owner == owner]
+
+    def cancel(self, job_id: str) -> bool:
+        """
+        Ask a job to stop; messages already handed to SMTP are still counted
+
+        Returns:
+            bool: True if the job exists and was not already finished
+        """
+        job = self.get(job_id)
+        if job is None or job.finished:
+            return False
+        job.cancel_event.set()
+        return True
+
+    def _run(self, job: CampaignJob, run: Callable[[CampaignJob], Dict],
+             on_finish: Optional[Callable[[CampaignJob], None]] = None) -> None:
+        if job.cancel_event.is_set():
+            job.status = "cancelled"
+            job.finished_at = time.time()
+            if on_finish is not None:
+                on_finish(job)
+            return
+
+        job.status = "running"
+        job.started_at = time.time()
+        try:
+            job.results = run(job)
+            job.status = "cancelled" if job.cancel_event.is_set() else "completed"
+        except Exception as e:
+            job.error = str(e)
+            job.status = "failed"
+            log.error("Campaign failed", extra={"job_id": job.job_id, "error": str(e)})
+        finally:
+            job.finished_at = time.time()
+            if on_finish is not None:
+                on_finish(job)
+
+    def _evict_finished(self) -> None:
+        finished = [job_id for job_id, job in self._jobs.items() if job.finished]
+        for job_id in finished[:max(0, len(finished) - self.max_finished_jobs)]:
+            del self._jobs[job_id]
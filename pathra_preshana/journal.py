@@ -0,0 +1,164 @@
+"""
+Durable send journal for crash-safe campaign resume
+"""
+
+import hashlib
+import os
+import sqlite3
+import threading
+import time
+from typing import Dict, List, Optional, Tuple
+
+
+def make_campaign_id(*parts: str) -> str:
+    """Stable campaign id derived from what defines a campaign (template, list, subject)"""
+    digest = hashlib.sha256("\0".join(parts).encode("utf-8")).hexdigest()
+    return digest[:16]
+
+
+def owner_campaign_id(owner: Optional[str], campaign_id: str) -> str:
+    """
+    Campaign id scoped to one user, so users never share journal entries
+
+    The id gets a prefix derived from the owner; an id that already
+    carries this owner's prefix is returned unchanged, so ids handed out
+    earlier can be passed back to resume.
+    """
+    if not owner:
+        return campaign_id
+    prefix = make_campaign_id("owner", owner.strip().lower())[:8] + "-"
+    return campaign_id if campaign_id.startswith(prefix) else prefix + campaign_id
+
+
+class SendJournal:
+    """
+    Per-recipient delivery log in an embedded SQLite database (WAL mode)
+
+    Outcomes are buffered and committed in batches. A resumed campaign
+    checks each recipient with one primary-key lookup instead of rescanning
+    a log. At most one batch of outcomes can be lost in a crash, so at most
+    that many recipients may be sent to again on resume.
+    """
+
+    def __init__(self, path: Optional[str] = None, batch_size: int = 50, flush_interval: float = 1.0):
+        """
+        Args:
+            path: Database file (env SEND_JOURNAL_PATH, default data/send_journal.db)
+            batch_size: Outcomes buffered before a commit
+            flush_interval: Maximum seconds an outcome stays buffered
+        """
+        self.path = path or os.getenv("SEND_JOURNAL_PATH", os.path.join("data", "send_journal.db"))
+        self.batch_size = batch_size
+        self.flush_interval = flush_interval
+
+        directory = os.path.dirname(self.path)
+        if directory and not os.path.exists(directory):
+            os.makedirs(directory)
+
+        self._lock = threading.Lock()
+        self._pending: Dict[Tuple[str, str], Tuple[str, str, str, str, float]] = {}
+        self._last_flush = time.monotonic()
+
+        self._conn = sqlite3.connect(self.path, check_same_thread=False, isolation_level=None)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute("PRAGMA synchronous=NORMAL")
+        self._conn.execute(
+            """
+            CREATE TABLE IF NOT EXISTS deliveries (
+                campaign_id TEXT NOT NULL,
+                email TEXT NOT NULL,
+                status TEXT NOT NULL,
+                error TEXT NOT NULL DEFAULT '',
+                updated_at REAL NOT NULL,
+                PRIMARY KEY (campaign_id, email)
+            ) WITHOUT ROWID
+            """
+        )
+
+    @staticmethod
+    def _normalize(email: str) -> str:
+        return email.strip().lower()
+
+    def is_delivered(self, campaign_id: str, email: str) -> bool:
+        """True if the recipient already received this campaign"""
+        key = (campaign_id, self._normalize(email))
+        with self._lock:
+            pending = self._pending.get(key)
+            if pending is not None and pending[2] == "sent":
+                return True
+            row = self._conn.execute(
+                "SELECT 1 FROM deliveries WHERE campaign_id = ? AND email = ? AND status = 'sent'",
+                key
+            ).fetchone()
+            return row is not None
+
+    def record(self, campaign_id: str, result: Dict[str, str]) -> None:
+        """
+        Buffer one recipient's outcome, committing when the batch is full
+
+        Args:
+            campaign_id: Campaign the result belongs to
+            result: Per-recipient result with 'email', 'status' and 'error'
+        """
+        email = self._normalize(result["email"])
+        entry = (campaign_id, email, result["status"], result.get("error", ""), time.time())
+        with self._lock:
+            self._pending[(campaign_id, email)] = entry
+            due = len(self._pending) >= self.batch_size or \
+                time.monotonic() - self._last_flush >= self.flush_interval
+            if due:
+                self._flush_locked()
+
+    def flush(self) -> None:
+        """Commit all buffered outcomes"""
+        with self._lock:
+            self._flush_locked()
+
+    def _flush_locked(self) -> None:
+        self._last_flush = time.monotonic()
+        if not self._pending:
+            return
+
+        rows: List[Tuple] = list(self._pending.values())
+        self._conn.execute("BEGIN")
+        try:
+            # A recipient that was sent stays sent, even if a later
+            # non-resumed run of the same campaign failed for them
+            self._conn.executemany(
+                """
+                INSERT INTO deliveries (campaign_id, email, status, error, updated_at)
+                VALUES (?, ?, ?, ?, ?)
+                ON CONFLICT (campaign_id, email) DO UPDATE SET
+                    status = excluded.status,
+                    error = excluded.error,
+                    updated_at = excluded.updated_at
+                WHERE deliveries.status != 'sent'
+                """,
+                rows
+            )
+            self._conn.execute("COMMIT")
+        except Exception:
+            self._conn.execute("ROLLBACK")
+            raise
+        self._pending.clear()
+
+    def summary(self, campaign_id: str) -> Dict[str, int]:
+        """Committed outcome counts for a campaign, by status"""
+        self.flush()
+        with self._lock:
+            rows = self._conn.execute(
+                "SELECT status, COUNT(*) FROM deliveries WHERE campaign_id = ? GROUP BY status",
+                (campaign_id,)
+            ).fetchall()
+        return dict(rows)
+
+    def close(self) -> None:
+        self.flush()
+        with self._lock:
+            self._conn.close()
+
+    def __enter__(self) -> "SendJournal":
+        return self
+
+    def __exit__(self, exc_type, exc, tb) -> None:
+        self.close()
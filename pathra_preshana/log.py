@@ -0,0 +1,106 @@
+"""
+Non-blocking structured logging
+
+Log calls only create a record and put it on an in-memory queue; a
+background thread formats and writes it, so a slow stdout or log pipeline
+never holds up sending. Records carry structured fields passed as `extra`
+and are written as text (default) or, with LOG_FORMAT=json, as JSON lines.
+"""
+
+import atexit
+import json
+import logging
+import os
+import queue
+import sys
+import threading
+from datetime import datetime, timezone
+from logging.handlers import QueueHandler, QueueListener
+from typing import Optional
+
+# Attributes every LogRecord has; anything else was passed as a field in `extra`
+_RECORD_ATTRIBUTES = set(vars(logging.LogRecord("", 0, "", 0, "", None, None))) | {"message", "asctime"}
+
+_lock = threading.Lock()
+_listener: Optional[QueueListener] = None
+
+
+class StructuredFormatter(logging.Formatter):
+    """Formats a record and its extra fields as one text or JSON line"""
+
+    def __init__(self, json_lines: bool = False):
+        super().__init__()
+        self.json_lines = json_lines
+
+    def format(self, record: logging.LogRecord) -> str:
+        fields = {key: value for key, value in vars(record).items() if key not in _RECORD_ATTRIBUTES}
+        timestamp = datetime.fromtimestamp(record.created, timezone.utc)
+        message = record.getMessage()
+        if record.exc_info:
+            fields["exception"] = self.formatException(record.exc_info)
+
+        if self.json_lines:
+            return json.dumps({
+                "ts": timestamp.isoformat(timespec="milliseconds"),
+                "level": record.levelname,
+                "logger": record.name,
+                "message": message,
+                **fields,
+            }, default=str, ensure_ascii=False)
+        text = f"{timestamp:%Y-%m-%d %H:%M:%S} {record.levelname:<7} {message}"
+        if fields:
+            text += " " + " ".join(f"{key}={value}" for key, value in fields.items())
+        return text
+
+
+class _NonBlockingHandler(QueueHandler):
+    """QueueHandler that leaves all formatting to the listener thread"""
+
+    def prepare(self, record: logging.LogRecord) -> logging.LogRecord:
+        return record
+
+
+def _start() -> None:
+    global _listener
+    records: "queue.SimpleQueue" = queue.SimpleQueue()
+    output = logging.StreamHandler(sys.stdout)
+    output.setFormatter(StructuredFormatter(json_lines=os.getenv("LOG_FORMAT", "text").lower() == "json"))
+    _listener = QueueListener(records, output)
+    _listener.start()
+
+    package = logging.getLogger("pathra_preshana")
+    for handler in list(package.handlers):
+        if isinstance(handler, _NonBlockingHandler):
+            package.removeHandler(handler)
+    package.addHandler(_NonBlockingHandler(records))
+
+
+def configure_logging() -> None:
+    """Route the package's logs through the background writer (idempotent)"""
+    with _lock:
+        if _listener is not None:
+            return
+        package = logging.getLogger("pathra_preshana")
+        package.setLevel(os.getenv("LOG_LEVEL", "INFO").upper())
+        package.propagate = False
+        _start()
+        atexit.register(shutdown_logging)
+        # A forked worker process gets no copy of the writer thread; start its own
+        os.register_at_fork(after_in_child=_start)
+
+
+def shutdown_logging() -> None:
+    """Write out every queued record and stop the writer; run at exit"""
+    with _lock:
+        if _listener is not None:
+            try:
+                _listener.stop()
+            except AttributeError:
+                # Already stopped
+                pass
+
+
+def get_logger(name: str) -> logging.Logger:
+    """Logger for a module of the package, writing through the background writer"""
+    configure_logging()
+    return logging.getLogger(name)
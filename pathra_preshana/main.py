@@ -1,91 +1,322 @@
 """
 Main entry point for the automated email sender application
+
+Paths, subject and attachments come from the command line; any left out
+are asked for when run in a terminal, and otherwise take their defaults,
+so the sender also runs from cron or CI:
+
+    python -m pathra_preshana.main --template templates/email_template.html \\
+        --recipients data/recipients.csv --subject "Hello" --attach brochure.pdf
+
+With --dry-run nothing is sent: every personalized message is rendered
+across a process pool and written to an mbox file (or, with --format eml,
+a directory of .eml files), followed by the render throughput.
 """
 
+import argparse
 import os
+import re
 import sys
-from pathlib import Path
+import time
+from collections import deque
+from concurrent.futures import Future, ProcessPoolExecutor
+from itertools import chain, islice
+from typing import Deque, Dict, Iterable, Iterator, List, Optional, Sequence, Tuple
+
 from dotenv import load_dotenv
 
-from pathra_preshana.email_sender import EmailSender
+from pathra_preshana.assets import ASSETS_DIR, Asset, campaign_assets
+from pathra_preshana.email_sender import create_email_sender
 from pathra_preshana.file_reader import FileReader
+from pathra_preshana.journal import SendJournal, make_campaign_id
+from pathra_preshana.message_builder import MessageBuilder
+from pathra_preshana.recipient_filter import RecipientValidator
+from pathra_preshana.templating import CompiledTemplate
+
+DEFAULT_TEMPLATE = "templates/email_template.html"
+DEFAULT_RECIPIENTS = "data/recipients.csv"
+DEFAULT_SUBJECT = "Hello from Pathra Preshana"
+DRY_RUN_DIR = os.path.join("data", "dry-run")
+
+# Recipients rendered per task handed to a dry-run process
+RENDER_CHUNK_SIZE = 500
+
+# Body lines that would read as the start of the next mbox message (mboxrd quoting)
+_MBOX_FROM_LINE = re.compile(rb"^(>*From )", re.MULTILINE)
+
+# Per-process message builder of a dry run
+_builder: Optional[MessageBuilder] = None
+
+
+def parse_args(argv: Optional[Sequence[str]] = None) -> argparse.Namespace:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--template", help=f"HTML email template (default: {DEFAULT_TEMPLATE})")
+    parser.add_argument("--recipients", help=f"CSV file with recipients (default: {DEFAULT_RECIPIENTS})")
+    parser.add_argument("--subject", help=f"email subject (default: {DEFAULT_SUBJECT!r})")
+    parser.add_argument("--attach", action="append", metavar="NAME",
+                        help=f"file in {ASSETS_DIR}/ to attach; repeat for several")
+    parser.add_argument("--escape", action="store_true", help="HTML-escape the substituted CSV values")
+    resume = parser.add_mutually_exclusive_group()
+    resume.add_argument("--resume", action="store_true", default=None,
+                        help="skip recipients who already received this campaign (default when not asked)")
+    resume.add_argument("--no-resume", dest="resume", action="store_false",
+                        help="send to every recipient again")
+    parser.set_defaults(resume=None)
+
+    dry_run = parser.add_argument_group("dry run")
+    dry_run.add_argument("--dry-run", action="store_true", help="render every message to files instead of sending")
+    dry_run.add_argument("--format", choices=["mbox", "eml"], default="mbox",
+                         help="one mbox file, or a directory with one .eml file per message (default: mbox)")
+    dry_run.add_argument("--output", help=f"mbox file or .eml directory (default: {DRY_RUN_DIR}/<campaign>)")
+    dry_run.add_argument("--processes", type=int, default=os.cpu_count() or 1,
+                         help="render processes (default: number of CPUs)")
+    return parser.parse_args(argv)
+
+
+def _ask(prompt: str, default: Optional[str] = None) -> str:
+    """Ask for a value in a terminal; without one, or on an empty answer, use the default"""
+    if not sys.stdin.isatty():
+        return default or ""
+    answer = input(prompt).strip()
+    return answer or default or ""
+
+
+def _chunks(recipients: Iterable[Dict[str, str]], size: int) -> Iterator[List[Dict[str, str]]]:
+    iterator = iter(recipients)
+    while True:
+        chunk = list(islice(iterator, size))
+        if not chunk:
+            return
+        yield chunk
+
+
+def _start_renderer(sender_email: str, subject: str, template: str, escape: bool, assets: List[Asset]) -> None:
+    global _builder
+    _builder = MessageBuilder(sender_email, subject, CompiledTemplate(template, escape=escape), assets)
+
+
+def _render_chunk(recipients: List[Dict[str, str]], output_format: str, output: str, first: int) -> Tuple[bytes, int]:
+    """
+    Render a chunk of recipients in a dry-run process
+
+    Args:
+        recipients: Recipient rows
+        output_format: 'mbox' or 'eml'
+        output: The .eml directory; unused for mbox
+        first: Number of the chunk's first message, naming its .eml file
+
+    Returns:
+        Tuple of (mbox text to append, or b"" for .eml files, bytes rendered)
+    """
+    rendered = 0
+    if output_format == "eml":
+        for number, recipient in enumerate(recipients, first):
+            _, message = _builder.build(recipient)
+            with open(os.path.join(output, f"{number:08d}.eml"), "wb") as file:
+                file.write(message)
+            rendered += len(message)
+        return b"", rendered
+
+    separator = f"From {_builder.sender_email} {time.asctime(time.gmtime())}\n".encode("ascii")
+    parts = []
+    for recipient in recipients:
+        _, message = _builder.build(recipient)
+        rendered += len(message)
+        parts.append(separator)
+        parts.append(_MBOX_FROM_LINE.sub(rb">\1", message.replace(b"\r\n", b"\n")))
+        parts.append(b"\n")
+    return b"".join(parts), rendered
+
+
+def dry_run(recipients: Iterable[Dict[str, str]], subject: str, html_template: CompiledTemplate,
+            assets: List[Asset], output_format: str, output: str, processes: int) -> Tuple[int, int, float]:
+    """
+    Render every recipient's message across a process pool and write them out
+
+    Chunks are rendered in parallel and written in recipient order; mbox
+    chunks are appended through one large write buffer.
 
+    Args:
+        recipients: Recipient rows
+        subject: Email subject
+        html_template: Compiled HTML template
+        assets: Inline images and attachments
+        output_format: 'mbox' or 'eml'
+        output: mbox file or .eml directory
+        processes: Render processes
 
-def main():
+    Returns:
+        Tuple of (messages, bytes rendered, seconds)
+    """
+    sender_email = os.getenv("GMAIL_USER") or "sender@localhost"
+    if output_format == "eml":
+        os.makedirs(output, exist_ok=True)
+    elif os.path.dirname(output):
+        os.makedirs(os.path.dirname(output), exist_ok=True)
+
+    messages = rendered = 0
+    started = time.perf_counter()
+    mbox = open(output, "wb", buffering=1024 * 1024) if output_format == "mbox" else None
+    try:
+        with ProcessPoolExecutor(
+            max_workers=processes,
+            initializer=_start_renderer,
+            initargs=(sender_email, subject, html_template.source, html_template.escape, assets)
+        ) as pool:
+            # Bounded, so a huge list is never read ahead into memory
+            pending: Deque[Tuple[int, Future]] = deque()
+
+            def write_next():
+                nonlocal messages, rendered
+                count, future = pending.popleft()
+                text, size = future.result()
+                if mbox is not None:
+                    mbox.write(text)
+                messages += count
+                rendered += size
+
+            first = 1
+            for chunk in _chunks(recipients, RENDER_CHUNK_SIZE):
+                pending.append((len(chunk), pool.submit(_render_chunk, chunk, output_format, output, first)))
+                first += len(chunk)
+                if len(pending) >= processes * 2:
+                    write_next()
+            while pending:
+                write_next()
+    finally:
+        if mbox is not None:
+            mbox.close()
+    return messages, rendered, time.perf_counter() - started
+
+
+def main(argv: Optional[Sequence[str]] = None):
     """Main function to run the email automation"""
-    
+
     # Load environment variables from .env file
     load_dotenv()
-    
+    args = parse_args(argv)
+
     print("=" * 60)
-    print("Automated Email Sender")
+    print("Automated Email Sender" + (" (dry run)" if args.dry_run else ""))
     print("=" * 60)
     print()
-    
+
     # Check if environment variables are set
-    if not os.getenv("GMAIL_USER") or not os.getenv("GMAIL_APP_PASSWORD"):
+    if not args.dry_run and not os.getenv("SMTP_ACCOUNTS_FILE") \
+            and (not os.getenv("GMAIL_USER") or not os.getenv("GMAIL_APP_PASSWORD")):
         print("✗ Error: GMAIL_USER and GMAIL_APP_PASSWORD must be set in .env file")
         print("\nPlease create a .env file with the following variables:")
         print("GMAIL_USER=your_email@gmail.com")
         print("GMAIL_APP_PASSWORD=your_app_password")
         return 1
-    
-    # Prompt for file paths
-    print("File Configuration:")
-    print("-" * 60)
-    
-    html_template_path = input("Enter path to HTML email template (or press Enter for default: templates/email_template.html): ").strip()
-    if not html_template_path:
-        html_template_path = "templates/email_template.html"
-    
-    csv_file_path = input("Enter path to CSV file with recipients (or press Enter for default: data/recipients.csv): ").strip()
-    if not csv_file_path:
-        csv_file_path = "data/recipients.csv"
-    
-    email_subject = input("Enter email subject: ").strip()
-    if not email_subject:
-        email_subject = "Hello from Pathra Preshana"
-    
+
+    # Ask for anything not given on the command line
+    if sys.stdin.isatty() and None in (args.template, args.recipients, args.subject, args.attach):
+        print("File Configuration:")
+        print("-" * 60)
+
+    html_template_path = args.template or _ask(
+        f"Enter path to HTML email template (or press Enter for default: {DEFAULT_TEMPLATE}): ", DEFAULT_TEMPLATE)
+    csv_file_path = args.recipients or _ask(
+        f"Enter path to CSV file with recipients (or press Enter for default: {DEFAULT_RECIPIENTS}): ",
+        DEFAULT_RECIPIENTS)
+    email_subject = args.subject or _ask("Enter email subject: ", DEFAULT_SUBJECT)
+    if args.attach is None:
+        attachment_names = _ask(f"Attachments from {ASSETS_DIR}/ (comma-separated, or press Enter for none): ")
+    else:
+        attachment_names = ",".join(args.attach)
+    attachments = [name.strip() for name in attachment_names.split(",") if name.strip()]
+
     print()
     print("=" * 60)
-    print("Sending Emails...")
+    print("Rendering Emails..." if args.dry_run else "Sending Emails...")
     print("=" * 60)
     print()
-    
+
     try:
         # Read HTML template
         file_reader = FileReader()
-        html_template = file_reader.read_html_template(html_template_path)
-        
-        # Read CSV recipients
-        recipients = file_reader.read_csv_recipients(csv_file_path)
-        
-        if not recipients:
+        html_template = CompiledTemplate(file_reader.read_html_template(html_template_path), escape=args.escape)
+        html_template.validate(file_reader.read_csv_columns(csv_file_path))
+        # Inline images (cid:...) and attachments, encoded once for all messages
+        assets = campaign_assets(html_template, attachments)
+
+        # Stream CSV recipients so sending starts before the whole file is read,
+        # dropping invalid and duplicate addresses on the way
+        validator = RecipientValidator()
+        recipients = validator.filter(file_reader.iter_csv_recipients(csv_file_path))
+        first_recipient = next(recipients, None)
+
+        if first_recipient is None:
             print("✗ No recipients found in CSV file")
             return 1
-        
+
+        campaign_id = make_campaign_id(html_template_path, csv_file_path, email_subject)
+
+        if args.dry_run:
+            output = args.output or os.path.join(
+                DRY_RUN_DIR, campaign_id + (".mbox" if args.format == "mbox" else ""))
+            messages, rendered, seconds = dry_run(
+                chain([first_recipient], recipients), email_subject, html_template, assets,
+                args.format, output, max(1, args.processes)
+            )
+            print("=" * 60)
+            print("Dry Run Summary")
+            print("=" * 60)
+            print(f"✓ Rendered: {messages} messages, {rendered / (1024 * 1024):.1f} MB ({output})")
+            print(f"  {seconds:.2f}s, {messages / seconds if seconds else 0:.0f} messages/s, "
+                  f"{rendered / (1024 * 1024) / seconds if seconds else 0:.1f} MB/s "
+                  f"on {max(1, args.processes)} processes")
+            _print_rejected(validator, campaign_id)
+            print("=" * 60)
+            return 0
+
         # Initialize email sender
-        email_sender = EmailSender()
-        
+        email_sender = create_email_sender()
+
+        # Journal every outcome so an interrupted run can be resumed
+        journal = SendJournal()
+        already_sent = journal.summary(campaign_id).get("sent", 0)
+        resume = False
+        if already_sent:
+            resume = args.resume
+            if resume is None:
+                answer = _ask(f"{already_sent} recipients already received this campaign. Skip them? [Y/n]: ")
+                resume = answer.lower() not in ("n", "no")
+
         # Send emails
-        results = email_sender.send_bulk_emails(
-            recipients=recipients,
-            subject=email_subject,
-            html_template=html_template
-        )
-        
+        with journal:
+            results = email_sender.send_bulk_emails(
+                recipients=chain([first_recipient], recipients),
+                subject=email_subject,
+                html_template=html_template,
+                journal=journal,
+                campaign_id=campaign_id,
+                resume=resume,
+                assets=assets
+            )
+
         # Print summary
         print()
         print("=" * 60)
         print("Email Summary")
         print("=" * 60)
-        print(f"Total Recipients: {len(recipients)}")
+        print(f"Total Recipients: {results['success'] + results['failed'] + results.get('skipped', 0)}")
         print(f"✓ Successfully Sent: {results['success']}")
         print(f"✗ Failed: {results['failed']}")
+        if results['failed']:
+            failures = results['failures']
+            print(f"    permanent: {failures['permanent']}, transient (after retries): {failures['transient']}, "
+                  f"over quota: {failures['quota']}")
+        if results['retries']:
+            print(f"↻ Retries: {results['retries']}")
+        if resume:
+            print(f"↷ Skipped (already sent): {results['skipped']}")
+        _print_rejected(validator, campaign_id)
         print("=" * 60)
-        
+
         return 0 if results['failed'] == 0 else 1
-        
+
     except FileNotFoundError as e:
         print(f"✗ Error: File not found - {str(e)}")
         return 1
@@ -94,5 +325,17 @@ def main():
         return 1
 
 
+def _print_rejected(validator: RecipientValidator, campaign_id: str) -> None:
+    """Write and point to the report of addresses dropped before sending, if any"""
+    if not validator.rejected_count:
+        return
+    report_dir = os.path.join("data", "reports")
+    os.makedirs(report_dir, exist_ok=True)
+    report_path = os.path.join(report_dir, f"{campaign_id}-rejected.csv")
+    validator.write_report(report_path)
+    print(f"✗ Rejected before sending: {validator.rejected['invalid']} invalid, "
+          f"{validator.rejected['duplicate']} duplicate (see {report_path})")
+
+
 if __name__ == "__main__":
     sys.exit(main())
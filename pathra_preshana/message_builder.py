@@ -0,0 +1,173 @@
+"""
+Per-campaign MIME message assembly
+
+The constant headers, the encoded static parts of the template and any
+images or attachments are built once; each recipient's message is produced
+by splicing in only what varies.
+"""
+
+import itertools
+import secrets
+import time
+from email import policy, quoprimime
+from email.utils import formatdate
+from typing import Dict, List, Sequence, Tuple
+
+from pathra_preshana.assets import Asset
+from pathra_preshana.templating import CompiledTemplate
+
+CRLF = b"\r\n"
+# Recipients of a shared message are only named in the envelope
+UNDISCLOSED_RECIPIENTS = b"To: undisclosed-recipients:;\r\n"
+# A quoted-printable soft line break; lets independently encoded pieces be
+# concatenated while keeping every line under the 76 character limit
+SOFT_BREAK = b"=\r\n"
+
+
+def encode_quoted_printable(text: str) -> bytes:
+    """Quoted-printable encode UTF-8 text with CRLF line endings"""
+    if text.isascii() and text.isprintable() and "=" not in text \
+            and len(text) <= 76 and not text.endswith((" ", "\t")):
+        return text.encode("ascii")
+    return quoprimime.body_encode(text.encode("utf-8").decode("latin-1"), eol="\r\n").encode("ascii")
+
+
+def fold_header(name: str, value: str) -> bytes:
+    """Encode and fold one header line, including its trailing CRLF"""
+    if value.isascii() and len(name) + len(value) < 76:
+        return f"{name}: {value}\r\n".encode("ascii")
+    # Non-ASCII text becomes RFC 2047 encoded words
+    return policy.SMTP.header_factory(name, value).fold(policy=policy.SMTP).encode("ascii")
+
+
+class MessageBuilder:
+    """Produces wire-format HTML messages for one campaign"""
+
+    def __init__(self, sender_email: str, subject: str, template: CompiledTemplate, assets: Sequence[Asset] = ()):
+        """
+        Args:
+            sender_email: From address
+            subject: Subject line, shared by every message
+            template: Compiled HTML body template
+            assets: Inline images (referenced as cid:<id>) and attachments,
+                included in every message
+        """
+        self.sender_email = sender_email
+        self.template = template
+
+        domain = sender_email.rpartition("@")[2] or "localhost"
+        token = secrets.token_hex(8)
+        self._message_id_prefix = f"Message-ID: <{int(time.time())}.{token}.".encode("ascii")
+        self._message_id_suffix = f"@{domain}>\r\n".encode("ascii")
+        self._counter = itertools.count(1)
+        self._date_cache: Tuple[int, bytes] = (-1, b"")
+
+        # The HTML part is wrapped in multipart/alternative, then in
+        # multipart/related when there are inline images and in
+        # multipart/mixed when there are attachments; each wrapper's images
+        # or attachments follow the part it wraps
+        wrappers = [("alternative", "", [])]
+        inline = [asset for asset in assets if asset.inline]
+        if inline:
+            wrappers.append(("related", ';\r\n type="multipart/alternative"', inline))
+        attached = [asset for asset in assets if not asset.inline]
+        if attached:
+            wrappers.append(("mixed", "", attached))
+
+        opening = []
+        for subtype, parameters, _ in reversed(wrappers):
+            boundary = f"==pathra.{token}.{subtype}=="
+            opening.append(f'Content-Type: multipart/{subtype};\r\n boundary="{boundary}"{parameters}\r\n'
+                           f"\r\n--{boundary}\r\n".encode("ascii"))
+        self._closing: List[bytes] = []
+        for subtype, _, wrapped in wrappers:
+            boundary = f"==pathra.{token}.{subtype}=="
+            for asset in wrapped:
+                self._closing.append(f"\r\n--{boundary}\r\n".encode("ascii"))
+                # Shared as is: each message only joins in the encoded bytes
+                self._closing.append(asset.part)
+            self._closing.append(f"\r\n--{boundary}--\r\n".encode("ascii"))
+
+        self._headers = b"".join([
+            fold_header("Subject", subject),
+            fold_header("From", sender_email),
+            b"MIME-Version: 1.0\r\n",
+            *opening,
+            b'Content-Type: text/html; charset="utf-8"\r\n',
+            b"Content-Transfer-Encoding: quoted-printable\r\n",
+            CRLF,
+        ])
+
+        # Encode the static template segments once, each ending on a line
+        # boundary so the per-recipient values can be spliced in between
+        segments = [encode_quoted_printable(text) for text in template.segments]
+        self._segments = [self._line_terminated(encoded) for encoded in segments[:-1]] + segments[-1:]
+
+    @staticmethod
+    def _line_terminated(encoded: bytes) -> bytes:
+        if not encoded or encoded.endswith(b"\n"):
+            return encoded
+        return encoded + SOFT_BREAK
+
+    def _date(self) -> bytes:
+        now = int(time.time())
+        second, header = self._date_cache
+        if now != second:
+            header = f"Date: {formatdate(now, localtime=True)}\r\n".encode("ascii")
+            self._date_cache = (now, header)
+        return header
+
+    def body_parts(self, values: Dict[str, str]) -> List[bytes]:
+        """Encoded body pieces for one recipient, in order"""
+        segments = self._segments
+        parts = [segments[0]]
+        for value, segment in zip(self.template.render_values(values), segments[1:]):
+            parts.append(self._line_terminated(encode_quoted_printable(value)))
+            parts.append(segment)
+        return parts
+
+    def _envelope_headers(self, to_header: bytes) -> List[bytes]:
+        return [
+            to_header,
+            self._message_id_prefix,
+            str(next(self._counter)).encode("ascii"),
+            self._message_id_suffix,
+            self._date(),
+            self._headers,
+        ]
+
+    def build(self, recipient: Dict[str, str]) -> Tuple[List[str], bytes]:
+        """
+        Build one recipient's message
+
+        Args:
+            recipient: Recipient row with at least an 'email' key
+
+        Returns:
+            Tuple of (envelope recipients, message bytes) ready for sendmail
+        """
+        email = recipient["email"]
+        parts = self._envelope_headers(fold_header("To", email))
+        parts.extend(self.body_parts(recipient))
+        parts.extend(self._closing)
+        return [email], b"".join(parts)
+
+    def build_shared(self, recipients: Sequence[Dict[str, str]]) -> Tuple[List[str], bytes]:
+        """
+        Build one message for many recipients of a template without placeholders
+
+        Recipients only appear in the envelope (RCPT TO); the To header
+        reads 'undisclosed-recipients', so nobody sees the other addresses.
+
+        Args:
+            recipients: Recipient rows with at least an 'email' key
+
+        Returns:
+            Tuple of (envelope recipients, message bytes) ready for sendmail
+        """
+        if not self.template.is_static:
+            raise ValueError("Only templates without placeholders can be shared between recipients")
+        parts = self._envelope_headers(UNDISCLOSED_RECIPIENTS)
+        parts.extend(self._segments)
+        parts.extend(self._closing)
+        return [recipient["email"] for recipient in recipients], b"".join(parts)
@@ -0,0 +1,204 @@
+"""
+Token-bucket rate limiting for outgoing email
+"""
+
+import threading
+import time
+from collections import deque
+from typing import Deque, Dict, List, Optional, Tuple
+
+SECONDS_PER_DAY = 24 * 60 * 60
+
+# The daily quota counts sends in buckets of this many seconds; a bucket
+# leaves the rolling 24 hour window once all of its sends have
+QUOTA_BUCKET_SECONDS = 60
+
+# Recent sends used to estimate an unlimited sender's rate when throttled
+RATE_SAMPLE_SIZE = 50
+
+# Throttling replies within this many seconds of a decrease count as one;
+# messages already in flight on other sessions tend to fail together
+DECREASE_HOLDOFF = 1.0
+
+
+class RateLimiter:
+    """
+    Thread-safe limiter combining a messages/sec bucket and a messages/day quota
+
+    The per-second rate adapts to the server (AIMD): each throttling reply
+    halves it, and successful sends raise it again by about one message per
+    second, per second, back up to the configured rate. An unlimited limiter
+    starts pacing only once it is throttled, from the rate it was sending at.
+    """
+
+    def __init__(self, per_second: Optional[float] = None, per_day: Optional[int] = None,
+                 burst: Optional[float] = None, min_per_second: float = 0.1, key: Optional[str] = None):
+        """
+        Args:
+            per_second: Sustained messages per second (None or 0 for unlimited)
+            per_day: Messages allowed in any 24 hours, a rolling window
+                (None or 0 for unlimited)
+            burst: Bucket capacity; defaults to one second worth of tokens
+            min_per_second: Floor for the rate when backing off
+            key: Account the limiter is for, naming it in state shared
+                between processes (see shared_rate_limit)
+        """
+        self.key = key
+        per_second = per_second or None
+        self.per_second = per_second
+        self.per_day = per_day or None
+        self.burst = burst if burst else max(1.0, per_second or 1.0)
+        self.min_per_second = min_per_second
+        # Current, adapted rate; None while unlimited
+        self.rate = per_second
+        self.throttle_events = 0
+
+        self._lock = threading.Lock()
+        self._tokens = self.burst
+        self._last_refill = time.monotonic()
+        # [start, count] per QUOTA_BUCKET_SECONDS with sends in the last 24 hours
+        self._day_buckets: Deque[List] = deque()
+        self._day_count = 0
+        self._recent = deque(maxlen=RATE_SAMPLE_SIZE)
+        self._recover_to: Optional[float] = per_second
+        self._last_decrease = float("-inf")
+
+    def acquire(self, count: int = 1) -> bool:
+        """
+        Take a slot for one message, sleeping as long as the per-second bucket requires
+
+        Args:
+            count: Recipients of the message; providers count each one
+                against the daily quota, while the per-second rate is per message
+
+        Returns:
+            bool: False if the daily quota is exhausted, True otherwise
+        """
+        wait = self.reserve(count)
+        if wait is None:
+            return False
+        if wait:
+            time.sleep(wait)
+        return True
+
+    def reserve(self, count: int = 1) -> Optional[float]:
+        """
+        Take a slot for one message without sleeping, for callers that wait
+        on their own (e.g. with asyncio.sleep)
+
+        A message is never sent in part, so one whose count exceeds
+        remaining_today() is refused whole; callers sharing a message
+        between recipients size their batches by remaining_today().
+
+        Returns:
+            Seconds the caller must wait before sending, or None if the daily
+            quota is exhausted
+        """
+        with self._lock:
+            now = time.monotonic()
+
+            if self.per_day is not None:
+                self._expire_day(now)
+                if self._day_count + count > self.per_day:
+                    return None
+                self._day_count += count
+                start = now - now % QUOTA_BUCKET_SECONDS
+                buckets = self._day_buckets
+                if buckets and buckets[-1][0] == start:
+                    buckets[-1][1] += count
+                else:
+                    buckets.append([start, count])
+
+            wait = 0.0
+            rate = self.rate
+            if rate:
+                elapsed = now - self._last_refill
+                burst = min(self.burst, max(1.0, rate))
+                self._tokens = min(burst, self._tokens + elapsed * rate)
+                self._last_refill = now
+                # Reserve the token now and wait off the debt outside the lock,
+                # so concurrent callers queue up fairly behind each other
+                self._tokens -= 1
+                if self._tokens < 0:
+                    wait = -self._tokens / rate
+            else:
+                self._recent.append(now)
+            return wait
+
+    def _expire_day(self, now: float) -> None:
+        """Drop the sends that have left the rolling 24 hour window"""
+        buckets = self._day_buckets
+        while buckets and buckets[0][0] + QUOTA_BUCKET_SECONDS <= now - SECONDS_PER_DAY:
+            self._day_count -= buckets.popleft()[1]
+
+    def throttled(self) -> None:
+        """Multiplicative decrease after a throttling reply (421/451/454...)"""
+        with self._lock:
+            self.throttle_events += 1
+            now = time.monotonic()
+            if now - self._last_decrease < DECREASE_HOLDOFF:
+                return
+            self._last_decrease = now
+            if self.rate is None:
+                # Unlimited so far: back off from the rate actually achieved
+                recent = self._recent
+                span = now - recent[0] if len(recent) > 1 else 0.0
+                current = (len(recent) - 1) / span if span > 0 else 1.0
+                self._recover_to = current
+                self._tokens = 0.0
+                self._last_refill = now
+            else:
+                current = self.rate
+            self.rate = max(self.min_per_second, current / 2)
+
+    def succeeded(self) -> None:
+        """Additive increase after a delivered message"""
+        with self._lock:
+            rate = self.rate
+            if rate is None or (self._recover_to is not None and rate >= self._recover_to):
+                return
+            # One message per second more for every second's worth of successes
+            rate += 1.0 / rate
+            if self._recover_to is not None and rate >= self._recover_to:
+                # Fully recovered: back to the configured rate, or unlimited
+                rate = self.per_second
+                self._recover_to = self.per_second
+                self._recent.clear()
+            self.rate = rate
+
+    def remaining_today(self) -> Optional[int]:
+        """Messages left in the rolling 24 hour window, or None when unlimited"""
+        if self.per_day is None:
+            return None
+        with self._lock:
+            self._expire_day(time.monotonic())
+            return max(0, self.per_day - self._day_count)
+
+
+_limiters: Dict[Tuple[str, Optional[float], Optional[int]], RateLimiter] = {}
+_limiters_lock = threading.Lock()
+
+
+def get_rate_limiter(key: str, per_second: Optional[float] = None,
+                     per_day: Optional[int] = None) -> RateLimiter:
+    """
+    Get the process-wide limiter for a sending account
+
+    Every EmailSender for the same account shares one limiter, so quotas and
+    throttling back-off hold across concurrent campaigns in the same process.
+    A limiter is returned even without configured limits, since it still
+    slows down when the server starts throttling.
+
+    Args:
+        key: Account identifier, usually the sender address
+        per_second: Messages per second (None or 0 for unlimited)
+        per_day: Messages per day (None or 0 for unlimited)
+
+    Returns:
+        Shared RateLimiter
+    """
+    with _limiters_lock:
+        limiter_key = (key, per_second or None, per_day or None)
+        if limiter_key not in _limiters:
+            _limiters[limiter_key] = RateLimiter(per_second=per_second, per_day=per_day, key=key)
+        return _limiters[limiter_key]
@@ -0,0 +1,251 @@
+"""
+Pre-send recipient normalization, validation and de-duplication
+"""
+
+import csv
+import re
+import sqlite3
+from typing import Collection, Dict, Iterable, Iterator, List, Optional, Set, Tuple, Union
+
+# Pragmatic address syntax: dot-atom local part and a dotted domain with an
+# alphabetic TLD. Quoted local parts and IP-literal domains are rejected.
+EMAIL_PATTERN = re.compile(
+    r"[A-Za-z0-9!#$%&'*+/=?^_`{|}~-]+(?:\.[A-Za-z0-9!#$%&'*+/=?^_`{|}~-]+)*"
+    r"@(?:[A-Za-z0-9](?:[A-Za-z0-9-]{0,61}[A-Za-z0-9])?\.)+[A-Za-z]{2,63}"
+)
+
+# Addresses de-duplicated in memory before the seen set moves to disk
+DEDUPE_MEMORY_ADDRESSES = 100_000
+
+# Bloom filter in front of the on-disk seen set: 2^26 bits (8 MiB; a power
+# of two), 4 probes
+DEDUPE_BLOOM_BITS = 1 << 26
+DEDUPE_BLOOM_PROBES = 4
+
+# Addresses buffered before they are written to the on-disk seen set
+DEDUPE_SPILL_BATCH = 10_000
+
+# Fingerprints fit SQLite's signed 64-bit integers
+_FINGERPRINT_MASK = (1 << 63) - 1
+
+
+class SourceRow(dict):
+    """Recipient row that remembers its line number in the source CSV"""
+
+    __slots__ = ("line",)
+
+    def __init__(self, values: Union[Dict[str, str], Iterable[Tuple[str, str]]], line: Optional[int] = None):
+        super().__init__(values)
+        self.line = line
+
+
+def normalize_email(email: str) -> str:
+    """Strip whitespace, angle brackets and 'mailto:', and lowercase the address"""
+    email = email.strip()
+    if email.startswith("<") and email.endswith(">"):
+        email = email[1:-1].strip()
+    if email[:7].lower() == "mailto:":
+        email = email[7:]
+    return email.lower()
+
+
+def is_valid_email(email: str) -> bool:
+    """Check address syntax and RFC 5321 length limits"""
+    if len(email) > 254 or EMAIL_PATTERN.fullmatch(email) is None:
+        return False
+    return email.index("@") <= 64
+
+
+class SeenAddresses:
+    """
+    Exact set of addresses whose memory use stops growing
+
+    Up to memory_limit addresses are held in a Python set (roughly 120
+    bytes each). Past that they move to a temporary on-disk SQLite table
+    keyed by a 63-bit fingerprint and the address itself, fronted by a
+    fixed 8 MiB Bloom filter, so only addresses the filter may already have
+    seen are looked up on disk. The filter's false-positive rate stays
+    under 1% up to about six million addresses. A false positive, or two
+    addresses sharing a fingerprint, only costs that lookup, which compares
+    the addresses themselves; the answer is always exact.
+    """
+
+    def __init__(self, memory_limit: int = DEDUPE_MEMORY_ADDRESSES):
+        self.memory_limit = memory_limit
+        self.count = 0
+        self._memory: Optional[Set[str]] = set()
+        self._bloom: Optional[bytearray] = None
+        self._pending: Set[Tuple[int, str]] = set()
+        self._conn: Optional[sqlite3.Connection] = None
+
+    def add(self, email: str) -> bool:
+        """
+        Add a (normalized) address
+
+        Returns:
+            bool: True if it was not in the set yet
+        """
+        memory = self._memory
+        if memory is not None:
+            if email in memory:
+                return False
+            memory.add(email)
+            self.count += 1
+            if len(memory) > self.memory_limit:
+                self._spill()
+            return True
+
+        entry = (hash(email) & _FINGERPRINT_MASK, email)
+        if self._probe(entry[0]) and self._contains(entry):
+            return False
+        self._pending.add(entry)
+        self.count += 1
+        if len(self._pending) >= DEDUPE_SPILL_BATCH:
+            self._flush()
+        return True
+
+    def _probe(self, fingerprint: int) -> bool:
+        """Set the fingerprint's Bloom filter bits; True if all of them were already set"""
+        bloom = self._bloom
+        # Double hashing: the probes step through the filter by the high half
+        position, step = fingerprint & 0xFFFFFFFF, (fingerprint >> 32) | 1
+        last_bit = len(bloom) * 8 - 1
+        seen = True
+        for _ in range(DEDUPE_BLOOM_PROBES):
+            bit = position & last_bit
+            mask = 1 << (bit & 7)
+            if not bloom[bit >> 3] & mask:
+                bloom[bit >> 3] |= mask
+                seen = False
+            position += step
+        return seen
+
+    def _contains(self, entry: Tuple[int, str]) -> bool:
+        if entry in self._pending:
+            return True
+        row = self._conn.execute("SELECT 1 FROM seen WHERE fingerprint = ? AND email = ?", entry).fetchone()
+        return row is not None
+
+    def _spill(self) -> None:
+        # An empty name is a private temporary database, deleted on close
+        self._conn = sqlite3.connect("", check_same_thread=False, isolation_level=None)
+        self._conn.execute("PRAGMA journal_mode=OFF")
+        self._conn.execute("PRAGMA synchronous=OFF")
+        self._conn.execute("CREATE TABLE seen (fingerprint INTEGER, email TEXT, PRIMARY KEY (fingerprint, email)) "
+                           "WITHOUT ROWID")
+        self._bloom = bytearray(DEDUPE_BLOOM_BITS // 8)
+        pending = set()
+        for email in self._memory:
+            fingerprint = hash(email) & _FINGERPRINT_MASK
+            self._probe(fingerprint)
+            pending.add((fingerprint, email))
+        self._pending = pending
+        self._memory = None
+        self._flush()
+
+    def _flush(self) -> None:
+        # In key order, so each batch touches every B-tree page once
+        self._conn.executemany("INSERT OR IGNORE INTO seen VALUES (?, ?)", sorted(self._pending))
+        self._pending = set()
+
+    def __len__(self) -> int:
+        return self.count
+
+    def close(self) -> None:
+        if self._conn is not None:
+            self._conn.close()
+            self._conn = None
+
+
+class RecipientValidator:
+    """
+    Streaming filter that normalizes, validates and de-duplicates recipients
+
+    Seen addresses are tracked in a SeenAddresses set, which moves to disk
+    past DEDUPE_MEMORY_ADDRESSES addresses, so memory stays bounded however
+    long the list is.
+    """
+
+    def __init__(self, dedupe: bool = True, max_report_rows: int = 10000):
+        """
+        Args:
+            dedupe: Drop repeated addresses after normalization
+            max_report_rows: Rejections kept for the report; counts are always exact
+        """
+        self.dedupe = dedupe
+        self.max_report_rows = max_report_rows
+        self.accepted = 0
+        self.rejected: Dict[str, int] = {"invalid": 0, "duplicate": 0}
+        self.report: List[Dict[str, str]] = []
+        self._seen = SeenAddresses()
+
+    @property
+    def rejected_count(self) -> int:
+        return sum(self.rejected.values())
+
+    def filter(self, recipients: Iterable[Dict[str, str]],
+               duplicates: Collection[int] = ()) -> Iterator[Dict[str, str]]:
+        """
+        Yield only deliverable, first-seen recipients, with normalized emails
+
+        Args:
+            recipients: Iterable of recipient dictionaries with an 'email' key
+            duplicates: Positions (from 0) in recipients of addresses already
+                seen elsewhere, e.g. in an earlier chunk of the same campaign;
+                they are rejected as duplicates
+
+        Returns:
+            Iterator of recipients; input dictionaries are never modified
+        """
+        seen = self._seen
+        dedupe = self.dedupe
+        for position, recipient in enumerate(recipients):
+            original = recipient["email"]
+            email = normalize_email(original)
+
+            if not is_valid_email(email):
+                self._reject(recipient, position, original, "invalid")
+                continue
+
+            if duplicates and position in duplicates:
+                self._reject(recipient, position, original, "duplicate")
+                continue
+
+            if dedupe and not seen.add(email):
+                self._reject(recipient, position, original, "duplicate")
+                continue
+
+            if email != original:
+                recipient = dict(recipient, email=email)
+            self.accepted += 1
+            yield recipient
+
+    def _reject(self, recipient: Dict[str, str], position: int, email: str, reason: str) -> None:
+        self.rejected[reason] += 1
+        if len(self.report) < self.max_report_rows:
+            # CSV rows know their line; other sources report their position from 1
+            line = getattr(recipient, "line", None) or position + 1
+            self.report.append({"line": str(line), "email": email, "reason": reason})
+
+    def summary(self) -> Dict[str, int]:
+        """Accepted and rejected counts, by rejection reason"""
+        return {"accepted": self.accepted, **self.rejected}
+
+    def write_report(self, file) -> None:
+        """
+        Write the rejection report as CSV (line, email, reason)
+
+        line is the recipient's line in the source CSV when known, else its
+        position (from 1) in the filtered recipients.
+
+        Args:
+            file: Destination CSV path or text file object
+        """
+        if isinstance(file, str):
+            with open(file, "w", encoding="utf-8", newline="") as handle:
+                self.write_report(handle)
+            return
+
+        writer = csv.DictWriter(file, fieldnames=["line", "email", "reason"])
+        writer.writeheader()
+        writer.writerows(self.report)
@@ -0,0 +1,217 @@
+"""
+Compact on-disk recipient store for random access and segmentation
+"""
+
+import json
+import os
+import sqlite3
+from contextlib import closing
+from itertools import islice
+from typing import Dict, Iterable, Iterator, List, Optional, Tuple
+
+from pathra_preshana.recipient_filter import SourceRow
+
+# Recipients inserted per executemany call while building
+BUILD_BATCH = 10_000
+
+# Rows fetched per round trip while streaming a selection
+FETCH_BATCH = 1000
+
+STORE_VERSION = "2"
+
+
+class RecipientStore:
+    """
+    Recipients of one CSV file in an embedded SQLite table
+
+    Stored next to the CSV as <file>.db, one row per recipient in file
+    order, with the recipient's position as the primary key and its CSV
+    line number alongside. Slices are
+    primary-key range reads, the count is kept in the metadata, and columns
+    used in filters get an index the first time they are filtered on. A
+    store is only used while the CSV's mtime and size match those it was
+    built from.
+    """
+
+    SUFFIX = ".db"
+
+    def __init__(self, csv_path: str, columns: List[str], count: int):
+        """
+        Args:
+            csv_path: CSV file the store was built from
+            columns: Recipient keys, in order
+            count: Number of recipients
+        """
+        self.csv_path = str(csv_path)
+        self.path = self.store_path(csv_path)
+        self.columns = columns
+        self.count = count
+        self._column_names = {column: f"c{position}" for position, column in enumerate(columns)}
+
+    @classmethod
+    def store_path(cls, csv_path: str) -> str:
+        return str(csv_path) + cls.SUFFIX
+
+    @staticmethod
+    def _signature(csv_path: str) -> Tuple[str, str]:
+        stat = os.stat(csv_path)
+        return str(stat.st_mtime_ns), str(stat.st_size)
+
+    @classmethod
+    def open(cls, csv_path: str) -> Optional["RecipientStore"]:
+        """
+        Open the store of a CSV file
+
+        Returns:
+            RecipientStore, or None if there is none or the CSV changed since
+        """
+        path = cls.store_path(csv_path)
+        if not os.path.exists(path):
+            return None
+        try:
+            with closing(sqlite3.connect(f"file:{path}?mode=ro", uri=True)) as conn:
+                meta = dict(conn.execute("SELECT key, value FROM meta"))
+        except sqlite3.Error:
+            return None
+        signature = cls._signature(csv_path)
+        if (meta.get("version"), meta.get("csv_mtime_ns"), meta.get("csv_size")) != (STORE_VERSION, *signature):
+            return None
+        return cls(csv_path, json.loads(meta["columns"]), int(meta["count"]))
+
+    @classmethod
+    def build(cls, csv_path: str, columns: List[str], recipients: Iterable[Dict[str, str]]) -> "RecipientStore":
+        """
+        Build (or rebuild) the store of a CSV file
+
+        The store is written to a temporary file and moved into place, so
+        readers never see a partial one.
+
+        Args:
+            csv_path: CSV file the recipients were read from
+            columns: Recipient keys, in order
+            recipients: Recipients, in file order
+
+        Returns:
+            The new RecipientStore
+        """
+        signature = cls._signature(csv_path)
+        path = cls.store_path(csv_path)
+        # Per process, so builds in separate web workers do not collide
+        temp_path = f"{path}.{os.getpid()}.tmp"
+        if os.path.exists(temp_path):
+            os.remove(temp_path)
+
+        conn = sqlite3.connect(temp_path, isolation_level=None)
+        try:
+            # Nothing to recover if a build is interrupted; it just runs again
+            conn.execute("PRAGMA journal_mode=OFF")
+            conn.execute("PRAGMA synchronous=OFF")
+            conn.execute("BEGIN")
+            conn.execute("CREATE TABLE meta (key TEXT PRIMARY KEY, value TEXT NOT NULL)")
+            conn.execute(
+                "CREATE TABLE recipients (id INTEGER PRIMARY KEY, line INTEGER, "
+                + ", ".join(f"c{position} TEXT NOT NULL" for position in range(len(columns)))
+                + ")"
+            )
+            insert = (
+                f"INSERT INTO recipients VALUES (?, ?, {', '.join('?' * len(columns))})"
+            )
+
+            count = 0
+            rows = (
+                (position, getattr(recipient, "line", None), *(recipient.get(column, "") for column in columns))
+                for position, recipient in enumerate(recipients)
+            )
+            while True:
+                batch = list(islice(rows, BUILD_BATCH))
+                if not batch:
+                    break
+                conn.executemany(insert, batch)
+                count += len(batch)
+
+            conn.executemany("INSERT INTO meta VALUES (?, ?)", [
+                ("version", STORE_VERSION),
+                ("csv_mtime_ns", signature[0]),
+                ("csv_size", signature[1]),
+                ("columns", json.dumps(columns)),
+                ("count", str(count)),
+            ])
+            conn.execute("COMMIT")
+        except BaseException:
+            conn.close()
+            os.remove(temp_path)
+            raise
+        conn.close()
+        os.replace(temp_path, path)
+        return cls(csv_path, columns, count)
+
+    def _where(self, where: Optional[Dict[str, str]]) -> Tuple[str, List[str]]:
+        """SQL condition and parameters for equality filters, indexing their columns"""
+        if not where:
+            return "", []
+        unknown = [column for column in where if column not in self._column_names]
+        if unknown:
+            raise ValueError(f"Unknown column(s): {', '.join(unknown)}")
+
+        names = [self._column_names[column] for column in where]
+        try:
+            with closing(sqlite3.connect(self.path, isolation_level=None, timeout=1.0)) as conn:
+                for name in names:
+                    conn.execute(f"CREATE INDEX IF NOT EXISTS idx_{name} ON recipients ({name})")
+        except sqlite3.OperationalError:
+            # Locked by a long read (e.g. a campaign streaming from the store);
+            # the query is still answered, by a scan, and indexes next time
+            pass
+        condition = " WHERE " + " AND ".join(f"{name} = ?" for name in names)
+        return condition, [str(value).strip() for value in where.values()]
+
+    def count_matching(self, where: Optional[Dict[str, str]] = None) -> int:
+        """
+        Number of recipients matching every column = value pair in where
+
+        Args:
+            where: Optional equality filters; without them the stored count is returned
+        """
+        if not where:
+            return self.count
+        condition, params = self._where(where)
+        with closing(sqlite3.connect(f"file:{self.path}?mode=ro", uri=True)) as conn:
+            return conn.execute(f"SELECT COUNT(*) FROM recipients{condition}", params).fetchone()[0]
+
+    def select(self, where: Optional[Dict[str, str]] = None, offset: int = 0,
+               limit: Optional[int] = None) -> Iterator[Dict[str, str]]:
+        """
+        Stream recipients in file order
+
+        Args:
+            where: Optional equality filters (column: value)
+            offset: Matching recipients to skip
+            limit: Maximum recipients to return
+
+        Returns:
+            Iterator of recipient dictionaries (SourceRows), as FileReader produces them
+        """
+        condition, params = self._where(where)
+        if not where:
+            # Positions are the primary key, so a slice is a range read
+            condition, params = " WHERE id >= ?", [offset]
+            offset = 0
+        query = f"SELECT * FROM recipients{condition} ORDER BY id"
+        if limit is not None or offset:
+            query += " LIMIT ? OFFSET ?"
+            params = params + [limit if limit is not None else -1, offset]
+        return self._stream(query, params)
+
+    def _stream(self, query: str, params: List) -> Iterator[Dict[str, str]]:
+        columns = self.columns
+        conn = sqlite3.connect(f"file:{self.path}?mode=ro", uri=True, check_same_thread=False)
+        try:
+            cursor = conn.execute(query, params)
+            while True:
+                rows = cursor.fetchmany(FETCH_BATCH)
+                if not rows:
+                    return
+                for row in rows:
+                    yield SourceRow(zip(columns, row[2:]), row[1])
+        finally:
+            conn.close()
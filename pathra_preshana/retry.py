@@ -0,0 +1,107 @@
+"""
+Failure classification and delayed retries for transient SMTP errors
+"""
+
+import heapq
+import itertools
+import random
+import smtplib
+import time
+from typing import Any, Dict, List, Optional, Tuple
+
+from pathra_preshana.smtp_session import smtp_error_code
+
+TRANSIENT = "transient"
+PERMANENT = "permanent"
+QUOTA = "quota"
+
+# Replies that mean "slow down" rather than "this mailbox is broken"
+THROTTLING_CODES = frozenset({"421", "450", "451", "454", "disconnect"})
+
+
+def classify_failure(error: Exception) -> Tuple[str, str]:
+    """
+    Classify a send failure by its SMTP reply code
+
+    4xx replies, dropped connections and network errors are transient and
+    worth retrying; 5xx replies and other errors are permanent.
+
+    Returns:
+        Tuple of (category, code), code as from smtp_error_code
+    """
+    code = smtp_error_code(error)
+    if code.isdigit():
+        return (TRANSIENT if code.startswith("4") else PERMANENT), code
+    if code == "disconnect":
+        return TRANSIENT, code
+    # SMTPException subclasses OSError, so rule it out before network errors
+    if isinstance(error, OSError) and not isinstance(error, smtplib.SMTPException):
+        return TRANSIENT, code
+    return PERMANENT, code
+
+
+def is_throttling(result: Dict[str, str]) -> bool:
+    """True if a result's failure suggests the server wants us to send slower"""
+    return result.get("category") == TRANSIENT and result.get("code") in THROTTLING_CODES
+
+
+class RetryPolicy:
+    """How often and how long to wait before retrying transient failures"""
+
+    def __init__(self, max_retries: int = 3, base_delay: float = 2.0, max_delay: float = 60.0):
+        """
+        Args:
+            max_retries: Retries after the first attempt
+            base_delay: Backoff before the first retry, in seconds
+            max_delay: Upper bound on any single backoff, in seconds
+        """
+        self.max_retries = max(0, max_retries)
+        self.base_delay = base_delay
+        self.max_delay = max_delay
+
+    def should_retry(self, result: Dict[str, str], attempt: int) -> bool:
+        return result["status"] == "failed" and result.get("category") == TRANSIENT \
+            and attempt <= self.max_retries
+
+    def delay(self, attempt: int) -> float:
+        """Exponential backoff after the given attempt, with equal jitter"""
+        ceiling = min(self.max_delay, self.base_delay * 2 ** (attempt - 1))
+        return ceiling / 2 + random.uniform(0, ceiling / 2)
+
+
+class RetryQueue:
+    """Tasks waiting out their backoff, ordered by due time"""
+
+    def __init__(self, policy: RetryPolicy):
+        self.policy = policy
+        self._heap: List[Tuple[float, int, int, Any, int, Dict]] = []
+        self._order = itertools.count()
+
+    def __len__(self) -> int:
+        return len(self._heap)
+
+    def push(self, seq: int, task: Any, attempt: int, result: Dict) -> None:
+        """Schedule another attempt of a task whose attempt number 'attempt' failed"""
+        due = time.monotonic() + self.policy.delay(attempt)
+        heapq.heappush(self._heap, (due, next(self._order), seq, task, attempt + 1, result))
+
+    def next_due(self) -> Optional[float]:
+        """Seconds until the next retry is due, or None when empty"""
+        if not self._heap:
+            return None
+        return max(0.0, self._heap[0][0] - time.monotonic())
+
+    def pop_due(self) -> List[Tuple[int, Any, int, Dict]]:
+        """Remove and return (seq, task, attempt, last result) for retries now due"""
+        now = time.monotonic()
+        due = []
+        while self._heap and self._heap[0][0] <= now:
+            _, _, seq, task, attempt, result = heapq.heappop(self._heap)
+            due.append((seq, task, attempt, result))
+        return due
+
+    def drain(self) -> List[Tuple[int, Any, int, Dict]]:
+        """Remove and return every waiting retry, e.g. on cancel"""
+        items = [(seq, task, attempt, result) for _, _, seq, task, attempt, result in sorted(self._heap)]
+        self._heap.clear()
+        return items
@@ -0,0 +1,640 @@
+"""
+Persistent, fair-share scheduling of campaigns across users
+
+Campaigns are admitted into a SQLite-backed queue with a priority and an
+optional daily send window. Admitted campaigns send concurrently, taking
+turns at the sending account's rate limiter by weighted fair queuing, so a
+large list cannot starve other users' sends. Queued, running and paused
+campaigns survive restarts and resume from the send journal. Each web
+process claims the campaigns it schedules with a lease it keeps renewing;
+campaigns of a process that stops renewing are taken over by another.
+"""
+
+import heapq
+import itertools
+import json
+import os
+import socket
+import sqlite3
+import threading
+import time
+from datetime import datetime
+from typing import Any, Callable, Dict, List, Optional, Set, Tuple
+
+from pathra_preshana.jobs import CampaignJob, JobManager
+from pathra_preshana.log import get_logger
+from pathra_preshana.rate_limit import SECONDS_PER_DAY, RateLimiter
+
+log = get_logger(__name__)
+
+PRIORITY_WEIGHTS = {"low": 1, "normal": 2, "high": 4}
+
+# Share of the daily quota a campaign may use at once before quota pacing
+# spreads the rest evenly over the day
+QUOTA_BURST_FRACTION = 1 / 24
+
+# Seconds between checks of send windows and the queue
+TICK_INTERVAL = 5.0
+
+# Longest a waiting turn goes without checking for cancellation
+POLL_INTERVAL = 0.2
+
+# Seconds a process's claim on its campaigns lasts without being renewed
+# (env CAMPAIGN_LEASE_TIMEOUT); renewed every TICK_INTERVAL
+CAMPAIGN_LEASE_TIMEOUT = float(os.getenv("CAMPAIGN_LEASE_TIMEOUT", "60"))
+
+# Seconds a campaign sends before it may be paused to give its slot to a
+# campaign with a better claim (env CAMPAIGN_TIME_SLICE)
+CAMPAIGN_TIME_SLICE = float(os.getenv("CAMPAIGN_TIME_SLICE", "60"))
+
+_ACTIVE_STATUSES = ("queued", "running", "paused")
+
+
+def parse_window(value: Optional[str]) -> Optional[Tuple[int, int]]:
+    """
+    Parse a daily send window such as '09:00-17:30' (server local time)
+
+    Returns:
+        Tuple of (start, end) in minutes after midnight, or None for no
+        window; a window may wrap past midnight ('22:00-06:00')
+    """
+    if not value:
+        return None
+    if not isinstance(value, str):
+        raise ValueError(f"Invalid send window {value!r} (expected HH:MM-HH:MM)")
+    try:
+        start, end = (datetime.strptime(part.strip(), "%H:%M") for part in value.split("-"))
+    except ValueError:
+        raise ValueError(f"Invalid send window '{value}' (expected HH:MM-HH:MM)")
+    start_minutes, end_minutes = start.hour * 60 + start.minute, end.hour * 60 + end.minute
+    if start_minutes == end_minutes:
+        raise ValueError(f"Send window '{value}' is empty")
+    return start_minutes, end_minutes
+
+
+def in_window(window: Optional[Tuple[int, int]], now: Optional[datetime] = None) -> bool:
+    """True if now (default: the current local time) falls inside a daily window"""
+    if window is None:
+        return True
+    now = now or datetime.now()
+    minutes = now.hour * 60 + now.minute
+    start, end = window
+    if start < end:
+        return start <= minutes < end
+    return minutes >= start or minutes < end
+
+
+class _QuotaPacer:
+    """Token bucket spreading a daily quota evenly over the day, with a burst allowance"""
+
+    def __init__(self, per_day: int):
+        self.rate = per_day / SECONDS_PER_DAY
+        self.burst = max(1.0, per_day * QUOTA_BURST_FRACTION)
+        self._tokens = self.burst
+        self._last = time.monotonic()
+
+    def reserve(self, count: int) -> float:
+        """Take count tokens; returns the seconds to wait them off (called under the FairShare lock)"""
+        now = time.monotonic()
+        self._tokens = min(self.burst, self._tokens + (now - self._last) * self.rate)
+        self._last = now
+        self._tokens -= count
+        return -self._tokens / self.rate if self._tokens < 0 else 0.0
+
+
+class _Flow:
+    __slots__ = ("owner", "weight", "finish")
+
+    def __init__(self, owner: str, weight: float):
+        self.owner = owner
+        self.weight = weight
+        self.finish = 0.0
+
+
+class FairShare:
+    """
+    Weighted fair queuing of send turns across running campaigns
+
+    Every message (or shared batch) takes a turn at the account's rate
+    limiter. Turns are granted in order of virtual finish time, which grows
+    by count / weight per turn; a campaign's weight is its priority weight
+    divided by the number of campaigns its owner has running, so users get
+    equal shares and split theirs between their campaigns. With a daily
+    quota, a pacer also spreads the quota evenly over the day, allowing a
+    burst of QUOTA_BURST_FRACTION of it so small sends go out at once.
+    """
+
+    def __init__(self):
+        self._cond = threading.Condition()
+        self._flows: Dict[str, _Flow] = {}
+        self._waiting: List[Tuple[float, int]] = []
+        self._sequence = itertools.count()
+        self._virtual_time = 0.0
+        self._busy = False
+        self._pacers: Dict[int, _QuotaPacer] = {}
+
+    def join(self, key: str, owner: Optional[str], priority: str = "normal") -> None:
+        """Start sharing for a campaign"""
+        with self._cond:
+            flow = _Flow(owner or "", PRIORITY_WEIGHTS.get(priority, PRIORITY_WEIGHTS["normal"]))
+            # A newcomer starts at the current virtual time, not with credit
+            flow.finish = self._virtual_time
+            self._flows[key] = flow
+
+    def leave(self, key: str) -> None:
+        with self._cond:
+            self._flows.pop(key, None)
+            self._cond.notify_all()
+
+    def limiter(self, key: str, inner: RateLimiter, cancel_event: threading.Event) -> "FairShareLimiter":
+        """Rate limiter for one campaign that takes its turns through this share"""
+        return FairShareLimiter(self, key, inner, cancel_event)
+
+    def _pace(self, inner: RateLimiter, count: int) -> float:
+        if not inner.per_day or getattr(inner, "paces_quota", False):
+            # No quota, or one already paced across processes
+            return 0.0
+        with self._cond:
+            pacer = self._pacers.get(id(inner))
+            if pacer is None:
+                pacer = self._pacers[id(inner)] = _QuotaPacer(inner.per_day)
+            return pacer.reserve(count)
+
+    def acquire(self, key: str, count: int, inner: RateLimiter, cancel_event: threading.Event) -> bool:
+        """
+        Wait for the campaign's turn, then for the account's limiter
+
+        Returns:
+            bool: False if the daily quota is exhausted; True otherwise,
+            including when cancel_event was set while waiting
+        """
+        with self._cond:
+            flow = self._flows[key]
+            siblings = sum(1 for other in self._flows.values() if other.owner == flow.owner)
+            start = max(self._virtual_time, flow.finish)
+            flow.finish = start + count * siblings / flow.weight
+            ticket = (flow.finish, next(self._sequence))
+            heapq.heappush(self._waiting, ticket)
+            while self._busy or self._waiting[0] != ticket:
+                if cancel_event.is_set():
+                    self._waiting.remove(ticket)
+                    heapq.heapify(self._waiting)
+                    self._cond.notify_all()
+                    return True
+                self._cond.wait(POLL_INTERVAL)
+            heapq.heappop(self._waiting)
+            self._busy = True
+            self._virtual_time = start
+
+        try:
+            # Reserving is quick; the wait it asks for is served after the
+            # turn is passed on, so the next campaign's reservation queues
+            # up behind this one instead of waiting for it to finish
+            wait = inner.reserve(count)
+            if wait is not None:
+                wait = max(wait, self._pace(inner, count))
+        finally:
+            with self._cond:
+                self._busy = False
+                self._cond.notify_all()
+        if wait is None:
+            return False
+        if wait:
+            cancel_event.wait(wait)
+        return True
+
+
+class FairShareLimiter:
+    """A campaign's view of the account rate limiter, taking turns through a FairShare"""
+
+    # Acquiring waits for other campaigns; asyncio callers run it in a thread
+    blocking = True
+
+    def __init__(self, share: FairShare, key: str, inner: RateLimiter, cancel_event: threading.Event):
+        self.share = share
+        self.key = key
+        self.inner = inner
+        self.cancel_event = cancel_event
+
+    def acquire(self, count: int = 1) -> bool:
+        return self.share.acquire(self.key, count, self.inner, self.cancel_event)
+
+    def succeeded(self) -> None:
+        self.inner.succeeded()
+
+    def throttled(self) -> None:
+        self.inner.throttled()
+
+    def remaining_today(self) -> Optional[int]:
+        return self.inner.remaining_today()
+
+
+class CampaignQueue:
+    """SQLite table of scheduled campaigns and their send specifications"""
+
+    def __init__(self, path: Optional[str] = None):
+        """
+        Args:
+            path: Database file (env CAMPAIGN_QUEUE_PATH, default data/campaign_queue.db)
+        """
+        self.path = path or os.getenv("CAMPAIGN_QUEUE_PATH", os.path.join("data", "campaign_queue.db"))
+        directory = os.path.dirname(self.path)
+        if directory and not os.path.exists(directory):
+            os.makedirs(directory)
+
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(self.path, check_same_thread=False, isolation_level=None, timeout=30.0)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute(
+            """
+            CREATE TABLE IF NOT EXISTS campaigns (
+                job_id TEXT PRIMARY KEY,
+                owner TEXT,
+                priority TEXT NOT NULL,
+                send_window TEXT,
+                total INTEGER NOT NULL,
+                spec TEXT NOT NULL,
+                status TEXT NOT NULL,
+                created_at REAL NOT NULL,
+                updated_at REAL NOT NULL,
+                results TEXT,
+                error TEXT,
+                worker TEXT,
+                lease_expires REAL
+            )
+            """
+        )
+        # Queues created before campaigns were claimed lack the lease columns
+        columns = {row[1] for row in self._conn.execute("PRAGMA table_info(campaigns)")}
+        for column, kind in (("worker", "TEXT"), ("lease_expires", "REAL")):
+            if column not in columns:
+                self._conn.execute(f"ALTER TABLE campaigns ADD COLUMN {column} {kind}")
+        self._conn.execute("CREATE INDEX IF NOT EXISTS campaigns_status ON campaigns (status)")
+
+    def add(self, job_id: str, owner: Optional[str], priority: str, window: Optional[str], total: int,
+            spec: Dict[str, Any], worker: Optional[str] = None, lease_timeout: float = 0.0) -> None:
+        """Queue a campaign, claimed by worker if given"""
+        now = time.time()
+        with self._lock:
+            self._conn.execute(
+                "INSERT INTO campaigns (job_id, owner, priority, send_window, total, spec, status, "
+                "created_at, updated_at, worker, lease_expires) VALUES (?, ?, ?, ?, ?, ?, 'queued', ?, ?, ?, ?)",
+                (job_id, owner, priority, window, total, json.dumps(spec), now, now, worker,
+                 now + lease_timeout if worker else None)
+            )
+
+    def update(self, job_id: str, status: str, spec: Optional[Dict[str, Any]] = None,
+               results: Optional[Dict] = None, error: Optional[str] = None,
+               worker: Optional[str] = None) -> bool:
+        """
+        Record a campaign's status; a finished campaign's claim is released
+
+        Args:
+            worker: If given, only update the campaign while worker holds it
+
+        Returns:
+            bool: False if worker no longer holds the campaign
+        """
+        fields: Dict[str, Any] = {"status": status, "updated_at": time.time()}
+        if spec is not None:
+            fields["spec"] = json.dumps(spec)
+        if results is not None:
+            fields["results"] = json.dumps(results)
+        if error is not None:
+            fields["error"] = error
+        if status not in _ACTIVE_STATUSES:
+            fields["worker"] = fields["lease_expires"] = None
+        where, params = "job_id = ?", [job_id]
+        if worker is not None:
+            where, params = where + " AND worker = ?", params + [worker]
+        with self._lock:
+            updated = self._conn.execute(
+                f"UPDATE campaigns SET {', '.join(f'{name} = ?' for name in fields)} WHERE {where}",
+                (*fields.values(), *params)
+            ).rowcount
+        return updated == 1
+
+    def claim(self, worker: str, lease_timeout: float) -> List[Dict[str, Any]]:
+        """
+        Claim unfinished campaigns that no process holds: never claimed, or
+        their holder stopped renewing its lease
+
+        Returns:
+            The newly claimed campaigns, oldest first, as from active()
+        """
+        now = time.time()
+        where = (f"status IN ({', '.join('?' * len(_ACTIVE_STATUSES))}) "
+                 "AND (worker IS NULL OR lease_expires IS NULL OR lease_expires < ?)")
+        with self._lock:
+            self._conn.execute("BEGIN IMMEDIATE")
+            try:
+                rows = self._conn.execute(
+                    "SELECT job_id, owner, priority, send_window, total, spec, status FROM campaigns "
+                    f"WHERE {where} ORDER BY created_at",
+                    (*_ACTIVE_STATUSES, now)
+                ).fetchall()
+                self._conn.execute(
+                    f"UPDATE campaigns SET worker = ?, lease_expires = ? WHERE {where}",
+                    (worker, now + lease_timeout, *_ACTIVE_STATUSES, now)
+                )
+                self._conn.execute("COMMIT")
+            except Exception:
+                self._conn.execute("ROLLBACK")
+                raise
+        return [self._row(row) for row in rows]
+
+    def renew(self, worker: str, lease_timeout: float) -> Set[str]:
+        """
+        Extend worker's claim on its unfinished campaigns
+
+        Returns:
+            Ids of the campaigns worker still holds
+        """
+        now = time.time()
+        where = f"worker = ? AND status IN ({', '.join('?' * len(_ACTIVE_STATUSES))})"
+        with self._lock:
+            self._conn.execute(f"UPDATE campaigns SET lease_expires = ? WHERE {where}",
+                               (now + lease_timeout, worker, *_ACTIVE_STATUSES))
+            rows = self._conn.execute(f"SELECT job_id FROM campaigns WHERE {where}",
+                                      (worker, *_ACTIVE_STATUSES)).fetchall()
+        return {job_id for job_id, in rows}
+
+    def active(self) -> List[Dict[str, Any]]:
+        """Campaigns not yet finished, oldest first"""
+        with self._lock:
+            rows = self._conn.execute(
+                "SELECT job_id, owner, priority, send_window, total, spec, status FROM campaigns "
+                f"WHERE status IN ({', '.join('?' * len(_ACTIVE_STATUSES))}) ORDER BY created_at",
+                _ACTIVE_STATUSES
+            ).fetchall()
+        return [self._row(row) for row in rows]
+
+    @staticmethod
+    def _row(row: Tuple) -> Dict[str, Any]:
+        job_id, owner, priority, window, total, spec, status = row
+        return {"job_id": job_id, "owner": owner, "priority": priority, "window": window, "total": total,
+                "spec": json.loads(spec), "status": status}
+
+    def close(self) -> None:
+        with self._lock:
+            self._conn.close()
+
+
+class _Entry:
+    __slots__ = ("job", "spec", "priority", "window", "pausing", "cancelled", "admitted_at")
+
+    def __init__(self, job: CampaignJob, spec: Dict[str, Any], priority: str, window: Optional[str]):
+        self.job = job
+        self.spec = spec
+        self.priority = priority
+        self.window = window
+        self.pausing = False
+        self.cancelled = False
+        self.admitted_at = 0.0
+
+    @property
+    def weight(self) -> int:
+        return PRIORITY_WEIGHTS[self.priority]
+
+
+class CampaignScheduler:
+    """
+    Admits queued campaigns into the JobManager by priority and send window
+
+    Up to max_active campaigns send at once, sharing the account through a
+    FairShare. A running campaign whose window closes is paused and resumed
+    (skipping recipients the journal shows as sent) when it reopens.
+
+    Slots go by weight rather than first come, first served: a campaign's
+    claim is its owner's running campaigns divided by its priority weight,
+    lowest first. When every slot is taken, a waiting campaign pauses the
+    running one with the highest claim above its own, once that one has
+    sent for CAMPAIGN_TIME_SLICE seconds, so a small send is never stuck
+    behind large ones.
+    """
+
+    def __init__(self, jobs: JobManager,
+                 runner: Callable[[Dict[str, Any], CampaignJob, Callable[[RateLimiter], Any]], Dict],
+                 queue: Optional[CampaignQueue] = None, max_active: Optional[int] = None,
+                 worker: Optional[str] = None):
+        """
+        Args:
+            jobs: JobManager the campaigns run on
+            runner: Sends a campaign: called with its spec, its job and a
+                function that wraps the sender's rate limiter for fair sharing
+            queue: Persistent queue (default CampaignQueue(), opened by start)
+            max_active: Campaigns sending at once (default: the JobManager's workers)
+            worker: Name this scheduler claims campaigns under (default
+                host:pid, taken when started so forked processes differ)
+        """
+        self.jobs = jobs
+        self.runner = runner
+        self.queue = queue
+        self.max_active = max_active or jobs.max_workers
+        self.worker = worker
+        self.share = FairShare()
+
+        self._lock = threading.Lock()
+        self._entries: Dict[str, _Entry] = {}
+        self._running: Dict[str, _Entry] = {}
+        self._wake = threading.Event()
+        self._thread: Optional[threading.Thread] = None
+
+    def start(self) -> None:
+        """Reload unfinished campaigns and start admitting them (idempotent)"""
+        if self._thread is not None:
+            return
+        with self._lock:
+            if self._thread is not None:
+                return
+            if self.queue is None:
+                self.queue = CampaignQueue()
+            if self.worker is None:
+                self.worker = f"{socket.gethostname()}:{os.getpid()}"
+            self._restore()
+            self._thread = threading.Thread(target=self._loop, name="campaign-scheduler", daemon=True)
+            self._thread.start()
+
+    def _restore(self) -> None:
+        """Take over campaigns no process holds; called with the lock held"""
+        restored = 0
+        for row in self.queue.claim(self.worker, CAMPAIGN_LEASE_TIMEOUT):
+            spec = row["spec"]
+            if row["status"] != "queued":
+                # Interrupted mid-send: pick up after what was delivered
+                spec["resume"] = True
+            job = self.jobs.create(row["total"], owner=row["owner"], campaign_id=spec.get("campaign_id"),
+                                   job_id=row["job_id"])
+            job.schedule = {"priority": row["priority"], "window": row["window"]}
+            self._entries[job.job_id] = _Entry(job, spec, row["priority"], row["window"])
+            self.queue.update(job.job_id, "queued", spec, worker=self.worker)
+            restored += 1
+        if restored:
+            log.info("Restored scheduled campaigns", extra={"count": restored, "worker": self.worker})
+
+    def _renew(self) -> None:
+        """Extend this scheduler's claims, letting go of campaigns taken over elsewhere; called with the lock held"""
+        held = self.queue.renew(self.worker, CAMPAIGN_LEASE_TIMEOUT)
+        for job_id in [job_id for job_id in self._entries if job_id not in held]:
+            entry = self._entries.pop(job_id)
+            log.warning("Campaign taken over by another process", extra={"job_id": job_id})
+            if job_id in self._running:
+                # Stopped without touching the row, which is no longer ours
+                entry.pausing = False
+                entry.cancelled = True
+                entry.job.cancel_event.set()
+            else:
+                entry.job.status = "cancelled"
+                entry.job.finished_at = time.time()
+
+    def submit(self, spec: Dict[str, Any], total: int, owner: Optional[str] = None,
+               priority: str = "normal", window: Optional[str] = None) -> CampaignJob:
+        """
+        Queue a campaign
+
+        Args:
+            spec: JSON-serializable description of the send, passed to the runner
+            total: Number of recipients, for progress reporting
+            owner: Email of the user who queued it
+            priority: 'low', 'normal' or 'high'
+            window: Optional daily send window, 'HH:MM-HH:MM'
+
+        Returns:
+            The queued CampaignJob
+        """
+        if not isinstance(priority, str) or priority not in PRIORITY_WEIGHTS:
+            raise ValueError(f"priority must be one of: {', '.join(PRIORITY_WEIGHTS)}")
+        parse_window(window)
+        self.start()
+
+        job = self.jobs.create(total, owner=owner, campaign_id=spec.get("campaign_id"))
+        job.schedule = {"priority": priority, "window": window}
+        self.queue.add(job.job_id, owner, priority, window, total, spec, self.worker, CAMPAIGN_LEASE_TIMEOUT)
+        with self._lock:
+            self._entries[job.job_id] = _Entry(job, spec, priority, window)
+        self._wake.set()
+        return job
+
+    def cancel(self, job_id: str) -> bool:
+        """
+        Cancel a queued, paused or running campaign
+
+        Returns:
+            bool: True if the campaign existed and was not already finished
+        """
+        with self._lock:
+            entry = self._entries.get(job_id)
+            if entry is None:
+                return self.jobs.cancel(job_id)
+            if job_id in self._running:
+                entry.pausing = False
+                entry.cancelled = True
+                return self.jobs.cancel(job_id)
+            del self._entries[job_id]
+        entry.job.cancel_event.set()
+        entry.job.status = "cancelled"
+        entry.job.finished_at = time.time()
+        self.queue.update(job_id, "cancelled", worker=self.worker)
+        return True
+
+    def _loop(self) -> None:
+        while True:
+            try:
+                self._tick()
+            except Exception:
+                log.exception("Campaign scheduler error")
+            self._wake.wait(TICK_INTERVAL)
+            self._wake.clear()
+
+    def _tick(self) -> None:
+        with self._lock:
+            self._renew()
+            self._restore()
+
+            # Pause campaigns whose send window has closed
+            for entry in self._running.values():
+                if not entry.pausing and not entry.cancelled and not in_window(parse_window(entry.window)):
+                    entry.pausing = True
+                    entry.job.cancel_event.set()
+
+            waiting = [
+                entry for job_id, entry in self._entries.items()
+                if job_id not in self._running and in_window(parse_window(entry.window))
+            ]
+            running: Dict[str, int] = {}
+            for entry in self._running.values():
+                running[entry.job.owner] = running.get(entry.job.owner, 0) + 1
+
+            def claim(entry: _Entry) -> float:
+                return running.get(entry.job.owner, 0) / entry.weight
+
+            admitted = []
+            now = time.monotonic()
+            free = self.max_active - len(self._running)
+            while waiting:
+                # Best claim first, then those that sent least recently (a
+                # paused campaign goes behind fresh ones), then higher
+                # priority, then oldest
+                waiting.sort(key=lambda entry: (claim(entry), entry.admitted_at, -entry.weight,
+                                                entry.job.created_at))
+                entry = waiting[0]
+                if free <= 0:
+                    self._preempt(claim(entry), claim, now)
+                    break
+                del waiting[0]
+                entry.admitted_at = now
+                self._running[entry.job.job_id] = entry
+                running[entry.job.owner] = running.get(entry.job.owner, 0) + 1
+                admitted.append(entry)
+                free -= 1
+
+        for entry in admitted:
+            self._admit(entry)
+
+    def _preempt(self, waiting_claim: float, claim: Callable[[_Entry], float], now: float) -> None:
+        """Pause the running campaign with the highest claim above waiting_claim; called with the lock held"""
+        if any(entry.pausing for entry in self._running.values()):
+            # A slot is already being freed
+            return
+        candidates = [
+            entry for entry in self._running.values()
+            if not entry.pausing and not entry.cancelled and now - entry.admitted_at >= CAMPAIGN_TIME_SLICE
+            and claim(entry) > waiting_claim
+        ]
+        if not candidates:
+            return
+        victim = max(candidates, key=lambda entry: (claim(entry), -entry.admitted_at))
+        log.info("Pausing campaign for a waiting one", extra={"job_id": victim.job.job_id})
+        # Paused like a closing window; it is resumed from the journal
+        victim.pausing = True
+        victim.job.cancel_event.set()
+
+    def _admit(self, entry: _Entry) -> None:
+        job = entry.job
+        key = job.job_id
+        self.queue.update(key, "running", entry.spec, worker=self.worker)
+        self.share.join(key, job.owner, entry.priority)
+
+        def run(job: CampaignJob) -> Dict:
+            return self.runner(entry.spec, job, lambda inner: self.share.limiter(key, inner, job.cancel_event))
+
+        self.jobs.start(job, run, on_finish=lambda job: self._finished(entry))
+
+    def _finished(self, entry: _Entry) -> None:
+        job = entry.job
+        self.share.leave(job.job_id)
+        with self._lock:
+            self._running.pop(job.job_id, None)
+            paused = entry.pausing and job.status == "cancelled"
+            if paused:
+                entry.pausing = False
+                # Resumed from the journal when the window reopens
+                entry.spec["resume"] = True
+                job.pause()
+            else:
+                self._entries.pop(job.job_id, None)
+        if paused:
+            self.queue.update(job.job_id, "paused", entry.spec, worker=self.worker)
+        else:
+            self.queue.update(job.job_id, job.status, results=job.results, error=job.error, worker=self.worker)
+        self._wake.set()
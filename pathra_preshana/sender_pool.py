@@ -0,0 +1,442 @@
+"""
+Bulk sending over a pool of sender accounts and SMTP relays
+
+Each account has its own connection limit, rate limiter and daily quota.
+Engine workers are bound to one account at a time and move to another when
+theirs is throttled, over quota or unreachable, so one campaign's volume
+is spread over every account while still producing a single result.
+"""
+
+import json
+import os
+import smtplib
+import threading
+import time
+from typing import Any, Callable, Dict, Iterable, List, Optional, Sequence
+
+from pathra_preshana.assets import Asset
+from pathra_preshana.delivery import DeliveryEngine
+from pathra_preshana.email_sender import EmailSender, _batched, _BulkCampaign, _env_number
+from pathra_preshana.log import get_logger
+from pathra_preshana.message_builder import MessageBuilder
+from pathra_preshana.rate_limit import RateLimiter, get_rate_limiter
+from pathra_preshana.retry import PERMANENT, QUOTA, TRANSIENT, is_throttling
+from pathra_preshana.smtp_session import SMTPSession
+from pathra_preshana.templating import CompiledTemplate
+
+log = get_logger(__name__)
+
+# Seconds new work avoids an account after a throttling reply
+THROTTLE_COOLDOWN = 10.0
+
+# Seconds an account is not used after it could not be connected to
+CONNECT_COOLDOWN = 30.0
+
+
+class SMTPAccount:
+    """One sending account or relay with its own limits"""
+
+    def __init__(self, name: str, username: str, password: str, smtp_server: str = "smtp.gmail.com",
+                 smtp_port: int = 587, sender_email: Optional[str] = None, connections: int = 1,
+                 rate_per_second: Optional[float] = None, rate_per_day: Optional[int] = None,
+                 weight: float = 1.0, max_messages_per_connection: int = 100):
+        """
+        Args:
+            name: Label used in results and logs
+            username: Login user name
+            password: Login password
+            smtp_server: SMTP server hostname
+            smtp_port: SMTP server port (STARTTLS)
+            sender_email: From address (defaults to username)
+            connections: Most concurrent SMTP sessions on this account
+            rate_per_second: Messages/sec cap (None for unlimited)
+            rate_per_day: Messages/day cap (None for unlimited)
+            weight: Share of the campaign relative to the other accounts
+            max_messages_per_connection: Messages per SMTP connection before it is recycled
+        """
+        self.name = name
+        self.username = username
+        self.password = password
+        self.smtp_server = smtp_server
+        self.smtp_port = smtp_port
+        self.sender_email = sender_email or username
+        self.connections = max(1, connections)
+        self.weight = weight if weight > 0 else 1.0
+        self.max_messages_per_connection = max_messages_per_connection
+        # Keyed like EmailSender's, so a single-account sender for the same
+        # address shares the quota
+        self.rate_limiter = get_rate_limiter(self.sender_email, per_second=rate_per_second,
+                                             per_day=rate_per_day)
+
+    @classmethod
+    def from_dict(cls, config: Dict[str, Any]) -> "SMTPAccount":
+        """
+        Build an account from its JSON configuration
+
+        The password is given either as 'password' or, to keep it out of the
+        file, as 'password_env' naming the environment variable that holds it.
+        """
+        config = dict(config)
+        password_env = config.pop("password_env", None)
+        if password_env:
+            config["password"] = os.getenv(password_env, "")
+        username = config.get("username") or ""
+        config.setdefault("name", f"{username}@{config.get('smtp_server', 'smtp.gmail.com')}")
+        if not username or not config.get("password"):
+            raise ValueError(f"Sender account '{config['name']}' needs a username and a password")
+        try:
+            return cls(**config)
+        except TypeError as e:
+            raise ValueError(f"Sender account '{config['name']}': {e}")
+
+    def open_session(self) -> SMTPSession:
+        """
+        Create a reusable SMTP session for this account
+
+        Returns:
+            SMTPSession bound to this account's server and credentials
+        """
+        return SMTPSession(self.smtp_server, self.smtp_port, self.username, self.password,
+                           max_messages_per_connection=self.max_messages_per_connection)
+
+
+def load_accounts(path: str) -> List[SMTPAccount]:
+    """
+    Read sender accounts from a JSON file holding a list of account objects
+
+    Args:
+        path: Path to the JSON file
+
+    Returns:
+        List of SMTPAccount
+    """
+    with open(path, "r", encoding="utf-8") as file:
+        configs = json.load(file)
+    if not isinstance(configs, list) or not configs:
+        raise ValueError(f"{path} must contain a non-empty list of sender accounts")
+    accounts = [SMTPAccount.from_dict(config) for config in configs]
+    names = [account.name for account in accounts]
+    if len(set(names)) != len(names):
+        raise ValueError(f"{path} has sender accounts with the same name")
+    return accounts
+
+
+class NoAccountAvailable(Exception):
+    """Every account of the pool is over quota, cannot log in or cannot be reached"""
+
+    def __init__(self, message: str, category: str):
+        super().__init__(message)
+        self.category = category
+
+
+class AccountUnreachable(OSError):
+    """
+    An account's relay could not be connected to
+
+    An OSError, so classify_failure counts it as transient and the
+    recipients it was meant for use up a retry.
+    """
+
+
+class _PoolSession:
+    """An engine worker's session, bound to one account of the pool at a time"""
+
+    def __init__(self, pool: "SenderPool"):
+        self.pool = pool
+        self.account: Optional[SMTPAccount] = None
+        self.session: Optional[SMTPSession] = None
+        self._closed_sessions = 0
+
+    @property
+    def sessions_opened(self) -> int:
+        return self._closed_sessions + (self.session.sessions_opened if self.session is not None else 0)
+
+    def bind(self, account: Optional[SMTPAccount]) -> None:
+        """Close the current account's connection and move to another (or none)"""
+        if self.session is not None:
+            self._closed_sessions += self.session.sessions_opened
+            self.session.close()
+        self.account = account
+        self.session = account.open_session() if account is not None else None
+
+    def __enter__(self) -> "_PoolSession":
+        return self
+
+    def __exit__(self, exc_type, exc, tb) -> None:
+        self.pool.release(self)
+        self.bind(None)
+
+
+class SenderPool:
+    """
+    Assignment of engine workers to accounts for one campaign
+
+    A worker keeps its account while that account is healthy. Otherwise it
+    moves to the account with the fewest workers per unit of weight among
+    those with a free connection, preferring accounts that are not cooling
+    down after a throttling reply. Accounts that are over their daily quota,
+    refuse the login or cannot be reached are skipped; once every account
+    is, sends fail instead of waiting for one to come back.
+    """
+
+    def __init__(self, accounts: List[SMTPAccount], limiters: Optional[Dict[str, Any]] = None):
+        """
+        Args:
+            accounts: Accounts to send with
+            limiters: Rate limiter to pace each account with, by account
+                name (default: the account's own)
+        """
+        self.accounts = accounts
+        self.limiters = limiters or {account.name: account.rate_limiter for account in accounts}
+        self._lock = threading.Lock()
+        self._bound = {account.name: 0 for account in accounts}
+        self._throttled_until = {account.name: 0.0 for account in accounts}
+        self._down_until = {account.name: 0.0 for account in accounts}
+        self._exhausted = set()
+        self._disabled: Dict[str, str] = {}
+        self.counts = {account.name: {"sent": 0, "failed": 0} for account in accounts}
+
+    def open_session(self) -> _PoolSession:
+        return _PoolSession(self)
+
+    def _usable(self, account: SMTPAccount, now: float) -> bool:
+        return account.name not in self._exhausted and account.name not in self._disabled \
+            and self._down_until[account.name] <= now
+
+    def _choose(self, slot: _PoolSession, now: float) -> Optional[SMTPAccount]:
+        """Account the slot should use next; called with the lock held"""
+        current = slot.account
+        current_usable = current is not None and self._usable(current, now)
+        if current_usable and self._throttled_until[current.name] <= now:
+            return current
+
+        candidates = [
+            account for account in self.accounts
+            if account is not current and self._usable(account, now)
+            and self._bound[account.name] < account.connections
+        ]
+        calm = [account for account in candidates if self._throttled_until[account.name] <= now]
+        if calm or (candidates and not current_usable):
+            return min(calm or candidates, key=lambda account: (self._bound[account.name] + 1) / account.weight)
+        # Nothing better: a throttled account is still usable, just slower
+        return current if current_usable else None
+
+    def assign(self, slot: _PoolSession) -> Optional[SMTPAccount]:
+        """
+        Bind a worker's session to the account it should send with next
+
+        Args:
+            slot: The worker's session
+
+        Returns:
+            The account, or None if every usable account's connections are taken
+
+        Raises:
+            NoAccountAvailable: Every account is over quota, disabled or down
+        """
+        with self._lock:
+            now = time.monotonic()
+            account = self._choose(slot, now)
+            if account is slot.account:
+                if account is None:
+                    self._raise_if_all_unavailable(now)
+                return account
+            if slot.account is not None:
+                self._bound[slot.account.name] -= 1
+            if account is not None:
+                self._bound[account.name] += 1
+            else:
+                self._raise_if_all_unavailable(now)
+
+        # Connections are closed and opened outside the lock
+        slot.bind(account)
+        return account
+
+    def _raise_if_all_unavailable(self, now: float) -> None:
+        names = [account.name for account in self.accounts]
+        if any(self._usable(account, now) for account in self.accounts):
+            return
+        if len(self._disabled) == len(names):
+            reasons = "; ".join(f"{name}: {reason}" for name, reason in self._disabled.items())
+            raise NoAccountAvailable(f"No sender account can log in ({reasons})", PERMANENT)
+        if any(name not in self._exhausted and name not in self._disabled for name in names):
+            # Some are only down for now: a retry may find one back
+            raise NoAccountAvailable("No sender account can be reached", TRANSIENT)
+        raise NoAccountAvailable("Daily sending quota exhausted on every account", QUOTA)
+
+    def release(self, slot: _PoolSession) -> None:
+        """Give up a worker's account, e.g. when the worker stops"""
+        with self._lock:
+            if slot.account is not None:
+                self._bound[slot.account.name] -= 1
+
+    def prepare(self, slot: _PoolSession, count: int) -> Optional[SMTPAccount]:
+        """
+        Get a worker ready to send count recipients: an account with a
+        logged-in connection and room in its rate and quota
+
+        Returns:
+            The account to send with, or None to hand the task back
+
+        Raises:
+            NoAccountAvailable: Every account is over quota, disabled or down
+            AccountUnreachable: The account could not be connected to; it
+                is left alone for CONNECT_COOLDOWN seconds
+        """
+        account = self.assign(slot)
+        if account is None:
+            return None
+
+        if slot.session.server is None:
+            try:
+                slot.session.connect()
+            except smtplib.SMTPAuthenticationError as e:
+                self._mark(account, disabled=f"{e.smtp_code} login refused")
+                return None
+            except (smtplib.SMTPException, OSError) as e:
+                log.warning("Sender account unavailable", extra={"account": account.name, "error": str(e)})
+                self._mark(account, down=True)
+                raise AccountUnreachable(f"Sender account {account.name} unavailable: {e}") from e
+
+        if not self.limiters[account.name].acquire(count):
+            self._mark(account, exhausted=True)
+            return None
+        return account
+
+    def _mark(self, account: SMTPAccount, exhausted: bool = False, down: bool = False,
+              disabled: Optional[str] = None) -> None:
+        with self._lock:
+            if exhausted and account.name not in self._exhausted:
+                self._exhausted.add(account.name)
+                log.warning("Sender account reached its daily quota", extra={"account": account.name})
+            if down:
+                self._down_until[account.name] = time.monotonic() + CONNECT_COOLDOWN
+            if disabled is not None and account.name not in self._disabled:
+                self._disabled[account.name] = disabled
+                log.warning("Sender account disabled", extra={"account": account.name, "reason": disabled})
+
+    def remaining_today(self) -> Optional[int]:
+        """Most recipients one message can still go to today, or None if an account is unlimited"""
+        remaining = [self.limiters[account.name].remaining_today() for account in self.accounts]
+        if any(left is None for left in remaining):
+            return None
+        return max(remaining)
+
+    def observe(self, account: SMTPAccount, result: Dict[str, Any]) -> None:
+        """Feed a send result back into the account's rate limiter and health"""
+        limiter = self.limiters[account.name]
+        if result["status"] == "sent":
+            limiter.succeeded()
+        elif is_throttling(result):
+            limiter.throttled()
+            with self._lock:
+                self._throttled_until[account.name] = time.monotonic() + THROTTLE_COOLDOWN
+
+
+class PooledEmailSender(EmailSender):
+    """
+    EmailSender that spreads each campaign over several accounts or relays
+
+    Results are those of EmailSender.send_bulk_emails, with each
+    recipient's result naming the 'account' it was sent with and the
+    summary broken down per account under 'accounts'.
+    """
+
+    def __init__(self, accounts: List[SMTPAccount], workers: Optional[int] = None,
+                 max_retries: Optional[int] = None, max_recipients_per_message: Optional[int] = None):
+        """
+        Args:
+            accounts: Sender accounts, in order of preference for single sends
+            workers: Concurrent SMTP sessions over all accounts (env
+                SMTP_WORKERS, default the sum of the accounts' connections)
+            max_retries: As for EmailSender
+            max_recipients_per_message: As for EmailSender
+        """
+        if not accounts:
+            raise ValueError("A sender pool needs at least one account")
+        self.accounts = accounts
+        capacity = sum(account.connections for account in accounts)
+        self._configure_delivery(min(workers or _env_number("SMTP_WORKERS", int) or capacity, capacity),
+                                 max_retries, max_recipients_per_message)
+
+        # Single sends (send_email) use the first account
+        primary = accounts[0]
+        self.smtp_server = primary.smtp_server
+        self.smtp_port = primary.smtp_port
+        self.sender_email = primary.sender_email
+        self.sender_password = primary.password
+        self.max_messages_per_connection = primary.max_messages_per_connection
+        self.rate_limiter = primary.rate_limiter
+        # Each account's pacing, by account name
+        self.account_limiters: Dict[str, Any] = {account.name: account.rate_limiter for account in accounts}
+
+    def share_rate_limiter(self, wrap: Callable[[RateLimiter], Any]) -> None:
+        """Route every account's pacing through a wrapper, as EmailSender does for its one account"""
+        self.account_limiters = {name: wrap(limiter) for name, limiter in self.account_limiters.items()}
+        self.rate_limiter = self.account_limiters[self.accounts[0].name]
+
+    def open_session(self) -> SMTPSession:
+        """SMTP session on the first account, for single sends"""
+        return self.accounts[0].open_session()
+
+    def _deliver(self, recipients: Iterable[Dict[str, str]], subject: str, template: CompiledTemplate,
+                 assets: Sequence[Asset], campaign: _BulkCampaign, cancel_event: Optional[threading.Event]) -> int:
+        pool = SenderPool(self.accounts, self.account_limiters)
+        # The assets' encoded parts are shared by every account's builder
+        builders = {account.name: MessageBuilder(account.sender_email, subject, template, assets)
+                    for account in self.accounts}
+        shared = template.is_static and self.max_recipients_per_message > 1
+        reject = campaign.reject_batch if shared else campaign.reject
+
+        def deliver(slot: _PoolSession, task) -> Optional[Dict[str, Any]]:
+            try:
+                account = pool.prepare(slot, len(task.pending) if shared else 1)
+            except NoAccountAvailable as e:
+                # Rejections count as quota failures unless no account can log in
+                result = reject(task, str(e))
+                result["category"] = e.category
+                for recipient_result in result.get("results", ()):
+                    if recipient_result["error"] == str(e):
+                        recipient_result["category"] = e.category
+                return result
+            except AccountUnreachable as e:
+                # A failed attempt like any dropped connection, so it uses
+                # up a retry instead of waiting for the account forever
+                if shared:
+                    return self._settle_shared(task, error=e)
+                return self._settle_one(task, e)
+            if account is None:
+                return None
+            if cancel_event is not None and cancel_event.is_set():
+                # Cancelled while waiting for a turn: hand the task back untried
+                return None
+
+            builder = builders[account.name]
+            if shared:
+                result = self._send_shared(slot.session, builder, task)
+            else:
+                result = self._send_one(slot.session, builder, task)
+            pool.observe(account, result)
+            for recipient_result in result.get("results", [result]):
+                recipient_result.setdefault("account", account.name)
+            return result
+
+        def record(result: Dict[str, Any]) -> None:
+            for recipient_result in result.get("results", [result]):
+                counts = pool.counts.get(recipient_result.get("account"))
+                if counts is not None and recipient_result["status"] in counts:
+                    counts[recipient_result["status"]] += 1
+            campaign.record(result)
+
+        # Pacing is per account, inside deliver
+        engine = DeliveryEngine(pool.open_session, workers=self.workers, rate_limiter=None,
+                                retry_policy=self.retry_policy)
+        try:
+            if shared:
+                return engine.run(_batched(recipients, self.max_recipients_per_message, pool), deliver, record, reject,
+                                  cancel_event=cancel_event,
+                                  precheck=campaign.already_sent_batch if campaign.resuming else None)
+            return engine.run(recipients, deliver, record, reject, cancel_event=cancel_event,
+                              precheck=campaign.already_sent if campaign.resuming else None)
+        finally:
+            campaign.results["accounts"] = pool.counts
@@ -0,0 +1,218 @@
+"""
+Rate limits and quotas shared by every process sending from an account
+
+A RateLimiter keeps its state in memory, so each sender worker process
+would send at the full rate and spend the full daily quota on its own.
+SharedRateLimiter keeps the per-second slots, the rolling daily quota and
+the pacing of that quota over the day in SQLite next to the task queue,
+so the configured limits hold for all processes together.
+"""
+
+import os
+import sqlite3
+import threading
+import time
+from typing import Dict, Optional, Tuple
+
+from pathra_preshana.rate_limit import QUOTA_BUCKET_SECONDS, SECONDS_PER_DAY, RateLimiter
+from pathra_preshana.scheduler import QUOTA_BURST_FRACTION
+
+
+class SharedRateLimiter:
+    """
+    A process's RateLimiter, with its limits counted across processes
+
+    Each reservation takes the account's next per-second slot, counts its
+    recipients against the rolling daily quota and, with a quota, against
+    an even spread of it over the day (after a burst of
+    QUOTA_BURST_FRACTION of it), in one transaction on the shared database.
+    The process's own limiter is reserved too, so its back-off after
+    throttling replies still slows this process down.
+    """
+
+    # Reserving goes to the database; asyncio callers run it in a thread
+    blocking = True
+
+    # Spreads the daily quota itself, so FairShare does not pace it again
+    paces_quota = True
+
+    def __init__(self, inner: RateLimiter, path: Optional[str] = None):
+        """
+        Args:
+            inner: The process-wide limiter of the account (see get_rate_limiter)
+            path: Database file (env CAMPAIGN_QUEUE_PATH, default data/campaign_queue.db)
+        """
+        self.inner = inner
+        self.account = inner.key or ""
+        self.path = path or os.getenv("CAMPAIGN_QUEUE_PATH", os.path.join("data", "campaign_queue.db"))
+        directory = os.path.dirname(self.path)
+        if directory and not os.path.exists(directory):
+            os.makedirs(directory)
+
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(self.path, check_same_thread=False, isolation_level=None, timeout=30.0)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute(
+            """
+            CREATE TABLE IF NOT EXISTS send_slots (
+                account TEXT NOT NULL,
+                kind TEXT NOT NULL,
+                next_at REAL NOT NULL,
+                PRIMARY KEY (account, kind)
+            )
+            """
+        )
+        self._conn.execute(
+            """
+            CREATE TABLE IF NOT EXISTS send_quota (
+                account TEXT NOT NULL,
+                bucket REAL NOT NULL,
+                sent INTEGER NOT NULL,
+                PRIMARY KEY (account, bucket)
+            )
+            """
+        )
+
+    @property
+    def per_second(self) -> Optional[float]:
+        return self.inner.per_second
+
+    @property
+    def per_day(self) -> Optional[int]:
+        return self.inner.per_day
+
+    def acquire(self, count: int = 1) -> bool:
+        """
+        Take a slot for one message, sleeping until it comes up
+
+        Returns:
+            bool: False if the daily quota is exhausted, True otherwise
+        """
+        wait = self.reserve(count)
+        if wait is None:
+            return False
+        if wait:
+            time.sleep(wait)
+        return True
+
+    def reserve(self, count: int = 1) -> Optional[float]:
+        """
+        Take a slot for one message without sleeping
+
+        Returns:
+            Seconds the caller must wait before sending, or None if the daily
+            quota is exhausted
+        """
+        inner = self.inner
+        if not inner.per_second and not inner.per_day:
+            # Nothing to share; only the back-off after throttling applies
+            return inner.reserve(count)
+
+        # Wall-clock time, the one clock all processes agree on
+        now = time.time()
+        with self._lock:
+            self._conn.execute("BEGIN IMMEDIATE")
+            try:
+                wait = self._reserve(now, count)
+                self._conn.execute("COMMIT")
+            except Exception:
+                self._conn.execute("ROLLBACK")
+                raise
+        if wait is None:
+            return None
+        local = inner.reserve(count)
+        if local is None:
+            return None
+        return max(wait, local)
+
+    def _reserve(self, now: float, count: int) -> Optional[float]:
+        """Record a send of count recipients; called inside a transaction"""
+        per_second, per_day = self.inner.per_second, self.inner.per_day
+        if per_day:
+            if self._sent_today(now) + count > per_day:
+                return None
+            bucket = now - now % QUOTA_BUCKET_SECONDS
+            updated = self._conn.execute(
+                "UPDATE send_quota SET sent = sent + ? WHERE account = ? AND bucket = ?",
+                (count, self.account, bucket)
+            ).rowcount
+            if not updated:
+                # A new bucket: drop the ones that left the window meanwhile
+                self._conn.execute(
+                    "DELETE FROM send_quota WHERE account = ? AND bucket <= ?",
+                    (self.account, now - SECONDS_PER_DAY - QUOTA_BUCKET_SECONDS)
+                )
+                self._conn.execute(
+                    "INSERT INTO send_quota (account, bucket, sent) VALUES (?, ?, ?)",
+                    (self.account, bucket, count)
+                )
+
+        wait = 0.0
+        if per_second:
+            wait = self._slot(now, "rate", 1 / per_second, 1, self.inner.burst)
+        if per_day:
+            burst = max(1.0, per_day * QUOTA_BURST_FRACTION)
+            wait = max(wait, self._slot(now, "pace", SECONDS_PER_DAY / per_day, count, burst))
+        return wait
+
+    def _slot(self, now: float, kind: str, interval: float, cost: int, burst: float) -> float:
+        """
+        Token bucket kept as the time its next token is due: cost tokens
+        take cost intervals, and up to burst of them may be taken early
+        """
+        row = self._conn.execute(
+            "SELECT next_at FROM send_slots WHERE account = ? AND kind = ?", (self.account, kind)
+        ).fetchone()
+        next_at = max(row[0] if row else now, now) + cost * interval
+        self._conn.execute(
+            "INSERT OR REPLACE INTO send_slots (account, kind, next_at) VALUES (?, ?, ?)",
+            (self.account, kind, next_at)
+        )
+        return max(0.0, next_at - now - burst * interval)
+
+    def _sent_today(self, now: float) -> int:
+        row = self._conn.execute(
+            "SELECT COALESCE(SUM(sent), 0) FROM send_quota WHERE account = ? AND bucket > ?",
+            (self.account, now - SECONDS_PER_DAY - QUOTA_BUCKET_SECONDS)
+        ).fetchone()
+        return row[0]
+
+    def succeeded(self) -> None:
+        self.inner.succeeded()
+
+    def throttled(self) -> None:
+        self.inner.throttled()
+
+    def remaining_today(self) -> Optional[int]:
+        """Messages left in the rolling 24 hours of every process together, or None when unlimited"""
+        if not self.inner.per_day:
+            return None
+        with self._lock:
+            return max(0, self.inner.per_day - self._sent_today(time.time()))
+
+    def close(self) -> None:
+        with self._lock:
+            self._conn.close()
+
+
+_shared: Dict[Tuple[str, int], SharedRateLimiter] = {}
+_shared_lock = threading.Lock()
+
+
+def get_shared_rate_limiter(inner: RateLimiter, path: Optional[str] = None) -> SharedRateLimiter:
+    """
+    Get the process-wide shared limiter wrapping an account's limiter
+
+    Args:
+        inner: The account's limiter, from get_rate_limiter
+        path: Database file (env CAMPAIGN_QUEUE_PATH, default data/campaign_queue.db)
+
+    Returns:
+        SharedRateLimiter, one per account and database
+    """
+    path = path or os.getenv("CAMPAIGN_QUEUE_PATH", os.path.join("data", "campaign_queue.db"))
+    with _shared_lock:
+        key = (path, id(inner))
+        if key not in _shared:
+            _shared[key] = SharedRateLimiter(inner, path)
+        return _shared[key]
@@ -0,0 +1,170 @@
+"""
+Reusable SMTP session management for bulk email sending
+"""
+
+import smtplib
+from typing import Callable, Optional
+
+from pathra_preshana import metrics
+
+
+def smtp_error_code(error: Exception) -> str:
+    """
+    SMTP reply code behind a send failure, for metrics and reports
+
+    Returns:
+        The reply code as a string, 'disconnect' for dropped connections,
+        or 'error' for failures without a reply (DNS, TLS, timeouts)
+    """
+    if isinstance(error, smtplib.SMTPRecipientsRefused):
+        codes = [str(code) for code, _ in error.recipients.values()]
+        return codes[0] if codes else "error"
+    if isinstance(error, smtplib.SMTPResponseException):
+        return str(error.smtp_code)
+    if isinstance(error, smtplib.SMTPServerDisconnected):
+        return "disconnect"
+    return "error"
+
+
+class _SMTP(smtplib.SMTP):
+    """smtplib.SMTP noting whether the current transaction got as far as DATA"""
+
+    data_started = False
+
+    def data(self, msg):
+        self.data_started = True
+        return super().data(msg)
+
+
+class SMTPSession:
+    """Long-lived, logged-in SMTP connection reused across many messages"""
+
+    def __init__(
+        self,
+        smtp_server: str,
+        smtp_port: int,
+        username: str,
+        password: str,
+        max_messages_per_connection: int = 100,
+        timeout: float = 60.0,
+    ):
+        """
+        Args:
+            smtp_server: SMTP server hostname
+            smtp_port: SMTP server port (STARTTLS)
+            username: Login user name
+            password: Login password
+            max_messages_per_connection: Messages sent before the connection
+                is recycled; servers commonly cap this per connection
+            timeout: Socket timeout in seconds
+        """
+        self.smtp_server = smtp_server
+        self.smtp_port = smtp_port
+        self.username = username
+        self.password = password
+        self.max_messages_per_connection = max(1, max_messages_per_connection)
+        self.timeout = timeout
+
+        self.server: Optional[smtplib.SMTP] = None
+        self.messages_on_connection = 0
+        self.sessions_opened = 0
+
+    def __enter__(self) -> "SMTPSession":
+        return self
+
+    def __exit__(self, exc_type, exc, tb) -> None:
+        self.close()
+
+    def connect(self) -> None:
+        """Open a new connection, run STARTTLS and log in"""
+        self.close()
+
+        phases = metrics.smtp_phase_seconds
+        with phases.time("connect"):
+            server = _SMTP(self.smtp_server, self.smtp_port, timeout=self.timeout)
+        try:
+            with phases.time("starttls"):
+                server.starttls()
+            with phases.time("login"):
+                server.login(self.username, self.password)
+        except Exception:
+            server.close()
+            raise
+
+        self.server = server
+        self.messages_on_connection = 0
+        self.sessions_opened += 1
+        metrics.sessions_opened.inc()
+
+    def close(self) -> None:
+        """Politely end the current connection, if any"""
+        if self.server is None:
+            return
+
+        try:
+            self.server.quit()
+        except (smtplib.SMTPException, OSError):
+            self.server.close()
+        finally:
+            self.server = None
+
+    def send_message(self, message) -> dict:
+        """
+        Send an email.message.Message over the shared connection
+
+        Returns:
+            Dictionary of refused recipients, as returned by smtplib
+        """
+        return self._send(lambda server: server.send_message(message))
+
+    def sendmail(self, from_addr: str, to_addrs, msg) -> dict:
+        """
+        Send a pre-serialized message over the shared connection
+
+        Returns:
+            Dictionary of refused recipients, as returned by smtplib
+        """
+        return self._send(lambda server: server.sendmail(from_addr, to_addrs, msg))
+
+    def _ensure_ready(self) -> None:
+        """Make sure a logged-in connection with a clean transaction is available"""
+        if self.server is None or self.messages_on_connection >= self.max_messages_per_connection:
+            self.connect()
+            return
+
+        if self.messages_on_connection:
+            # RSET is a cheap liveness check that also clears any leftover
+            # transaction state from the previous message
+            try:
+                with metrics.smtp_phase_seconds.time("rset"):
+                    code, _ = self.server.rset()
+            except (smtplib.SMTPServerDisconnected, OSError):
+                code = -1
+
+            if code != 250:
+                self.connect()
+
+    def _send(self, send: Callable[[smtplib.SMTP], dict]) -> dict:
+        self._ensure_ready()
+        self.server.data_started = False
+
+        try:
+            try:
+                with metrics.smtp_phase_seconds.time("data"):
+                    return send(self.server)
+            except smtplib.SMTPServerDisconnected:
+                if self.server.data_started:
+                    # The server may have accepted the message before hanging
+                    # up; sending it again could deliver it twice, so leave
+                    # the retry to the caller's journal and retry queue
+                    self.close()
+                    raise
+                # The server dropped the connection before the message (idle
+                # timeout or its own per-connection cap): reconnect once and retry
+                self.connect()
+                with metrics.smtp_phase_seconds.time("data"):
+                    return send(self.server)
+        finally:
+            # Failed attempts count too, so the next message always starts
+            # with an RSET on a used connection
+            self.messages_on_connection += 1
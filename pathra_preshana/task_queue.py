@@ -0,0 +1,228 @@
+"""
+Durable queue of delivery tasks shared by the web app and sender workers
+
+A campaign is split into chunks of its recipient list, stored as tasks in
+SQLite next to the campaign queue. Workers lease tasks with a visibility
+timeout and renew the lease while sending; a task whose worker stops
+renewing is leased again by another worker, resuming from the send journal.
+"""
+
+import json
+import os
+import sqlite3
+import threading
+import time
+from typing import Any, Dict, List, Optional
+
+from pathra_preshana.scheduler import PRIORITY_WEIGHTS
+
+# Leases a task may take before it is failed instead of leased again
+MAX_TASK_ATTEMPTS = 5
+
+_UNFINISHED = ("queued", "leased")
+
+_PRIORITY_NAMES = {weight: name for name, weight in PRIORITY_WEIGHTS.items()}
+
+
+class Task:
+    """One chunk of a campaign as leased by a worker"""
+
+    __slots__ = ("task_id", "job_id", "spec", "attempts", "owner", "priority")
+
+    def __init__(self, task_id: int, job_id: str, spec: Dict[str, Any], attempts: int,
+                 owner: Optional[str] = None, priority: str = "normal"):
+        self.task_id = task_id
+        self.job_id = job_id
+        self.spec = spec
+        self.attempts = attempts
+        self.owner = owner
+        self.priority = priority
+
+
+class TaskQueue:
+    """SQLite table of delivery tasks, safe to share between processes"""
+
+    def __init__(self, path: Optional[str] = None):
+        """
+        Args:
+            path: Database file (env CAMPAIGN_QUEUE_PATH, default data/campaign_queue.db)
+        """
+        self.path = path or os.getenv("CAMPAIGN_QUEUE_PATH", os.path.join("data", "campaign_queue.db"))
+        directory = os.path.dirname(self.path)
+        if directory and not os.path.exists(directory):
+            os.makedirs(directory)
+
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(self.path, check_same_thread=False, isolation_level=None, timeout=30.0)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute(
+            """
+            CREATE TABLE IF NOT EXISTS tasks (
+                task_id INTEGER PRIMARY KEY,
+                job_id TEXT NOT NULL,
+                owner TEXT,
+                weight INTEGER NOT NULL,
+                spec TEXT NOT NULL,
+                status TEXT NOT NULL,
+                worker TEXT,
+                lease_expires REAL,
+                attempts INTEGER NOT NULL DEFAULT 0,
+                progress TEXT,
+                results TEXT,
+                error TEXT,
+                cancelled INTEGER NOT NULL DEFAULT 0,
+                updated_at REAL NOT NULL
+            )
+            """
+        )
+        self._conn.execute("CREATE INDEX IF NOT EXISTS tasks_job ON tasks (job_id)")
+        self._conn.execute("CREATE INDEX IF NOT EXISTS tasks_status ON tasks (status, owner)")
+
+    # Web side
+
+    def put(self, job_id: str, owner: Optional[str], priority: str, specs: List[Dict[str, Any]]) -> None:
+        """Replace the tasks of a job with new ones, one per spec"""
+        now = time.time()
+        weight = PRIORITY_WEIGHTS.get(priority, PRIORITY_WEIGHTS["normal"])
+        with self._lock:
+            self._conn.execute("BEGIN IMMEDIATE")
+            try:
+                self._conn.execute("DELETE FROM tasks WHERE job_id = ?", (job_id,))
+                self._conn.executemany(
+                    "INSERT INTO tasks (job_id, owner, weight, spec, status, updated_at) "
+                    "VALUES (?, ?, ?, ?, 'queued', ?)",
+                    [(job_id, owner, weight, json.dumps(spec), now) for spec in specs]
+                )
+                self._conn.execute("COMMIT")
+            except Exception:
+                self._conn.execute("ROLLBACK")
+                raise
+
+    def has_unfinished(self, job_id: str) -> bool:
+        with self._lock:
+            row = self._conn.execute(
+                "SELECT 1 FROM tasks WHERE job_id = ? AND status IN (?, ?) LIMIT 1", (job_id, *_UNFINISHED)
+            ).fetchone()
+        return row is not None
+
+    def job_tasks(self, job_id: str) -> List[Dict[str, Any]]:
+        """Status, live progress and results of every task of a job"""
+        with self._lock:
+            rows = self._conn.execute(
+                "SELECT status, progress, results, error FROM tasks WHERE job_id = ? ORDER BY task_id", (job_id,)
+            ).fetchall()
+        return [
+            {"status": status, "progress": json.loads(progress) if progress else None,
+             "results": json.loads(results) if results else None, "error": error}
+            for status, progress, results, error in rows
+        ]
+
+    def cancel(self, job_id: str) -> None:
+        """Drop a job's queued tasks and ask workers to stop its leased ones"""
+        now = time.time()
+        with self._lock:
+            self._conn.execute(
+                "UPDATE tasks SET status = 'cancelled', updated_at = ? WHERE job_id = ? AND status = 'queued'",
+                (now, job_id)
+            )
+            self._conn.execute(
+                "UPDATE tasks SET cancelled = 1, updated_at = ? WHERE job_id = ? AND status = 'leased'",
+                (now, job_id)
+            )
+
+    # Worker side
+
+    def lease(self, worker: str, visibility_timeout: float) -> Optional[Task]:
+        """
+        Lease the next task
+
+        Tasks of the user with the fewest tasks in flight go first, so
+        workers are shared fairly, then higher priority, then older tasks.
+        Expired leases are taken over; a task leased MAX_TASK_ATTEMPTS times
+        is failed instead.
+
+        Returns:
+            Task, or None if there is nothing to do
+        """
+        now = time.time()
+        with self._lock:
+            self._conn.execute("BEGIN IMMEDIATE")
+            try:
+                self._conn.execute(
+                    "UPDATE tasks SET status = 'failed', error = 'Worker lost the task too many times', "
+                    "updated_at = ? WHERE status = 'leased' AND lease_expires < ? AND attempts >= ?",
+                    (now, now, MAX_TASK_ATTEMPTS)
+                )
+                while True:
+                    row = self._conn.execute(
+                        """
+                        SELECT task_id, job_id, spec, attempts, cancelled, owner, weight FROM tasks AS t
+                        WHERE status = 'queued' OR (status = 'leased' AND lease_expires < :now)
+                        ORDER BY
+                            (SELECT COUNT(*) FROM tasks AS busy WHERE busy.status = 'leased'
+                             AND busy.lease_expires >= :now AND busy.owner IS t.owner),
+                            weight DESC, task_id
+                        LIMIT 1
+                        """,
+                        {"now": now}
+                    ).fetchone()
+                    if row is None:
+                        self._conn.execute("COMMIT")
+                        return None
+                    task_id, job_id, spec, attempts, cancelled, owner, weight = row
+                    if not cancelled:
+                        break
+                    # Its worker died after the job was cancelled
+                    self._conn.execute(
+                        "UPDATE tasks SET status = 'cancelled', updated_at = ? WHERE task_id = ?", (now, task_id)
+                    )
+                self._conn.execute(
+                    "UPDATE tasks SET status = 'leased', worker = ?, lease_expires = ?, attempts = attempts + 1, "
+                    "updated_at = ? WHERE task_id = ?",
+                    (worker, now + visibility_timeout, now, task_id)
+                )
+                self._conn.execute("COMMIT")
+            except Exception:
+                self._conn.execute("ROLLBACK")
+                raise
+        return Task(task_id, job_id, json.loads(spec), attempts + 1, owner,
+                    _PRIORITY_NAMES.get(weight, "normal"))
+
+    def renew(self, task: Task, worker: str, visibility_timeout: float,
+              progress: Optional[Dict[str, Any]] = None) -> bool:
+        """
+        Extend a lease and report progress
+
+        Returns:
+            bool: False if the worker should stop: the job was cancelled or
+            the task was taken over after the lease expired
+        """
+        now = time.time()
+        with self._lock:
+            updated = self._conn.execute(
+                "UPDATE tasks SET lease_expires = ?, progress = ?, updated_at = ? "
+                "WHERE task_id = ? AND worker = ? AND status = 'leased' AND cancelled = 0",
+                (now + visibility_timeout, json.dumps(progress) if progress is not None else None, now,
+                 task.task_id, worker)
+            ).rowcount
+        return updated == 1
+
+    def finish(self, task: Task, worker: str, status: str, progress: Optional[Dict[str, Any]] = None,
+               results: Optional[Dict] = None, error: Optional[str] = None) -> None:
+        """
+        Settle a leased task as 'done', 'failed' or 'cancelled', or return
+        it to the queue ('queued') for another worker
+        """
+        with self._lock:
+            self._conn.execute(
+                "UPDATE tasks SET status = CASE WHEN ? = 'queued' AND cancelled = 1 THEN 'cancelled' ELSE ? END, "
+                "worker = NULL, lease_expires = NULL, progress = ?, results = ?, error = ?, updated_at = ? "
+                "WHERE task_id = ? AND worker = ? AND status = 'leased'",
+                (status, status, json.dumps(progress) if progress is not None else None,
+                 json.dumps(results) if results is not None else None, error, time.time(),
+                 task.task_id, worker)
+            )
+
+    def close(self) -> None:
+        with self._lock:
+            self._conn.close()
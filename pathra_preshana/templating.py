@@ -0,0 +1,124 @@
+"""
+Precompiled email templates with {column} placeholders
+"""
+
+import html
+import re
+from typing import Dict, Iterable, List, Tuple
+
+# Only identifier-like names count as placeholders, so CSS blocks such as
+# "body { margin: 0; }" are left untouched
+PLACEHOLDER_PATTERN = re.compile(r"\{([A-Za-z_][A-Za-z0-9_]*)\}")
+
+
+class CompiledTemplate:
+    """
+    Template split once into static segments and field slots
+
+    Rendering fills the slots from a recipient row and joins the pieces,
+    instead of scanning the whole template once per placeholder.
+    """
+
+    def __init__(self, template: str, escape: bool = False):
+        """
+        Args:
+            template: Template text with {column} placeholders
+            escape: HTML-escape substituted values
+        """
+        self.source = template
+        self.escape = escape
+
+        parts: List[str] = []
+        slots: List[Tuple[int, str]] = []
+        position = 0
+        for match in PLACEHOLDER_PATTERN.finditer(template):
+            parts.append(template[position:match.start()])
+            slots.append((len(parts), match.group(1)))
+            parts.append("")
+            position = match.end()
+        parts.append(template[position:])
+
+        self._parts = parts
+        self._slots = slots
+        self.fields = list(dict.fromkeys(field for _, field in slots))
+
+    @classmethod
+    def literal(cls, text: str) -> "CompiledTemplate":
+        """Wrap already-rendered text as a template without any placeholders"""
+        template = cls("")
+        template.source = text
+        template._parts = [text]
+        return template
+
+    @property
+    def is_static(self) -> bool:
+        """True when the template has no placeholders"""
+        return not self._slots
+
+    @property
+    def segments(self) -> List[str]:
+        """Static text between placeholders; one more than the slot count"""
+        return self._parts[0::2]
+
+    @property
+    def slot_fields(self) -> List[str]:
+        """Field name of every slot, in template order"""
+        return [field for _, field in self._slots]
+
+    def validate(self, available_fields: Iterable[str]) -> None:
+        """
+        Fail fast if the template uses fields the recipient data lacks
+
+        Args:
+            available_fields: Column names available for every recipient
+
+        Raises:
+            ValueError: If any placeholder has no matching field
+        """
+        available = set(available_fields)
+        unknown = [field for field in self.fields if field not in available]
+        if unknown:
+            names = ", ".join("{" + field + "}" for field in unknown)
+            raise ValueError(f"Template uses unknown field(s) {names}; available: {', '.join(sorted(available))}")
+
+    def render_values(self, values: Dict[str, str]) -> List[str]:
+        """
+        Substitution values for each slot, escaped if configured
+
+        Raises:
+            ValueError: If a field is missing from values
+        """
+        try:
+            if self.escape:
+                return [html.escape(values[field] or "") for _, field in self._slots]
+            return [values[field] or "" for _, field in self._slots]
+        except KeyError as e:
+            raise ValueError(f"Recipient data has no value for template field {{{e.args[0]}}}")
+
+    def render(self, values: Dict[str, str]) -> str:
+        """
+        Render the template for one recipient
+
+        Args:
+            values: Recipient row, e.g. {'name': ..., 'email': ..., 'company': ...}
+
+        Returns:
+            Personalized text
+
+        Raises:
+            ValueError: If a placeholder's field is missing from values
+        """
+        if not self._slots:
+            return self.source
+
+        parts = self._parts.copy()
+        for (index, _), value in zip(self._slots, self.render_values(values)):
+            parts[index] = value
+        return "".join(parts)
+
+
+def compile_template(template, escape: bool = False) -> CompiledTemplate:
+    """Compile a template string, passing already-compiled templates through"""
+    if isinstance(template, CompiledTemplate):
+        return template
+    return CompiledTemplate(template, escape=escape)
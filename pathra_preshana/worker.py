@@ -0,0 +1,213 @@
+"""
+Sender worker: delivers campaign tasks from the shared task queue
+
+Run with the web app's CAMPAIGN_DELIVERY=worker. Web processes then only
+queue campaigns; any number of workers, started as
+
+    python -m pathra_preshana.worker --processes 4
+
+lease their recipient chunks, send them and report progress and results
+back through the queue. A task whose worker dies is leased again once its
+visibility timeout passes and resumes from the send journal.
+
+Each process sends several tasks at once, taking fair turns at the account
+like campaigns in the web process, and every process counts its sends in
+the rate limits and quota kept in the queue database, so the configured
+limits hold for all workers together.
+"""
+
+import argparse
+import multiprocessing
+import os
+import signal
+import socket
+import sys
+import threading
+import time
+from typing import Any, Dict, Optional
+
+from dotenv import load_dotenv
+
+from pathra_preshana.campaigns import get_task_queue, run_campaign
+from pathra_preshana.jobs import CampaignJob
+from pathra_preshana.log import get_logger, shutdown_logging
+from pathra_preshana.rate_limit import RateLimiter
+from pathra_preshana.scheduler import FairShare
+from pathra_preshana.shared_rate_limit import get_shared_rate_limiter
+from pathra_preshana.task_queue import Task, TaskQueue
+
+# Seconds between checks for shutdown while a task is sending
+HEARTBEAT_INTERVAL = 1.0
+
+log = get_logger(__name__)
+
+
+def job_counts(job: CampaignJob) -> Dict:
+    """Progress of a task's job as reported to the web app"""
+    progress = job.progress()
+    return {
+        "sent": progress["sent"],
+        "failed": progress["failed"],
+        "skipped": progress["skipped"],
+        "failures": progress["failures"],
+        "rejected": progress["rejected"],
+    }
+
+
+def run_task(queue: TaskQueue, task: Task, worker_id: str, visibility_timeout: float,
+             stop: threading.Event, share: Optional[FairShare] = None) -> None:
+    """
+    Send one leased task, renewing its lease until it settles
+
+    Args:
+        queue: Task queue the task was leased from
+        task: Leased task
+        worker_id: Identity the task was leased under
+        visibility_timeout: Seconds a lease lasts without renewal
+        stop: Set on shutdown; the task is then returned to the queue
+        share: Fair share of the accounts between this process's tasks
+    """
+    key = f"task-{task.task_id}"
+    if share is None:
+        share = FairShare()
+    share.join(key, task.owner, task.priority)
+    try:
+        _run_task(queue, task, worker_id, visibility_timeout, stop, share, key)
+    finally:
+        share.leave(key)
+
+
+def _run_task(queue: TaskQueue, task: Task, worker_id: str, visibility_timeout: float,
+              stop: threading.Event, share: FairShare, key: str) -> None:
+    spec = dict(task.spec)
+    if task.attempts > 1:
+        # Another worker may have sent part of it already
+        spec["resume"] = True
+    job = CampaignJob(total=spec["limit"] or 0, campaign_id=spec["campaign_id"], job_id=task.job_id)
+    lost = threading.Event()
+    done = threading.Event()
+
+    def heartbeat():
+        renew_at = time.monotonic() + visibility_timeout / 3
+        while not done.wait(HEARTBEAT_INTERVAL):
+            if not stop.is_set():
+                if time.monotonic() < renew_at:
+                    continue
+                renew_at = time.monotonic() + visibility_timeout / 3
+                if queue.renew(task, worker_id, visibility_timeout, job_counts(job)):
+                    continue
+            # Shutting down, cancelled, or the lease was taken over
+            lost.set()
+            job.cancel_event.set()
+            return
+
+    def share_limiter(inner: RateLimiter) -> Any:
+        # Limits counted across worker processes, turns shared within this one
+        return share.limiter(key, get_shared_rate_limiter(inner), job.cancel_event)
+
+    renewer = threading.Thread(target=heartbeat, name="lease-renewer", daemon=True)
+    renewer.start()
+    try:
+        results = run_campaign(spec, job, share_limiter=share_limiter, report_part=f"task-{task.task_id}")
+    except Exception as e:
+        log.error("Task failed", extra={"task_id": task.task_id, "job_id": task.job_id, "error": str(e)})
+        done.set()
+        queue.finish(task, worker_id, "failed", job_counts(job), error=str(e))
+        return
+    done.set()
+    renewer.join()
+
+    if not lost.is_set():
+        queue.finish(task, worker_id, "done", job_counts(job), results)
+        log.info("Task done", extra={"task_id": task.task_id, "job_id": task.job_id,
+                                     "sent": results.get("success", 0), "failed": results.get("failed", 0)})
+    elif stop.is_set():
+        # Back to the queue for another worker; it resumes from the journal
+        queue.finish(task, worker_id, "queued", job_counts(job))
+        log.info("Task returned to the queue", extra={"task_id": task.task_id, "job_id": task.job_id})
+    else:
+        queue.finish(task, worker_id, "cancelled", job_counts(job), results)
+        log.info("Task stopped", extra={"task_id": task.task_id, "job_id": task.job_id})
+
+
+def work(visibility_timeout: float, poll_interval: float, tasks: int = 1) -> None:
+    """Lease and send up to tasks tasks at once until SIGTERM or SIGINT"""
+    load_dotenv()
+    stop = threading.Event()
+    for signum in (signal.SIGTERM, signal.SIGINT):
+        signal.signal(signum, lambda *_: stop.set())
+
+    worker_id = f"{socket.gethostname()}:{os.getpid()}"
+    queue = get_task_queue()
+    share = FairShare()
+    slots = threading.Semaphore(max(1, tasks))
+    running = []
+
+    def run(task: Task) -> None:
+        try:
+            run_task(queue, task, worker_id, visibility_timeout, stop, share)
+        finally:
+            slots.release()
+
+    log.info("Sender worker waiting for tasks", extra={"worker": worker_id, "queue": queue.path})
+    while not stop.is_set():
+        if not slots.acquire(timeout=poll_interval):
+            continue
+        task = queue.lease(worker_id, visibility_timeout)
+        if task is None:
+            slots.release()
+            stop.wait(poll_interval)
+            continue
+        thread = threading.Thread(target=run, args=(task,), name=f"task-{task.task_id}")
+        thread.start()
+        running = [thread for thread in running if thread.is_alive()] + [thread]
+    for thread in running:
+        # Stopping tasks hand themselves back to the queue
+        thread.join()
+    log.info("Sender worker stopped", extra={"worker": worker_id})
+    # Worker processes exit without running atexit handlers
+    shutdown_logging()
+
+
+def main():
+    load_dotenv()
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--processes", type=int, default=int(os.getenv("SENDER_WORKER_PROCESSES", "1")),
+                        help="worker processes to run (env SENDER_WORKER_PROCESSES, default 1)")
+    parser.add_argument("--visibility-timeout", type=float,
+                        default=float(os.getenv("TASK_VISIBILITY_TIMEOUT", "60")),
+                        help="seconds before a task of an unresponsive worker is leased again "
+                             "(env TASK_VISIBILITY_TIMEOUT, default 60)")
+    parser.add_argument("--tasks", type=int, default=int(os.getenv("SENDER_WORKER_TASKS", "4")),
+                        help="tasks each process sends at once, taking fair turns "
+                             "(env SENDER_WORKER_TASKS, default 4)")
+    parser.add_argument("--poll-interval", type=float, default=1.0,
+                        help="seconds between checks of an empty queue")
+    args = parser.parse_args()
+
+    if args.processes <= 1:
+        work(args.visibility_timeout, args.poll_interval, args.tasks)
+        return 0
+
+    processes = [
+        multiprocessing.Process(target=work, args=(args.visibility_timeout, args.poll_interval, args.tasks),
+                                name=f"sender-worker-{index}")
+        for index in range(args.processes)
+    ]
+    for process in processes:
+        process.start()
+
+    def forward(signum, frame):
+        for process in processes:
+            if process.is_alive():
+                os.kill(process.pid, signal.SIGTERM)
+
+    signal.signal(signal.SIGTERM, forward)
+    signal.signal(signal.SIGINT, forward)
+    for process in processes:
+        process.join()
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
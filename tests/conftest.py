@@ -0,0 +1,40 @@
+import uuid
+
+import pytest
+
+from benchmarks.smtp_sink import SMTPSink
+
+
+@pytest.fixture
+def smtp_sink():
+    """Local SMTP server keeping every message it accepts"""
+    with SMTPSink(keep_messages=True) as sink:
+        yield sink
+
+
+@pytest.fixture
+def sender_env(monkeypatch):
+    """Credentials of a fresh sending account, so no rate limiter is shared between tests"""
+    monkeypatch.setenv("GMAIL_USER", f"sender-{uuid.uuid4().hex[:8]}@example.com")
+    monkeypatch.setenv("GMAIL_APP_PASSWORD", "secret")
+    monkeypatch.setenv("SMTP_RETRY_BASE_DELAY", "0.01")
+    monkeypatch.setenv("SMTP_RETRY_MAX_DELAY", "0.05")
+    for name in ("SMTP_ACCOUNTS_FILE", "EMAIL_BACKEND", "SMTP_RATE_PER_SECOND", "SMTP_RATE_PER_DAY", "SMTP_WORKERS"):
+        monkeypatch.delenv(name, raising=False)
+
+
+@pytest.fixture
+def campaign_env(tmp_path, monkeypatch, smtp_sink, sender_env):
+    """Campaigns send to the local sink, with their own journal, task queue and reports"""
+    from pathra_preshana import campaigns, delivery_report
+    from pathra_preshana.email_sender import EmailSender
+    from pathra_preshana.journal import SendJournal
+    from pathra_preshana.task_queue import TaskQueue
+
+    monkeypatch.setattr(campaigns, "create_email_sender", lambda: EmailSender("127.0.0.1", smtp_sink.port))
+    monkeypatch.setattr(campaigns, "_send_journal", SendJournal(str(tmp_path / "journal.db")))
+    monkeypatch.setattr(campaigns, "_task_queue", TaskQueue(str(tmp_path / "queue.db")))
+    monkeypatch.setattr(delivery_report, "REPORTS_DIR", str(tmp_path / "reports"))
+    yield smtp_sink
+    campaigns._send_journal.close()
+    campaigns._task_queue.close()
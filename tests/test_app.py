@@ -0,0 +1,141 @@
+import pytest
+
+from pathra_preshana import app as app_module
+from pathra_preshana.catalog import FileCatalog, describe_template
+
+
+@pytest.fixture
+def client(monkeypatch, sender_env):
+    # Nothing is queued in these tests; keep the scheduler from opening its database
+    monkeypatch.setattr(app_module.campaign_scheduler, "start", lambda: None)
+    app_module.app.config["TESTING"] = True
+    with app_module.app.test_client() as client:
+        with client.session_transaction() as session:
+            session["user_email"] = "owner@example.com"
+        yield client
+
+
+@pytest.fixture
+def campaign_files(tmp_path):
+    template = tmp_path / "template.html"
+    template.write_text("<p>Hello {name}</p>", encoding="utf-8")
+    recipients = tmp_path / "recipients.csv"
+    recipients.write_text("name,email\nAnn,ann@example.com\n,\n", encoding="utf-8")
+    return {"template_path": str(template), "recipients_path": str(recipients), "subject": "Hi"}
+
+
+@pytest.mark.parametrize("schedule", [{"window": 900}, {"window": "9am-5pm"}, {"priority": "urgent"},
+                                      {"priority": ["high"]}])
+def test_send_rejects_invalid_schedule(client, campaign_files, schedule):
+    response = client.post("/api/send", json=dict(campaign_files, **schedule))
+
+    assert response.status_code == 400
+    assert "error" in response.get_json()
+
+
+def test_listing_is_revalidated_with_its_etag(client, tmp_path, monkeypatch):
+    (tmp_path / "welcome.html").write_text("<p>Hello {name}</p>", encoding="utf-8")
+    monkeypatch.setattr(app_module, "template_catalog", FileCatalog(str(tmp_path), ".html", describe_template))
+
+    response = client.get("/api/templates")
+    assert response.status_code == 200
+    assert response.get_json()["templates"] == ["welcome.html"]
+    etag = response.headers["ETag"]
+
+    response = client.get("/api/templates", headers={"If-None-Match": etag})
+    assert response.status_code == 304
+    assert response.headers["ETag"] == etag
+
+    (tmp_path / "other.html").write_text("<p>Hi</p>", encoding="utf-8")
+    response = client.get("/api/templates", headers={"If-None-Match": etag})
+    assert response.status_code == 200
+    assert response.get_json()["templates"] == ["other.html", "welcome.html"]
+
+
+def test_campaign_ids_are_scoped_to_their_owner(client, campaign_files, monkeypatch):
+    submitted = []
+    monkeypatch.setattr(app_module.campaign_scheduler, "submit",
+                        lambda spec, **kwargs: submitted.append(spec) or app_module.campaign_jobs.create(1))
+
+    def send(user, **extra):
+        with client.session_transaction() as session:
+            session["user_email"] = user
+        response = client.post("/api/send", json=dict(campaign_files, **extra))
+        assert response.status_code == 202
+        return response.get_json()["campaign_id"]
+
+    ann = send("ann@example.com", campaign_id="spring")
+    bob = send("bob@example.com", campaign_id="spring")
+    assert ann != bob
+    assert ann.endswith("spring")
+    # An id handed out earlier resumes the same campaign
+    assert send("ann@example.com", campaign_id=ann) == ann
+    # Passing another user's id does not share their journal
+    assert send("bob@example.com", campaign_id=ann) not in (ann, bob)
+
+    assert send("ann@example.com") != send("bob@example.com")
+    assert [spec["campaign_id"] for spec in submitted][:3] == [ann, bob, ann]
+
+
+@pytest.fixture
+def recipients_csv(tmp_path):
+    path = tmp_path / "recipients.csv"
+    rows = [f"User {i},u{i}@example.com,{'Pune' if i % 2 else 'Goa'}" for i in range(7)]
+    path.write_text("name,email,city\n" + "\n".join(rows) + "\n", encoding="utf-8")
+    return str(path)
+
+
+def test_recipients_are_paged(client, recipients_csv):
+    pages, offset = [], 0
+    while offset is not None:
+        body = client.post("/api/recipients-data", json={"csv_path": recipients_csv, "offset": offset,
+                                                          "limit": 3}).get_json()
+        pages.append([recipient["email"] for recipient in body["recipients"]])
+        offset = body["next_offset"]
+
+    assert pages == [["u0@example.com", "u1@example.com", "u2@example.com"],
+                     ["u3@example.com", "u4@example.com", "u5@example.com"],
+                     ["u6@example.com"]]
+
+
+def test_recipient_page_of_a_segment_with_its_count(client, recipients_csv):
+    body = client.post("/api/recipients-data", json={"csv_path": recipients_csv, "where": {"city": "Pune"},
+                                                      "offset": 1, "limit": 2, "include_count": True}).get_json()
+
+    assert [recipient["email"] for recipient in body["recipients"]] == ["u3@example.com", "u5@example.com"]
+    assert body["next_offset"] is None
+    assert body["count"] == 3
+
+
+def test_recipient_count_only(client, recipients_csv):
+    response = client.post("/api/recipients-data", json={"csv_path": recipients_csv, "count_only": True})
+    assert response.get_json() == {"count": 7}
+
+    response = client.post("/api/recipients-data", json={"csv_path": recipients_csv, "count_only": True,
+                                                          "where": {"city": "Goa"}})
+    assert response.get_json() == {"count": 4}
+
+
+@pytest.mark.parametrize("segment", [{"offset": "first"}, {"limit": [3]}, {"where": ["city"]}])
+def test_recipients_reject_invalid_segments(client, recipients_csv, segment):
+    response = client.post("/api/recipients-data", json=dict(segment, csv_path=recipients_csv))
+
+    assert response.status_code == 400
+
+
+def test_metrics_are_served_in_prometheus_format(client, monkeypatch):
+    monkeypatch.delenv("METRICS_TOKEN", raising=False)
+
+    response = client.get("/metrics")
+
+    assert response.status_code == 200
+    assert response.mimetype == "text/plain"
+    assert "# TYPE pathra_messages_sent_total counter" in response.get_data(as_text=True)
+
+
+def test_metrics_require_the_token_when_set(client, monkeypatch):
+    monkeypatch.setenv("METRICS_TOKEN", "s3cret")
+
+    assert client.get("/metrics").status_code == 401
+    assert client.get("/metrics", headers={"Authorization": "Bearer wrong"}).status_code == 401
+    assert client.get("/metrics", headers={"Authorization": "Bearer s3cret"}).status_code == 200
@@ -0,0 +1,84 @@
+import base64
+import email
+from email import policy
+
+import pytest
+
+from pathra_preshana import assets as assets_module
+from pathra_preshana.assets import asset_path, campaign_assets, cid_references, encode_asset, load_asset
+from pathra_preshana.templating import CompiledTemplate
+
+
+@pytest.fixture
+def assets_dir(tmp_path):
+    directory = tmp_path / "assets"
+    directory.mkdir()
+    (directory / "logo.png").write_bytes(b"\x89PNG" + bytes(range(256)) * 4)
+    (directory / "brochure.pdf").write_bytes(b"%PDF-1.4 brochure")
+    return directory
+
+
+def test_encoded_part_parses_back_to_the_file(assets_dir):
+    asset = encode_asset(str(assets_dir / "logo.png"), "logo.png")
+
+    part = email.message_from_bytes(asset.part, policy=policy.default)
+    assert asset.inline and asset.content_type == "image/png"
+    assert part["Content-ID"] == "<logo.png>"
+    assert part.get_content_disposition() == "inline"
+    assert part.get_content() == (assets_dir / "logo.png").read_bytes()
+    # Wrapped base64 lines with CRLF endings
+    body = asset.part.split(b"\r\n\r\n", 1)[1]
+    assert all(len(line) <= 76 for line in body.split(b"\r\n"))
+    assert base64.b64decode(body) == (assets_dir / "logo.png").read_bytes()
+
+
+def test_attachment_with_a_non_ascii_name(tmp_path):
+    path = tmp_path / "Broschüre.pdf"
+    path.write_bytes(b"%PDF")
+
+    asset = encode_asset(str(path))
+
+    part = email.message_from_bytes(asset.part, policy=policy.default)
+    assert not asset.inline
+    assert part.get_content_disposition() == "attachment"
+    assert part.get_filename() == "Broschüre.pdf"
+
+
+def test_cid_references_in_order_of_first_use():
+    html = '<img src="cid:logo.png"><div style="background: url(cid:bg.jpg)"></div><img src="CID:logo.png">'
+
+    assert cid_references(html) == ["logo.png", "bg.jpg"]
+    assert cid_references(CompiledTemplate("<img src='cid:logo.png'> {name}")) == ["logo.png"]
+
+
+@pytest.mark.parametrize("name", ["../secret.png", "sub/logo.png", ".env", ""])
+def test_asset_names_cannot_leave_the_directory(name):
+    with pytest.raises(ValueError):
+        asset_path(name, "assets")
+
+
+def test_campaign_assets_puts_inline_images_first(assets_dir):
+    found = campaign_assets('<img src="cid:logo.png">', ["brochure.pdf", "brochure.pdf"], str(assets_dir))
+
+    assert [(asset.filename, asset.inline) for asset in found] == [("logo.png", True), ("brochure.pdf", False)]
+
+
+def test_missing_assets_are_reported(assets_dir):
+    with pytest.raises(FileNotFoundError, match="cid:banner.png"):
+        campaign_assets('<img src="cid:banner.png">', directory=str(assets_dir))
+    with pytest.raises(FileNotFoundError, match="terms.pdf"):
+        campaign_assets("<p>Hi</p>", ["terms.pdf"], str(assets_dir))
+
+
+def test_assets_over_the_size_limit_are_rejected(assets_dir, monkeypatch):
+    monkeypatch.setattr(assets_module, "MAX_ASSETS_BYTES", 1000)
+
+    with pytest.raises(ValueError, match="limit"):
+        campaign_assets('<img src="cid:logo.png">', directory=str(assets_dir))
+
+
+def test_unchanged_files_are_encoded_once(assets_dir):
+    path = str(assets_dir / "brochure.pdf")
+
+    assert load_asset(path) is load_asset(path)
+    assert load_asset(path, "brochure.pdf") is not load_asset(path)
@@ -0,0 +1,79 @@
+import threading
+
+from pathra_preshana.async_sender import AsyncEmailSender
+from pathra_preshana.email_sender import create_email_sender
+
+
+def recipients(count):
+    return [{"email": f"u{i}@example.com", "name": f"User {i}"} for i in range(count)]
+
+
+def test_backend_is_chosen_by_env(sender_env, monkeypatch):
+    monkeypatch.setenv("EMAIL_BACKEND", "async")
+
+    assert isinstance(create_email_sender(), AsyncEmailSender)
+
+
+def test_send_email(smtp_sink, sender_env):
+    sender = AsyncEmailSender("127.0.0.1", smtp_sink.port)
+
+    assert sender.send_email("ann@example.com", "Ann", "Hi", "<p>Hello Ann</p>")
+    assert len(smtp_sink.messages) == 1
+
+
+def test_bulk_send_reports_every_recipient_in_order(smtp_sink, sender_env):
+    sender = AsyncEmailSender("127.0.0.1", smtp_sink.port, workers=4)
+    results = []
+
+    summary = sender.send_bulk_emails(recipients(40), "Hi", "<p>Hello {name}</p>", on_result=results.append)
+
+    assert summary["success"] == 40 and summary["failed"] == 0
+    assert [result["email"] for result in results] == [r["email"] for r in recipients(40)]
+    assert len(smtp_sink.messages) == 40
+    # Four sessions, each logged in once
+    assert smtp_sink.stats.snapshot()["logins"] == 4
+
+
+def test_transient_failures_are_retried(smtp_sink, sender_env):
+    smtp_sink.error_rate = 0.3
+    sender = AsyncEmailSender("127.0.0.1", smtp_sink.port, workers=2, max_retries=10)
+
+    summary = sender.send_bulk_emails(recipients(20), "Hi", "<p>Hello {name}</p>")
+
+    assert summary["success"] == 20 and summary["failed"] == 0
+
+
+def test_permanent_failures_are_not_retried(smtp_sink, sender_env):
+    smtp_sink.error_rate, smtp_sink.error_code = 1.0, 550
+    sender = AsyncEmailSender("127.0.0.1", smtp_sink.port, max_retries=3)
+
+    summary = sender.send_bulk_emails(recipients(3), "Hi", "<p>Hello {name}</p>")
+
+    assert summary["failed"] == 3
+    # One attempt each
+    assert smtp_sink.stats.snapshot()["rejected"] == 3
+
+
+def test_static_template_is_shared_between_recipients(smtp_sink, sender_env):
+    sender = AsyncEmailSender("127.0.0.1", smtp_sink.port, max_recipients_per_message=4)
+
+    summary = sender.send_bulk_emails(recipients(10), "News", "<p>Same for everyone</p>")
+
+    assert summary["success"] == 10
+    assert len(smtp_sink.messages) == 3
+    assert smtp_sink.stats.snapshot()["recipients"] == 10
+
+
+def test_cancelled_send_stops_before_the_next_message(smtp_sink, sender_env):
+    cancel = threading.Event()
+    sender = AsyncEmailSender("127.0.0.1", smtp_sink.port)
+    results = []
+
+    def on_result(result):
+        results.append(result)
+        cancel.set()
+
+    sender.send_bulk_emails(recipients(50), "Hi", "<p>Hello {name}</p>", on_result=on_result, cancel_event=cancel)
+
+    assert len(smtp_sink.messages) < 50
+    assert [result["status"] for result in results].count("sent") == len(smtp_sink.messages)
@@ -0,0 +1,74 @@
+import asyncio
+import smtplib
+
+import pytest
+
+from benchmarks.smtp_sink import SMTPSink
+from pathra_preshana.async_smtp import AsyncSMTPSession, prepare_data
+from pathra_preshana.smtp_session import smtp_error_code
+
+
+def send(session, count, start=0):
+    async def run():
+        for i in range(start, start + count):
+            await session.sendmail("sender@example.com", [f"u{i}@example.com"],
+                                   f"Subject: {i}\r\n\r\nHi\r\n".encode())
+    asyncio.run(run())
+
+
+def test_prepare_data_normalizes_line_ends_and_stuffs_dots():
+    assert prepare_data(b"a\nb\r.c\r\n.d") == b"a\r\nb\r\n..c\r\n..d\r\n.\r\n"
+
+
+def test_one_login_is_reused_for_many_messages(smtp_sink):
+    session = AsyncSMTPSession("127.0.0.1", smtp_sink.port, "user", "secret")
+    send(session, 5)
+
+    assert session.sessions_opened == 1
+    assert smtp_sink.stats.snapshot()["logins"] == 1
+    assert len(smtp_sink.messages) == 5
+
+
+def test_connection_is_recycled_after_its_message_cap(smtp_sink):
+    session = AsyncSMTPSession("127.0.0.1", smtp_sink.port, "user", "secret", max_messages_per_connection=2)
+    send(session, 5)
+
+    assert session.sessions_opened == 3
+    assert smtp_sink.stats.snapshot()["connections"] == 3
+
+
+def test_refused_recipients_are_returned(smtp_sink):
+    smtp_sink.error_rate, smtp_sink.error_code, smtp_sink.error_phase = 1.0, 550, "rcpt"
+    session = AsyncSMTPSession("127.0.0.1", smtp_sink.port, "user", "secret")
+
+    with pytest.raises(smtplib.SMTPRecipientsRefused) as error:
+        send(session, 1)
+
+    assert error.value.recipients["u0@example.com"][0] == 550
+    assert not smtp_sink.messages
+
+
+def test_reconnects_when_the_server_hung_up_between_messages():
+    with SMTPSink(keep_messages=True, max_messages_per_connection=2) as sink:
+        session = AsyncSMTPSession("127.0.0.1", sink.port, "user", "secret")
+        send(session, 5)
+
+        assert session.sessions_opened == 3
+        assert len(sink.messages) == 5
+
+
+def test_hang_up_after_data_is_not_sent_again():
+    with SMTPSink(keep_messages=True, error_rate=1.0, error_phase="drop") as sink:
+        session = AsyncSMTPSession("127.0.0.1", sink.port, "user", "secret")
+
+        with pytest.raises(smtplib.SMTPServerDisconnected) as error:
+            send(session, 1)
+
+        assert smtp_error_code(error.value) == "disconnect"
+        assert len(sink.messages) == 1
+
+        # The session recovers for the next message
+        sink.error_rate = 0
+        send(session, 1, start=1)
+        assert len(sink.messages) == 2
+        assert session.sessions_opened == 2
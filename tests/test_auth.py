@@ -0,0 +1,112 @@
+import json
+import time
+
+import pytest
+from google.auth.exceptions import TransportError
+
+from pathra_preshana.auth import CERTS_MIN_REFETCH_INTERVAL, CertCache, ClaimsCache
+
+
+class FakeResponse:
+    def __init__(self, status, certs, max_age):
+        self.status = status
+        self.data = json.dumps(certs).encode("utf-8")
+        self.headers = {"Cache-Control": f"public, max-age={max_age}, must-revalidate"} if max_age is not None else {}
+
+
+class FakeTransport:
+    """Serves a new key id on every fetch"""
+
+    def __init__(self, max_age=3600, status=200):
+        self.max_age = max_age
+        self.status = status
+        self.calls = 0
+
+    def __call__(self, url, method):
+        self.calls += 1
+        return FakeResponse(self.status, {f"key-{self.calls}": "cert"}, self.max_age)
+
+
+def wait_for(condition, timeout=5.0):
+    deadline = time.monotonic() + timeout
+    while not condition():
+        assert time.monotonic() < deadline, "timed out"
+        time.sleep(0.01)
+
+
+def test_certs_are_fetched_once_while_fresh():
+    certs = CertCache("https://certs", FakeTransport(), refresh_ahead=0)
+
+    assert certs.get() == {"key-1": "cert"}
+    assert certs.get() == {"key-1": "cert"}
+    assert certs.fetches == 1
+
+
+def test_expired_certs_are_fetched_again():
+    certs = CertCache("https://certs", FakeTransport(max_age=0), refresh_ahead=0)
+
+    certs.get()
+    assert certs.get() == {"key-2": "cert"}
+    assert certs.fetches == 2
+
+
+def test_certs_near_expiry_are_refreshed_in_the_background():
+    certs = CertCache("https://certs", FakeTransport(max_age=60), refresh_ahead=120)
+    certs.get()
+
+    # Answered from the cache while the refresh runs
+    assert certs.get() == {"key-1": "cert"}
+    wait_for(lambda: certs.fetches == 2)
+    assert certs.get() in ({"key-2": "cert"}, {"key-3": "cert"})
+
+
+def test_unknown_key_refetch_is_rate_limited(monkeypatch):
+    transport = FakeTransport()
+    certs = CertCache("https://certs", transport, refresh_ahead=0)
+    certs.get()
+
+    assert certs.refresh_for_unknown_key() == {"key-1": "cert"}
+    assert transport.calls == 1
+
+    later = time.monotonic() + CERTS_MIN_REFETCH_INTERVAL + 1
+    monkeypatch.setattr("pathra_preshana.auth.time.monotonic", lambda: later)
+    assert certs.refresh_for_unknown_key() == {"key-2": "cert"}
+
+
+def test_failed_fetch_raises():
+    certs = CertCache("https://certs", FakeTransport(status=500))
+
+    with pytest.raises(TransportError):
+        certs.get()
+
+
+def test_claims_are_reused_until_they_expire():
+    cache = ClaimsCache(ttl=60)
+    cache.put("token", {"email": "ann@example.com", "exp": time.time() + 0.2})
+
+    assert cache.get("token")["email"] == "ann@example.com"
+    assert cache.get("other") is None
+    time.sleep(0.3)
+    assert cache.get("token") is None
+
+
+def test_expired_claims_are_not_cached():
+    cache = ClaimsCache()
+    cache.put("token", {"email": "ann@example.com", "exp": time.time() - 1})
+
+    assert cache.get("token") is None
+
+
+def test_least_recently_used_claims_are_evicted():
+    cache = ClaimsCache(max_entries=2)
+    claims = {"exp": time.time() + 600}
+    cache.put("a", claims)
+    cache.put("b", claims)
+    cache.get("a")
+    cache.put("c", claims)
+
+    assert cache.get("a") is claims and cache.get("c") is claims
+    assert cache.get("b") is None
+
+    cache.clear()
+    assert cache.get("a") is None
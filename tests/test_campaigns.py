@@ -0,0 +1,113 @@
+import csv
+import email
+
+import time
+
+from pathra_preshana import scheduler
+from pathra_preshana.campaigns import chunk_specs, merge_results, run_campaign
+from pathra_preshana.delivery_report import iter_report
+from pathra_preshana.jobs import CampaignJob, JobManager
+from pathra_preshana.scheduler import CampaignQueue, CampaignScheduler
+
+
+def wait_for(condition, timeout=5.0):
+    deadline = time.monotonic() + timeout
+    while not condition():
+        assert time.monotonic() < deadline, "timed out"
+        time.sleep(0.01)
+
+
+def campaign_spec(path, **overrides):
+    spec = {
+        "template_path": str(path.parent / "template.html"),
+        "recipients_path": str(path),
+        "subject": "Hi",
+        "escape_values": True,
+        "where": None,
+        "offset": 0,
+        "limit": None,
+        "attachments": [],
+        "campaign_id": "campaign",
+        "resume": False,
+    }
+    spec.update(overrides)
+    return spec
+
+
+def write_campaign(tmp_path, emails):
+    (tmp_path / "template.html").write_text("<p>Hello {name}</p>", encoding="utf-8")
+    path = tmp_path / "recipients.csv"
+    with open(path, "w", encoding="utf-8", newline="") as file:
+        writer = csv.writer(file)
+        writer.writerow(["name", "email"])
+        writer.writerows([[f"User {number}", address] for number, address in enumerate(emails)])
+    return path
+
+
+def test_chunks_skip_addresses_of_earlier_chunks(tmp_path):
+    path = write_campaign(tmp_path, ["a@example.com", "b@example.com", "c@example.com",
+                                     "A@Example.com", "d@example.com", "b@example.com",
+                                     "e@example.com", "not-an-address", "c@example.com"])
+
+    chunks = chunk_specs(campaign_spec(path), 9, chunk_size=3)
+
+    assert [(chunk["offset"], chunk["limit"]) for chunk in chunks] == [(0, 3), (3, 3), (6, 3)]
+    assert [chunk["duplicates"] for chunk in chunks] == [[], [0, 2], [2]]
+
+
+def test_chunked_campaign_mails_each_address_once(tmp_path, campaign_env):
+    path = write_campaign(tmp_path, ["a@example.com", "b@example.com", "b@example.com",
+                                     "a@example.com", "c@example.com", "b@example.com"])
+    results = []
+
+    for number, chunk in enumerate(chunk_specs(campaign_spec(path), 6, chunk_size=2)):
+        job = CampaignJob(total=chunk["limit"], campaign_id="campaign", job_id="job1")
+        results.append(run_campaign(chunk, job, report_part=f"task-{number}"))
+
+    received = sorted(email.message_from_bytes(message)["To"] for message in campaign_env.messages)
+    assert received == ["a@example.com", "b@example.com", "c@example.com"]
+    assert merge_results(results)["success"] == 3
+    assert [row["email"] for row in iter_report("job1")] == ["a@example.com", "b@example.com", "c@example.com"]
+
+
+def test_rerun_of_a_part_keeps_earlier_delivery_records(tmp_path, campaign_env):
+    path = write_campaign(tmp_path, [f"u{number}@example.com" for number in range(5)])
+    spec = campaign_spec(path)
+
+    run_campaign(spec, CampaignJob(total=5, campaign_id="campaign", job_id="job2"), report_part="task-1")
+    run_campaign(dict(spec, resume=True), CampaignJob(total=5, campaign_id="campaign", job_id="job2"),
+                 report_part="task-1")
+
+    rows = list(iter_report("job2"))
+    assert [row["email"] for row in rows] == [f"u{number}@example.com" for number in range(5)]
+    assert all(row["status"] == "sent" and row["code"] == "250" and "latency_ms" in row for row in rows)
+    assert len(campaign_env.messages) == 5
+
+
+def test_report_of_a_paused_and_resumed_campaign(tmp_path, campaign_env, monkeypatch):
+    emails = [f"u{number}@example.com" for number in range(40)]
+    path = write_campaign(tmp_path, emails)
+    window = {"open": True}
+    monkeypatch.setattr(scheduler, "in_window", lambda parsed, now=None: parsed is None or window["open"])
+    campaign_env.latency = 0.01
+    queue = CampaignQueue(str(tmp_path / "campaigns.db"))
+    campaign_scheduler = CampaignScheduler(JobManager(max_workers=1), run_campaign, queue=queue)
+
+    job = campaign_scheduler.submit(campaign_spec(path), 40, owner="a@example.com", window="09:00-17:00")
+    wait_for(lambda: len(campaign_env.messages) >= 5)
+    window["open"] = False
+    campaign_scheduler._wake.set()
+    wait_for(lambda: job.status == "paused")
+    sent_before_pause = len(campaign_env.messages)
+    assert sent_before_pause < 40
+
+    window["open"] = True
+    campaign_scheduler._wake.set()
+    wait_for(lambda: job.status == "completed", timeout=10)
+    queue.close()
+
+    rows = list(iter_report(job.job_id))
+    assert sorted(row["email"] for row in rows) == sorted(emails)
+    # Recipients sent before the pause keep their delivery records
+    assert all(row["status"] == "sent" and row["code"] == "250" and "latency_ms" in row for row in rows)
+    assert len(campaign_env.messages) == 40
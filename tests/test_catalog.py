@@ -0,0 +1,40 @@
+import os
+
+from pathra_preshana.catalog import FileCatalog, describe_recipients
+
+
+def write(path, text, mtime=None):
+    path.write_text(text, encoding="utf-8")
+    if mtime is not None:
+        os.utime(path, (mtime, mtime))
+
+
+def test_unchanged_directory_keeps_its_etag_without_rescanning(tmp_path):
+    write(tmp_path / "a.csv", "email\nann@example.com\n")
+    write(tmp_path / "notes.txt", "ignored")
+    catalog = FileCatalog(str(tmp_path), ".csv", describe_recipients)
+
+    etag, files = catalog.listing()
+    assert [entry["name"] for entry in files] == ["a.csv"]
+    assert files[0]["rows"] == 1 and "email" in files[0]["columns"]
+
+    assert catalog.listing()[0] == etag
+    assert catalog.scans == 1
+
+
+def test_etag_changes_with_the_files(tmp_path):
+    write(tmp_path / "a.csv", "email\nann@example.com\n", mtime=1_000_000)
+    catalog = FileCatalog(str(tmp_path), ".csv", describe_recipients)
+    first, _ = catalog.listing()
+
+    write(tmp_path / "b.csv", "email\n")
+    second, files = catalog.listing()
+    assert second != first
+    assert [entry["name"] for entry in files] == ["a.csv", "b.csv"]
+
+    # Overwriting in place leaves the directory mtime alone; uploads invalidate
+    write(tmp_path / "a.csv", "email\nann@example.com\nbob@example.com\n")
+    catalog.invalidate("a.csv")
+    third, files = catalog.listing()
+    assert third != second
+    assert files[0]["rows"] == 2
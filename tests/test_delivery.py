@@ -0,0 +1,120 @@
+import random
+import threading
+import time
+
+import pytest
+
+from pathra_preshana.delivery import DeliveryEngine
+from pathra_preshana.retry import PERMANENT, TRANSIENT, RetryPolicy
+from pathra_preshana.smtp_session import SMTPSession
+
+
+def make_engine(sink, workers, retry_policy=None):
+    return DeliveryEngine(
+        lambda: SMTPSession("127.0.0.1", sink.port, "user", "secret", timeout=5),
+        workers=workers,
+        retry_policy=retry_policy,
+    )
+
+
+def send(session, task):
+    session.sendmail("sender@example.com", [task], f"To: {task}\r\n\r\nHello\r\n".encode())
+    return {"email": task, "status": "sent"}
+
+
+def reject(task, reason):
+    return {"email": task, "status": "failed", "error": reason}
+
+
+@pytest.mark.parametrize("workers", [1, 4])
+def test_results_come_back_in_input_order(smtp_sink, workers):
+    tasks = [f"u{i}@example.com" for i in range(40)]
+    results = []
+
+    def deliver(session, task):
+        time.sleep(random.uniform(0, 0.005))
+        return send(session, task)
+
+    sessions = make_engine(smtp_sink, workers).run(tasks, deliver, results.append, reject)
+
+    assert [result["email"] for result in results] == tasks
+    assert all(result["attempts"] == 1 for result in results)
+    assert len(smtp_sink.messages) == 40
+    assert 1 <= sessions <= workers
+
+
+@pytest.mark.parametrize("workers", [1, 4])
+def test_transient_failures_are_retried(smtp_sink, workers):
+    tasks = [f"u{i}@example.com" for i in range(10)]
+    failed_once = set()
+    results = []
+
+    def deliver(session, task):
+        if tasks.index(task) % 2 and task not in failed_once:
+            failed_once.add(task)
+            return {"email": task, "status": "failed", "category": TRANSIENT, "code": "451"}
+        return send(session, task)
+
+    policy = RetryPolicy(max_retries=2, base_delay=0.01, max_delay=0.02)
+    make_engine(smtp_sink, workers, policy).run(tasks, deliver, results.append, reject)
+
+    assert sorted(result["email"] for result in results) == sorted(tasks)
+    assert all(result["status"] == "sent" for result in results)
+    attempts = {result["email"]: result["attempts"] for result in results}
+    assert attempts == {task: 2 if index % 2 else 1 for index, task in enumerate(tasks)}
+    assert len(smtp_sink.messages) == 10
+
+
+@pytest.mark.parametrize("workers", [1, 4])
+def test_permanent_failures_and_exhausted_retries_are_final(smtp_sink, workers):
+    calls = []
+    results = []
+
+    def deliver(session, task):
+        calls.append(task)
+        category = PERMANENT if task == "bounce@example.com" else TRANSIENT
+        return {"email": task, "status": "failed", "category": category, "code": "550"}
+
+    policy = RetryPolicy(max_retries=2, base_delay=0.01, max_delay=0.02)
+    make_engine(smtp_sink, workers, policy).run(
+        ["bounce@example.com", "busy@example.com"], deliver, results.append, reject
+    )
+
+    assert calls.count("bounce@example.com") == 1
+    assert calls.count("busy@example.com") == 3
+    attempts = {result["email"]: result["attempts"] for result in results}
+    assert attempts == {"bounce@example.com": 1, "busy@example.com": 3}
+
+
+@pytest.mark.parametrize("workers", [1, 4])
+def test_cancel_stops_new_tasks_and_reports_sent_ones(smtp_sink, workers):
+    tasks = [f"u{i}@example.com" for i in range(200)]
+    cancel = threading.Event()
+    results = []
+
+    def deliver(session, task):
+        if len(smtp_sink.messages) >= 5:
+            cancel.set()
+        return send(session, task)
+
+    make_engine(smtp_sink, workers).run(tasks, deliver, results.append, reject, cancel_event=cancel)
+
+    sent = [result["email"] for result in results if result["status"] == "sent"]
+    assert 5 <= len(smtp_sink.messages) < len(tasks)
+    assert sorted(sent) == sorted(tasks[:len(sent)])
+    assert len(sent) == len(smtp_sink.messages)
+
+
+def test_precheck_results_skip_delivery(smtp_sink):
+    tasks = [f"u{i}@example.com" for i in range(6)]
+    results = []
+
+    def precheck(task):
+        if tasks.index(task) < 3:
+            return {"email": task, "status": "skipped"}
+        return None
+
+    make_engine(smtp_sink, 2).run(tasks, send, results.append, reject, precheck=precheck)
+
+    assert [result["status"] for result in results] == ["skipped"] * 3 + ["sent"] * 3
+    assert len(smtp_sink.messages) == 3
@@ -0,0 +1,69 @@
+import csv
+import io
+
+import pytest
+
+from pathra_preshana.delivery_report import DeliveryReport, iter_report, report_csv, report_dir
+
+
+def result(address, status, **extra):
+    return dict({"email": address, "name": "", "status": status, "error": "", "category": "", "code": ""}, **extra)
+
+
+def test_latest_real_outcome_wins(tmp_path):
+    directory = str(tmp_path)
+    with DeliveryReport("job", "c1", "task-1", directory=directory) as report:
+        report.record(result("a@example.com", "failed", category="transient", code="451"))
+        report.record(result("b@example.com", "sent", code="250", latency_ms=12.5))
+        report.record(result("c@example.com", "skipped"))
+    # A later run of the same part
+    with DeliveryReport("job", "c1", "task-1", directory=directory) as report:
+        report.record(result("a@example.com", "sent", code="250"))
+        report.record(result("B@example.com", "skipped"))
+        report.record(result("c@example.com", "skipped"))
+
+    rows = {row["email"].lower(): row for row in iter_report("job", directory)}
+
+    assert len(list(iter_report("job", directory))) == 3
+    assert rows["a@example.com"]["status"] == "sent"
+    assert rows["b@example.com"]["status"] == "sent" and rows["b@example.com"]["latency_ms"] == 12.5
+    assert rows["c@example.com"]["status"] == "skipped"
+    assert all(row["campaign_id"] == "c1" and row["timestamp"] for row in rows.values())
+
+
+def test_parts_are_read_in_task_order(tmp_path):
+    directory = str(tmp_path)
+    for part in ("task-10", "task-2", "web"):
+        with DeliveryReport("job", "c1", part, directory=directory) as report:
+            report.record(result(f"{part}@example.com", "sent"))
+
+    assert [row["email"] for row in iter_report("job", directory)] == \
+        ["web@example.com", "task-2@example.com", "task-10@example.com"]
+    assert list(iter_report("missing", directory)) == []
+
+
+def test_rows_are_buffered_until_a_batch_is_full(tmp_path):
+    report = DeliveryReport("job", "c1", directory=str(tmp_path), batch_size=3, flush_interval=60)
+
+    report.record(result("a@example.com", "sent"))
+    report.record(result("b@example.com", "sent"))
+    assert list(iter_report("job", str(tmp_path))) == []
+    report.record(result("c@example.com", "sent"))
+    assert len(list(iter_report("job", str(tmp_path)))) == 3
+    report.close()
+
+
+def test_report_csv_has_every_field(tmp_path):
+    rows = [{"email": f"u{number}@example.com", "status": "sent", "attempts": 1} for number in range(5)]
+
+    chunks = list(report_csv(iter(rows), batch_rows=2))
+
+    assert len(chunks) == 3
+    parsed = list(csv.DictReader(io.StringIO("".join(chunks))))
+    assert [row["email"] for row in parsed] == [row["email"] for row in rows]
+    assert parsed[0]["attempts"] == "1" and parsed[0]["code"] == ""
+
+
+def test_job_ids_cannot_escape_the_reports_directory():
+    with pytest.raises(ValueError):
+        report_dir("../secrets")
@@ -0,0 +1,91 @@
+import email
+from email import policy
+
+from pathra_preshana.email_sender import EmailSender
+
+
+def test_send_email_reports_the_recipient_name(smtp_sink, sender_env, monkeypatch):
+    results = []
+    send_one = EmailSender._send_one
+
+    def spy(self, session, builder, recipient):
+        results.append(send_one(self, session, builder, recipient))
+        return results[-1]
+
+    monkeypatch.setattr(EmailSender, "_send_one", spy)
+    sender = EmailSender("127.0.0.1", smtp_sink.port)
+
+    assert sender.send_email("ann@example.com", "Ann", "Grüße", "<p>Hallo Ann</p>")
+
+    assert results[0]["name"] == "Ann"
+    assert results[0]["status"] == "sent"
+    message = email.message_from_bytes(smtp_sink.messages[0], policy=policy.default)
+    assert message["Subject"] == "Grüße"
+    assert message["To"] == "ann@example.com"
+
+
+def test_bulk_send_reports_every_recipient(smtp_sink, sender_env):
+    sender = EmailSender("127.0.0.1", smtp_sink.port, workers=4)
+    recipients = [{"email": f"u{i}@example.com", "name": f"User {i}"} for i in range(40)]
+    results = []
+
+    summary = sender.send_bulk_emails(recipients, "Hi", "<p>Hello {name}</p>", on_result=results.append)
+
+    assert summary["success"] == 40 and summary["failed"] == 0
+    assert sorted(result["email"] for result in results) == sorted(r["email"] for r in recipients)
+    assert all(result["latency_ms"] >= 0 for result in results)
+    assert len(smtp_sink.messages) == 40
+
+
+def test_shared_batches_fit_the_daily_quota_left(smtp_sink, sender_env):
+    sender = EmailSender("127.0.0.1", smtp_sink.port, rate_per_day=5, max_recipients_per_message=50)
+    recipients = [{"email": f"u{i}@example.com", "name": ""} for i in range(8)]
+
+    summary = sender.send_bulk_emails(recipients, "News", "<p>Same for everyone</p>")
+
+    assert summary["success"] == 5
+    assert summary["failures"]["quota"] == 3
+    assert smtp_sink.stats.snapshot()["recipients"] == 5
+
+
+def shared_send(sink, count, **options):
+    sender = EmailSender("127.0.0.1", sink.port, max_recipients_per_message=10, **options)
+    results = []
+    recipients = [{"email": f"u{i}@example.com", "name": ""} for i in range(count)]
+    summary = sender.send_bulk_emails(recipients, "News", "<p>Same for everyone</p>", on_result=results.append)
+    return summary, results
+
+
+def test_recipients_refused_for_good_fail_alone(smtp_sink, sender_env):
+    smtp_sink.error_rate, smtp_sink.error_code, smtp_sink.error_phase = 0.5, 550, "rcpt"
+
+    summary, results = shared_send(smtp_sink, 20, max_retries=3)
+
+    assert sorted(result["email"] for result in results) == sorted(f"u{i}@example.com" for i in range(20))
+    failed = [result for result in results if result["status"] == "failed"]
+    assert failed and all(result["category"] == "permanent" and result["code"] == "550" for result in failed)
+    # Refused recipients are not retried, and the others got the message once
+    assert smtp_sink.stats.snapshot()["rejected"] == len(failed)
+    assert smtp_sink.stats.snapshot()["recipients"] == summary["success"] == 20 - len(failed)
+
+
+def test_recipients_refused_for_now_are_retried_alone(smtp_sink, sender_env):
+    # 452: too many recipients for now, without slowing the whole send down
+    smtp_sink.error_rate, smtp_sink.error_code, smtp_sink.error_phase = 0.5, 452, "rcpt"
+
+    summary, results = shared_send(smtp_sink, 20, max_retries=20)
+
+    assert summary["success"] == 20 and summary["failed"] == 0
+    # Every recipient received the message exactly once over the retries
+    assert smtp_sink.stats.snapshot()["recipients"] == 20
+    assert smtp_sink.stats.snapshot()["messages"] > 2
+
+
+def test_batch_refused_whole_fails_every_recipient(smtp_sink, sender_env):
+    smtp_sink.error_rate, smtp_sink.error_code, smtp_sink.error_phase = 1.0, 550, "rcpt"
+
+    summary, results = shared_send(smtp_sink, 5, max_retries=3)
+
+    assert summary["failed"] == 5
+    assert {result["code"] for result in results} == {"550"}
+    assert not smtp_sink.messages
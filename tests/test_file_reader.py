@@ -0,0 +1,80 @@
+import csv
+
+from pathra_preshana.file_reader import FileCache, FileReader
+from pathra_preshana.recipient_store import RecipientStore
+
+
+def write_csv(path, rows):
+    with open(path, "w", encoding="utf-8", newline="") as file:
+        writer = csv.writer(file)
+        writer.writerow(["name", "email", "city"])
+        writer.writerows(rows)
+    return str(path)
+
+
+def test_rows_with_blank_email_are_skipped(tmp_path):
+    path = write_csv(tmp_path / "recipients.csv", [
+        ["Ann", "ann@example.com", "Pune"],
+        ["Nobody", "", "Delhi"],
+        ["", "bob@example.com", "Goa"],
+    ])
+
+    recipients = list(FileReader.iter_csv_recipients(path))
+
+    assert [recipient["email"] for recipient in recipients] == ["ann@example.com", "bob@example.com"]
+    assert recipients[0]["city"] == "Pune"
+    # A missing name falls back to the address's local part
+    assert recipients[1]["name"] == "bob"
+    assert FileReader.count_csv_recipients(path) == 2
+    assert [recipient["email"] for recipient in FileReader.read_csv_recipient_page(path, 1, 10)] == ["bob@example.com"]
+
+
+def test_file_cache_reloads_changed_files_and_evicts(tmp_path):
+    cache = FileCache(max_entries=2)
+    loads = []
+
+    def load(path):
+        loads.append(path)
+        return open(path, encoding="utf-8").read()
+
+    paths = [tmp_path / f"{name}.txt" for name in "abc"]
+    for path in paths:
+        path.write_text(path.stem, encoding="utf-8")
+
+    assert cache.get("text", paths[0], load) == "a"
+    assert cache.get("text", paths[0], load) == "a"
+    assert len(loads) == 1 and cache.stats()["hits"] == 1
+
+    paths[0].write_text("changed", encoding="utf-8")
+    assert cache.get("text", paths[0], load) == "changed"
+    assert len(loads) == 2
+
+    cache.get("text", paths[1], load)
+    cache.get("text", paths[2], load)
+    assert cache.stats()["entries"] == 2 and cache.stats()["evictions"] == 1
+    assert cache.peek("text", paths[0]) is None
+
+    cache.invalidate(paths[2])
+    assert cache.peek("text", paths[2]) is None
+
+
+def test_file_cache_respects_its_byte_budget(tmp_path):
+    cache = FileCache(max_bytes=4096)
+    big = tmp_path / "big.txt"
+    big.write_text("x" * 8192, encoding="utf-8")
+
+    cache.get("text", big, lambda path: "loaded")
+
+    assert cache.stats()["entries"] == 0
+
+
+def test_store_built_elsewhere_is_picked_up(tmp_path):
+    path = write_csv(tmp_path / "recipients.csv", [["Ann", "ann@example.com", "Pune"]])
+    assert FileReader.recipient_store(path) is None
+    assert FileReader.count_csv_recipients(path) == 1
+
+    # As another process or the background builder would
+    RecipientStore.build(path, FileReader.read_csv_columns(path), FileReader.iter_csv_recipients(path))
+
+    store = FileReader.recipient_store(path)
+    assert store is not None and store.count == 1
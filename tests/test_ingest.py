@@ -0,0 +1,44 @@
+import gzip
+import os
+
+import pytest
+
+from pathra_preshana.ingest import CSVIngestError, CSVIngestor
+
+
+def ingest(tmp_path, data, chunk_size=7, compressed=False):
+    ingestor = CSVIngestor(str(tmp_path), compressed=compressed)
+    for start in range(0, len(data), chunk_size):
+        ingestor.write(data[start:start + chunk_size])
+    return ingestor.commit(str(tmp_path / "recipients.csv"))
+
+
+@pytest.mark.parametrize("data, line", [
+    (b"name,address\nAnn,ann@example.com\n", 1),
+    (b"name,email\nAnn,ann@example.com\nBob,bob@example.com,extra\n", 3),
+    (b"name,email\nAnn,ann@example.com\n\nB\xffb,bob@example.com\n", 4),
+    (b'name,email\n"Ann\nSmith",ann@example.com\n"Bob"by,bob@example.com\n', 4),
+    (b'name,email\nAnn,ann@example.com\n"Bob,bob@example.com\n', 3),
+])
+def test_errors_give_the_line_of_the_bad_row(tmp_path, data, line):
+    with pytest.raises(CSVIngestError) as error:
+        ingest(tmp_path, data)
+
+    assert error.value.line == line
+    assert str(error.value).startswith(f"line {line}: ")
+    # Rejected uploads leave nothing behind
+    assert os.listdir(tmp_path) == []
+
+
+def test_valid_upload_is_committed(tmp_path):
+    data = '﻿name,email\n"Smith, Ann",ann@example.com\n"Bob\nJones",bob@example.com\nNo one,\n'.encode()
+
+    summary = ingest(tmp_path, gzip.compress(data), compressed=True)
+
+    assert summary == {"rows": 3, "recipients": 2, "bytes": len(data) - 3}
+    assert (tmp_path / "recipients.csv").read_bytes() == data[3:]
+
+
+def test_compressed_upload_must_be_gzip(tmp_path):
+    with pytest.raises(CSVIngestError, match="not gzip"):
+        ingest(tmp_path, b"name,email\n", compressed=True)
@@ -0,0 +1,127 @@
+import threading
+import time
+
+from pathra_preshana.jobs import CampaignJob, JobManager
+
+
+def wait_for(condition, timeout=5.0):
+    deadline = time.monotonic() + timeout
+    while not condition():
+        assert time.monotonic() < deadline, "timed out"
+        time.sleep(0.01)
+
+
+def test_record_counts_results_by_status_and_category():
+    job = CampaignJob(total=5)
+
+    for result in ({"status": "sent"}, {"status": "sent"}, {"status": "skipped"},
+                   {"status": "failed", "category": "quota"}, {"status": "failed"}):
+        job.record(result)
+
+    progress = job.progress()
+    assert (progress["sent"], progress["skipped"], progress["failed"]) == (2, 1, 2)
+    assert progress["failures"] == {"quota": 1, "permanent": 1}
+    assert progress["remaining"] == 0
+
+
+def test_progress_reports_throughput_and_eta():
+    job = CampaignJob(total=30)
+    job.status = "running"
+    job.started_at = time.time() - 10
+    for _ in range(10):
+        job.record({"status": "sent"})
+
+    progress = job.progress()
+    assert progress["throughput"] == 1.0
+    assert progress["remaining"] == 20
+    assert progress["eta_seconds"] == 20.0
+
+
+def test_pause_resets_counts_and_gives_a_fresh_cancel_event():
+    job = CampaignJob(total=3)
+    job.record({"status": "sent"})
+    cancel_event = job.cancel_event
+    cancel_event.set()
+
+    job.pause()
+
+    assert job.status == "paused" and job.sent == 0
+    assert job.cancel_event is not cancel_event and not job.cancel_event.is_set()
+
+
+def test_job_runs_in_the_background_and_completes():
+    manager = JobManager(max_workers=1)
+    finished = []
+
+    def run(job):
+        job.record({"status": "sent"})
+        return {"success": 1, "failed": 0}
+
+    job = manager.create(1, owner="ann@example.com")
+    manager.start(job, run, on_finish=finished.append)
+    wait_for(lambda: finished)
+
+    assert job.status == "completed" and job.results == {"success": 1, "failed": 0}
+    assert manager.get(job.job_id) is job
+    assert manager.list("ann@example.com") == [job] and manager.list("bob@example.com") == []
+    assert not manager.cancel(job.job_id)
+
+
+def test_cancelled_job_stops_and_is_reported_cancelled():
+    manager = JobManager(max_workers=1)
+    started = threading.Event()
+
+    def run(job):
+        started.set()
+        job.cancel_event.wait(5)
+        return {"success": 0, "failed": 0}
+
+    job = manager.submit(run, 10)
+    started.wait(5)
+    assert manager.cancel(job.job_id)
+    wait_for(lambda: job.finished)
+
+    assert job.status == "cancelled"
+
+
+def test_job_cancelled_before_it_starts_never_runs():
+    manager = JobManager(max_workers=1)
+    release = threading.Event()
+    runs = []
+
+    def run(job):
+        runs.append(job.job_id)
+        release.wait(5)
+        return {}
+
+    first = manager.submit(run, 1)
+    second = manager.submit(run, 1)
+    assert manager.cancel(second.job_id)
+    release.set()
+    wait_for(lambda: first.finished and second.finished)
+
+    assert runs == [first.job_id]
+    assert second.status == "cancelled"
+
+
+def test_failing_job_records_its_error():
+    manager = JobManager(max_workers=1)
+
+    def run(job):
+        raise RuntimeError("template missing")
+
+    job = manager.submit(run, 1)
+    wait_for(lambda: job.finished)
+
+    assert job.status == "failed" and job.error == "template missing"
+
+
+def test_only_the_newest_finished_jobs_are_kept():
+    manager = JobManager(max_workers=1, max_finished_jobs=2)
+    jobs = [manager.create(1) for _ in range(3)]
+    for job in jobs:
+        job.status = "completed"
+    running = manager.create(1)
+
+    assert manager.get(jobs[0].job_id) is None
+    assert [job.job_id for job in manager.list()] == [jobs[1].job_id, jobs[2].job_id, running.job_id]
@@ -0,0 +1,50 @@
+from pathra_preshana.email_sender import EmailSender
+from pathra_preshana.journal import SendJournal
+
+
+def test_outcomes_survive_a_restart(tmp_path):
+    path = str(tmp_path / "journal.db")
+    with SendJournal(path, batch_size=100, flush_interval=60) as journal:
+        journal.record("c1", {"email": "Ann@Example.com ", "status": "sent"})
+        journal.record("c1", {"email": "bob@example.com", "status": "failed", "error": "550"})
+        # Buffered outcomes already count for resume checks
+        assert journal.is_delivered("c1", "ann@example.com")
+
+    with SendJournal(path) as journal:
+        assert journal.is_delivered("c1", "ann@example.com")
+        assert not journal.is_delivered("c1", "bob@example.com")
+        assert not journal.is_delivered("c2", "ann@example.com")
+        assert journal.summary("c1") == {"sent": 1, "failed": 1}
+
+
+def test_a_sent_recipient_stays_sent(tmp_path):
+    with SendJournal(str(tmp_path / "journal.db")) as journal:
+        journal.record("c1", {"email": "ann@example.com", "status": "sent"})
+        journal.flush()
+        journal.record("c1", {"email": "ann@example.com", "status": "failed", "error": "451"})
+        journal.record("c1", {"email": "bob@example.com", "status": "failed", "error": "451"})
+        journal.flush()
+        journal.record("c1", {"email": "bob@example.com", "status": "sent"})
+
+        assert journal.summary("c1") == {"sent": 2}
+
+
+def test_resumed_campaign_skips_recipients_already_sent(tmp_path, smtp_sink, sender_env):
+    recipients = [{"email": f"u{i}@example.com", "name": f"User {i}"} for i in range(10)]
+    sender = EmailSender("127.0.0.1", smtp_sink.port, workers=2)
+
+    with SendJournal(str(tmp_path / "journal.db")) as journal:
+        first = sender.send_bulk_emails(recipients[:4], "Hi", "<p>Hello {name}</p>",
+                                        journal=journal, campaign_id="c1")
+    assert first["success"] == 4
+
+    results = []
+    with SendJournal(str(tmp_path / "journal.db")) as journal:
+        summary = sender.send_bulk_emails(recipients, "Hi", "<p>Hello {name}</p>", on_result=results.append,
+                                          journal=journal, campaign_id="c1", resume=True)
+        assert journal.summary("c1") == {"sent": 10}
+
+    assert summary["success"] == 6 and summary["skipped"] == 4 and summary["failed"] == 0
+    skipped = [result["email"] for result in results if result["status"] == "skipped"]
+    assert sorted(skipped) == sorted(r["email"] for r in recipients[:4])
+    assert len(smtp_sink.messages) == 10
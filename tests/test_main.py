@@ -0,0 +1,72 @@
+import email
+import mailbox
+import os
+from email import policy
+
+import pytest
+
+from pathra_preshana import main as main_module
+
+
+@pytest.fixture
+def campaign_files(tmp_path, monkeypatch):
+    """A template, recipients and an image in a fresh working directory"""
+    monkeypatch.chdir(tmp_path)
+    monkeypatch.setattr(main_module, "load_dotenv", lambda: None)
+    monkeypatch.setattr(main_module, "RENDER_CHUNK_SIZE", 3)
+    monkeypatch.setenv("GMAIL_USER", "sender@example.com")
+    monkeypatch.delenv("GMAIL_APP_PASSWORD", raising=False)
+    monkeypatch.delenv("SMTP_ACCOUNTS_FILE", raising=False)
+
+    (tmp_path / "assets").mkdir()
+    (tmp_path / "assets" / "logo.png").write_bytes(b"\x89PNG fake image")
+    (tmp_path / "template.html").write_text('<img src="cid:logo.png">\nFrom the team, hi {name}\n', encoding="utf-8")
+    rows = [f"user{i}@example.com,User {i}" for i in range(10)]
+    # An invalid and a duplicate address are dropped before rendering
+    rows += ["not-an-address,Nobody", "user0@example.com,User 0"]
+    (tmp_path / "recipients.csv").write_text("email,name\n" + "\n".join(rows) + "\n", encoding="utf-8")
+    return tmp_path
+
+
+def run_dry(*extra):
+    return main_module.main(["--dry-run", "--template", "template.html", "--recipients", "recipients.csv",
+                             "--subject", "Grüße", "--attach", "", "--processes", "2", *extra])
+
+
+def test_dry_run_writes_every_message_to_an_mbox_in_order(campaign_files, capsys):
+    assert run_dry("--output", "out.mbox") == 0
+
+    raw = (campaign_files / "out.mbox").read_bytes()
+    # Only the message separators start with "From "; body lines are quoted
+    assert raw.count(b"\nFrom ") + raw.startswith(b"From ") == 10
+    assert b"\n>From the team" in raw
+    messages = [email.message_from_bytes(message.as_bytes(), policy=policy.default)
+                for message in mailbox.mbox(str(campaign_files / "out.mbox"))]
+    assert [message["To"] for message in messages] == [f"user{i}@example.com" for i in range(10)]
+    assert all(message["Subject"] == "Grüße" for message in messages)
+    assert "Rendered: 10 messages" in capsys.readouterr().out
+
+
+def test_dry_run_writes_numbered_eml_files(campaign_files):
+    assert run_dry("--format", "eml", "--output", "out") == 0
+
+    names = sorted(os.listdir(campaign_files / "out"))
+    assert names == [f"{number:08d}.eml" for number in range(1, 11)]
+    last = email.message_from_bytes((campaign_files / "out" / names[-1]).read_bytes(), policy=policy.default)
+    assert last["To"] == "user9@example.com"
+    assert last.get_body(preferencelist=("html",)).get_content().rstrip().endswith("hi User 9")
+
+
+def test_dry_run_needs_no_credentials_and_reports_rejected(campaign_files, capsys):
+    assert run_dry() == 0
+
+    out = capsys.readouterr().out
+    assert "1 invalid, 1 duplicate" in out
+    (output,) = os.listdir(campaign_files / "data" / "dry-run")
+    assert output.endswith(".mbox")
+    assert os.listdir(campaign_files / "data" / "reports")[0].endswith("-rejected.csv")
+
+
+def test_sending_without_credentials_fails(campaign_files, capsys):
+    assert main_module.main(["--template", "template.html", "--recipients", "recipients.csv"]) == 1
+    assert "GMAIL_USER and GMAIL_APP_PASSWORD must be set" in capsys.readouterr().out
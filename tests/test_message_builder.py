@@ -0,0 +1,88 @@
+import email
+from email import policy
+
+import pytest
+
+from pathra_preshana.assets import encode_asset
+from pathra_preshana.message_builder import MessageBuilder, fold_header
+from pathra_preshana.templating import CompiledTemplate
+
+
+def parse(message: bytes):
+    return email.message_from_bytes(message, policy=policy.default)
+
+
+def html_part(message):
+    return message.get_body(preferencelist=("html",))
+
+
+@pytest.mark.parametrize("subject", ["Grüße", "नमस्ते from Pathra", "Plain subject", " ".join(["Überblick"] * 20)])
+def test_subject_round_trips(subject):
+    builder = MessageBuilder("sender@example.com", subject, CompiledTemplate("<p>Hi</p>"))
+
+    _, message = builder.build({"email": "ann@example.com", "name": "Ann"})
+
+    assert parse(message)["Subject"] == subject
+    assert all(len(line) <= 998 for line in message.split(b"\r\n"))
+
+
+def test_fold_header_encodes_non_ascii():
+    assert fold_header("Subject", "Grüße") == b"Subject: =?utf-8?q?Gr=C3=BC=C3=9Fe?=\r\n"
+    assert fold_header("Subject", "Hello") == b"Subject: Hello\r\n"
+
+
+def test_personalized_body_round_trips():
+    template = CompiledTemplate("<p>Namaste {name} – " + "x" * 200 + " {city}</p>")
+    builder = MessageBuilder("sender@example.com", "Hi", template)
+
+    recipients, message = builder.build({"email": "ann@example.com", "name": "Anaïs", "city": "Pune = 1"})
+
+    parsed = parse(message)
+    assert recipients == ["ann@example.com"]
+    assert parsed["To"] == "ann@example.com"
+    assert parsed["From"] == "sender@example.com"
+    assert html_part(parsed).get_content() == template.render({"name": "Anaïs", "city": "Pune = 1"})
+
+
+def test_message_ids_are_unique():
+    builder = MessageBuilder("sender@example.com", "Hi", CompiledTemplate("<p>{name}</p>"))
+    ids = {parse(builder.build({"email": f"u{i}@example.com", "name": "U"})[1])["Message-ID"] for i in range(3)}
+    assert len(ids) == 3
+
+
+def test_inline_images_and_attachments(tmp_path):
+    image = tmp_path / "logo.png"
+    image.write_bytes(b"\x89PNG fake image")
+    brochure = tmp_path / "brochure.pdf"
+    brochure.write_bytes(b"%PDF-1.4 fake" * 50)
+    assets = [encode_asset(str(image), "logo.png"), encode_asset(str(brochure))]
+    builder = MessageBuilder("sender@example.com", "Grüße", CompiledTemplate('<img src="cid:logo.png"> {name}'),
+                             assets)
+
+    parsed = parse(builder.build({"email": "ann@example.com", "name": "Ann"})[1])
+
+    assert parsed.get_content_type() == "multipart/mixed"
+    assert html_part(parsed).get_content() == '<img src="cid:logo.png"> Ann'
+    parts = {part.get_filename(): part for part in parsed.walk() if part.get_filename()}
+    assert parts["logo.png"]["Content-ID"] == "<logo.png>"
+    assert parts["logo.png"].get_content() == b"\x89PNG fake image"
+    assert parts["brochure.pdf"].get_content() == b"%PDF-1.4 fake" * 50
+    assert parts["brochure.pdf"].get_content_disposition() == "attachment"
+
+
+def test_shared_message_hides_recipients():
+    builder = MessageBuilder("sender@example.com", "Grüße", CompiledTemplate("<p>Same for everyone</p>"))
+
+    recipients, message = builder.build_shared([{"email": "a@example.com"}, {"email": "b@example.com"}])
+
+    parsed = parse(message)
+    assert recipients == ["a@example.com", "b@example.com"]
+    assert b"a@example.com" not in message
+    assert parsed["Subject"] == "Grüße"
+    assert html_part(parsed).get_content() == "<p>Same for everyone</p>"
+
+
+def test_shared_message_needs_a_static_template():
+    builder = MessageBuilder("sender@example.com", "Hi", CompiledTemplate("<p>{name}</p>"))
+    with pytest.raises(ValueError):
+        builder.build_shared([{"email": "a@example.com", "name": "A"}])
@@ -0,0 +1,65 @@
+from pathra_preshana import metrics
+from pathra_preshana.email_sender import EmailSender
+from pathra_preshana.metrics import MetricsRegistry
+
+
+def test_counters_render_with_their_labels():
+    registry = MetricsRegistry()
+    plain = registry.counter("sent_total", "Sent")
+    failed = registry.counter("failed_total", "Failed", labels=("code",))
+
+    failed.inc(1, "451")
+    failed.inc(2, "550")
+    failed.inc(1, "451")
+
+    assert plain.value() == 0 and failed.value("451") == 2
+    lines = registry.render().splitlines()
+    assert lines == [
+        "# HELP sent_total Sent", "# TYPE sent_total counter", "sent_total 0",
+        "# HELP failed_total Failed", "# TYPE failed_total counter",
+        'failed_total{code="451"} 2', 'failed_total{code="550"} 2',
+    ]
+
+
+def test_histogram_buckets_are_cumulative():
+    registry = MetricsRegistry()
+    histogram = registry.histogram("phase_seconds", "Phases", labels=("phase",), buckets=(0.1, 1.0))
+
+    for value in (0.05, 0.5, 0.5, 3.0):
+        histogram.observe(value, "data")
+
+    assert histogram.count("data") == 4 and histogram.count("rset") == 0
+    lines = registry.render().splitlines()
+    assert 'phase_seconds_bucket{phase="data",le="0.1"} 1' in lines
+    assert 'phase_seconds_bucket{phase="data",le="1.0"} 3' in lines
+    assert 'phase_seconds_bucket{phase="data",le="+Inf"} 4' in lines
+    assert 'phase_seconds_sum{phase="data"} 4.05' in lines
+    assert 'phase_seconds_count{phase="data"} 4' in lines
+
+
+def test_label_values_are_escaped_and_gauges_read_at_render():
+    registry = MetricsRegistry()
+    registry.counter("errors_total", "Errors", labels=("reason",)).inc(1, 'bad "quote"\n')
+    value = {"now": 1}
+    registry.gauge("queued", "Queued", lambda: value["now"])
+    value["now"] = 5
+
+    lines = registry.render().splitlines()
+    assert 'errors_total{reason="bad \\"quote\\"\\n"} 1' in lines
+    assert "queued 5" in lines
+
+
+def test_registering_a_name_twice_returns_the_first_metric():
+    registry = MetricsRegistry()
+
+    assert registry.counter("sent_total", "Sent") is registry.counter("sent_total", "Sent again")
+
+
+def test_sends_are_counted(smtp_sink, sender_env):
+    before = (metrics.messages_sent.value(), metrics.sessions_opened.value())
+    EmailSender("127.0.0.1", smtp_sink.port).send_bulk_emails(
+        [{"email": f"u{i}@example.com", "name": ""} for i in range(3)], "Hi", "<p>Hello {email}</p>"
+    )
+
+    assert metrics.messages_sent.value() - before[0] == 3
+    assert metrics.sessions_opened.value() - before[1] == 1
@@ -0,0 +1,63 @@
+import pytest
+
+from pathra_preshana import rate_limit
+from pathra_preshana.email_sender import EmailSender
+from pathra_preshana.rate_limit import RateLimiter
+
+
+class Clock:
+    def __init__(self):
+        self.now = 1_000_000.0
+
+    def __call__(self):
+        return self.now
+
+
+@pytest.fixture
+def clock(monkeypatch):
+    clock = Clock()
+    monkeypatch.setattr(rate_limit.time, "monotonic", clock)
+    return clock
+
+
+def test_daily_quota_is_a_rolling_window(clock):
+    limiter = RateLimiter(per_day=3)
+
+    assert limiter.reserve() == 0.0
+    clock.now += 12 * 3600
+    assert limiter.reserve(2) == 0.0
+    assert limiter.reserve() is None
+    assert limiter.remaining_today() == 0
+
+    # Only the first send has left the last 24 hours
+    clock.now += 12 * 3600 + 120
+    assert limiter.remaining_today() == 1
+    assert limiter.reserve() == 0.0
+    assert limiter.reserve() is None
+
+    clock.now += 12 * 3600
+    assert limiter.remaining_today() == 2
+
+
+def test_per_second_rate_paces_sends(clock):
+    limiter = RateLimiter(per_second=2)
+
+    waits = [limiter.reserve() for _ in range(4)]
+
+    assert waits == [0.0, 0.0, 0.5, 1.0]
+
+
+def test_zero_disables_a_limit(clock):
+    limiter = RateLimiter(per_second=0, per_day=0)
+
+    assert [limiter.reserve() for _ in range(100)] == [0.0] * 100
+    assert limiter.remaining_today() is None
+
+
+def test_explicit_zero_overrides_the_environment(sender_env, monkeypatch):
+    monkeypatch.setenv("SMTP_RATE_PER_SECOND", "5")
+    monkeypatch.setenv("SMTP_RATE_PER_DAY", "100")
+
+    assert EmailSender().rate_limiter.per_day == 100
+    unlimited = EmailSender(rate_per_second=0, rate_per_day=0).rate_limiter
+    assert unlimited.per_second is None and unlimited.per_day is None
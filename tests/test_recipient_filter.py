@@ -0,0 +1,74 @@
+import io
+import pickle
+
+from pathra_preshana import recipient_filter
+from pathra_preshana.file_reader import FileReader
+from pathra_preshana.recipient_filter import RecipientValidator, SeenAddresses, SourceRow
+
+
+def test_seen_addresses_stay_exact_after_spilling_to_disk():
+    seen = SeenAddresses(memory_limit=100)
+    expected = set()
+
+    for number in list(range(3000)) + list(range(0, 3000, 7)) + list(range(2990, 3100)):
+        address = f"user{number}@example.com"
+        assert seen.add(address) == (address not in expected)
+        expected.add(address)
+
+    assert len(seen) == len(expected) == 3100
+    assert seen._memory is None
+    seen.close()
+
+
+def test_rejection_report_names_csv_lines(tmp_path):
+    path = tmp_path / "recipients.csv"
+    path.write_text(
+        "name,email,note\n"
+        "Ann,ann@example.com,\"spans\ntwo lines\"\n"
+        "Bad,not-an-address,\n"
+        "Ann again,ANN@example.com,\n"
+        "Bob,bob@example.com,\n",
+        encoding="utf-8",
+    )
+
+    for recipients in (FileReader.iter_csv_recipients(str(path)),
+                       FileReader.select_csv_recipients(str(path), offset=0)):
+        validator = RecipientValidator()
+        accepted = [recipient["email"] for recipient in validator.filter(recipients)]
+        report = io.StringIO()
+        validator.write_report(report)
+
+        assert accepted == ["ann@example.com", "bob@example.com"]
+        assert report.getvalue().splitlines() == [
+            "line,email,reason",
+            "4,not-an-address,invalid",
+            "5,ANN@example.com,duplicate",
+        ]
+
+
+def test_rejections_without_lines_report_positions():
+    validator = RecipientValidator()
+    recipients = [{"email": "a@example.com"}, {"email": "a@example.com"}, {"email": "b@example.com"}]
+
+    list(validator.filter(recipients, duplicates={2}))
+
+    assert validator.report == [{"line": "2", "email": "a@example.com", "reason": "duplicate"},
+                                {"line": "3", "email": "b@example.com", "reason": "duplicate"}]
+    assert validator.summary() == {"accepted": 1, "invalid": 0, "duplicate": 2}
+
+
+def test_source_rows_pickle_with_their_line():
+    row = pickle.loads(pickle.dumps(SourceRow({"email": "a@example.com"}, 7)))
+    assert row == {"email": "a@example.com"} and row.line == 7
+
+
+def test_addresses_sharing_a_fingerprint_are_not_duplicates(monkeypatch):
+    # Every address gets the same fingerprint
+    monkeypatch.setattr(recipient_filter, "_FINGERPRINT_MASK", 0)
+    seen = SeenAddresses(memory_limit=10)
+
+    addresses = [f"user{number}@example.com" for number in range(50)]
+    assert all(seen.add(address) for address in addresses)
+    assert not any(seen.add(address) for address in addresses)
+    assert len(seen) == 50
+    seen.close()
@@ -0,0 +1,81 @@
+import os
+import sqlite3
+
+import pytest
+
+from pathra_preshana.recipient_filter import SourceRow
+from pathra_preshana.recipient_store import RecipientStore
+
+
+@pytest.fixture
+def store(tmp_path):
+    csv_path = tmp_path / "recipients.csv"
+    csv_path.write_text("placeholder\n", encoding="utf-8")
+    recipients = [
+        SourceRow({"email": f"u{i}@example.com", "name": f"User {i}", "city": "Pune" if i % 3 == 0 else "Goa"},
+                  line=i + 2)
+        for i in range(10)
+    ]
+    return RecipientStore.build(str(csv_path), ["email", "name", "city"], recipients)
+
+
+def emails(rows):
+    return [row["email"] for row in rows]
+
+
+def test_store_is_reopened_while_its_csv_is_unchanged(store):
+    reopened = RecipientStore.open(store.csv_path)
+
+    assert reopened.columns == ["email", "name", "city"]
+    assert reopened.count == 10
+
+
+def test_store_of_a_changed_csv_is_not_used(store):
+    with open(store.csv_path, "a", encoding="utf-8") as file:
+        file.write("more\n")
+
+    assert RecipientStore.open(store.csv_path) is None
+
+
+def test_missing_or_broken_store_is_not_used(tmp_path, store):
+    other = tmp_path / "other.csv"
+    other.write_text("x\n", encoding="utf-8")
+    assert RecipientStore.open(str(other)) is None
+
+    with open(store.path, "wb") as file:
+        file.write(b"not a database")
+    assert RecipientStore.open(store.csv_path) is None
+
+
+def test_slices_keep_file_order_and_line_numbers(store):
+    rows = list(store.select(offset=3, limit=4))
+
+    assert emails(rows) == ["u3@example.com", "u4@example.com", "u5@example.com", "u6@example.com"]
+    assert [row.line for row in rows] == [5, 6, 7, 8]
+    assert emails(store.select(offset=8)) == ["u8@example.com", "u9@example.com"]
+
+
+def test_segments_are_filtered_counted_and_indexed(store):
+    assert store.count_matching() == 10
+    assert store.count_matching({"city": "Pune"}) == 4
+    assert emails(store.select({"city": "Pune"}, offset=1, limit=2)) == ["u3@example.com", "u6@example.com"]
+    # Values are compared trimmed
+    assert store.count_matching({"city": " Goa "}) == 6
+
+    with sqlite3.connect(store.path) as conn:
+        indexes = [name for name, in conn.execute("SELECT name FROM sqlite_master WHERE type = 'index' "
+                                                  "AND name LIKE 'idx_%'")]
+    assert indexes == ["idx_c2"]
+
+
+def test_filter_on_unknown_column_is_rejected(store):
+    with pytest.raises(ValueError, match="country"):
+        store.count_matching({"country": "IN"})
+
+
+def test_rebuild_replaces_the_store_without_leftovers(tmp_path, store):
+    rebuilt = RecipientStore.build(store.csv_path, ["email"], [{"email": "only@example.com"}])
+
+    assert emails(rebuilt.select()) == ["only@example.com"]
+    assert RecipientStore.open(store.csv_path).count == 1
+    assert not [name for name in os.listdir(tmp_path) if name.endswith(".tmp")]
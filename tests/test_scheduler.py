@@ -0,0 +1,231 @@
+import sqlite3
+import threading
+import time
+from datetime import datetime
+
+import pytest
+
+from pathra_preshana import scheduler
+from pathra_preshana.jobs import JobManager
+from pathra_preshana.scheduler import CampaignQueue, CampaignScheduler, in_window, parse_window
+
+
+def wait_for(condition, timeout=5.0):
+    deadline = time.monotonic() + timeout
+    while not condition():
+        assert time.monotonic() < deadline, "timed out"
+        time.sleep(0.01)
+
+
+def test_parse_window():
+    assert parse_window("09:00-17:30") == (540, 1050)
+    assert parse_window("22:00-06:00") == (1320, 360)
+    assert parse_window("") is None and parse_window(None) is None
+
+
+@pytest.mark.parametrize("value", ["9-5", "09:00", "09:00-09:00", "25:00-26:00", 900, ["09:00-17:00"]])
+def test_parse_window_rejects_invalid_windows(value):
+    with pytest.raises(ValueError):
+        parse_window(value)
+
+
+def test_in_window():
+    assert in_window(None)
+    assert in_window((540, 1050), datetime(2026, 1, 1, 9, 0))
+    assert not in_window((540, 1050), datetime(2026, 1, 1, 17, 30))
+    # Wrapping past midnight
+    assert in_window((1320, 360), datetime(2026, 1, 1, 23, 15))
+    assert in_window((1320, 360), datetime(2026, 1, 1, 5, 59))
+    assert not in_window((1320, 360), datetime(2026, 1, 1, 12, 0))
+
+
+@pytest.fixture
+def campaign_scheduler(tmp_path):
+    runs = []
+    release = threading.Event()
+
+    def runner(spec, job, share_limiter):
+        runs.append(dict(spec))
+        # Send until released or stopped
+        while not release.is_set() and not job.cancel_event.is_set():
+            time.sleep(0.01)
+        return {"success": 0, "failed": 0}
+
+    queue = CampaignQueue(str(tmp_path / "campaigns.db"))
+    instance = CampaignScheduler(JobManager(max_workers=2), runner, queue=queue)
+    instance.runs, instance.release = runs, release
+    yield instance
+    release.set()
+    queue.close()
+
+
+def test_submit_rejects_invalid_priority_and_window(campaign_scheduler):
+    with pytest.raises(ValueError):
+        campaign_scheduler.submit({}, 1, priority="urgent")
+    with pytest.raises(ValueError):
+        campaign_scheduler.submit({}, 1, priority=["high"])
+    with pytest.raises(ValueError):
+        campaign_scheduler.submit({}, 1, window=900)
+
+
+def test_campaign_waits_for_pauses_at_and_resumes_with_its_window(campaign_scheduler, monkeypatch):
+    window = {"open": False}
+    monkeypatch.setattr(scheduler, "in_window", lambda parsed, now=None: parsed is None or window["open"])
+
+    job = campaign_scheduler.submit({"campaign_id": "c1", "resume": False}, 10, owner="a@example.com",
+                                    window="09:00-17:00")
+    time.sleep(0.2)
+    assert job.status == "queued" and not campaign_scheduler.runs
+
+    window["open"] = True
+    campaign_scheduler._wake.set()
+    wait_for(lambda: job.status == "running")
+
+    # Closing the window stops the send and returns it to the queue
+    window["open"] = False
+    campaign_scheduler._wake.set()
+    wait_for(lambda: job.status == "paused")
+    assert campaign_scheduler.queue.active()[0]["status"] == "paused"
+
+    window["open"] = True
+    campaign_scheduler._wake.set()
+    wait_for(lambda: len(campaign_scheduler.runs) == 2)
+    # The second run skips recipients the first one sent
+    assert campaign_scheduler.runs[1]["resume"] is True
+
+    campaign_scheduler.release.set()
+    wait_for(lambda: job.status == "completed")
+
+
+class SlowFirstLimiter:
+    """Account limiter whose first reservation has to wait a second"""
+
+    per_day = None
+
+    def __init__(self):
+        self.waits = [1.0]
+
+    def reserve(self, count):
+        return self.waits.pop() if self.waits else 0.0
+
+
+def test_waiting_out_the_rate_does_not_hold_up_other_campaigns():
+    share = scheduler.FairShare()
+    inner = SlowFirstLimiter()
+    share.join("slow", "a@example.com")
+    share.join("quick", "b@example.com")
+    slow = threading.Thread(target=share.acquire, args=("slow", 1, inner, threading.Event()))
+    slow.start()
+    wait_for(lambda: not inner.waits)
+
+    started = time.monotonic()
+    assert share.acquire("quick", 1, inner, threading.Event())
+    assert time.monotonic() - started < 0.5
+    slow.join()
+
+
+def test_waiting_campaign_takes_the_slot_of_a_user_with_more_running(tmp_path, monkeypatch):
+    monkeypatch.setattr(scheduler, "CAMPAIGN_TIME_SLICE", 0.3)
+    runs = []
+    release = threading.Event()
+
+    def runner(spec, job, share_limiter):
+        runs.append((spec["campaign_id"], spec["resume"]))
+        while not spec.get("small") and not release.is_set() and not job.cancel_event.is_set():
+            time.sleep(0.01)
+        return {"success": 0, "failed": 0}
+
+    queue = CampaignQueue(str(tmp_path / "campaigns.db"))
+    instance = CampaignScheduler(JobManager(max_workers=1), runner, queue=queue)
+    try:
+        large = instance.submit({"campaign_id": "large", "resume": False}, 100000, owner="a@example.com")
+        wait_for(lambda: large.status == "running")
+        # The same user's next campaign waits its turn
+        second = instance.submit({"campaign_id": "second", "resume": False}, 10, owner="a@example.com")
+        time.sleep(0.4)
+        assert large.status == "running" and second.status == "queued"
+        assert instance.cancel(second.job_id)
+
+        # Another user's campaign pauses the large one and goes first
+        small = instance.submit({"campaign_id": "small", "resume": False, "small": True}, 10,
+                                owner="b@example.com")
+        wait_for(lambda: small.status == "completed")
+        wait_for(lambda: len(runs) == 3)
+        assert runs == [("large", False), ("small", False), ("large", True)]
+
+        release.set()
+        wait_for(lambda: large.status == "completed")
+    finally:
+        release.set()
+        queue.close()
+
+
+def test_processes_resume_only_campaigns_whose_claim_expired(tmp_path, monkeypatch):
+    monkeypatch.setattr(scheduler, "CAMPAIGN_LEASE_TIMEOUT", 0.5)
+    path = str(tmp_path / "campaigns.db")
+    release = threading.Event()
+
+    def make(worker):
+        runs = []
+
+        def runner(spec, job, share_limiter):
+            runs.append(dict(spec))
+            while not release.is_set() and not job.cancel_event.is_set():
+                time.sleep(0.01)
+            return {"success": 0, "failed": 0}
+
+        instance = CampaignScheduler(JobManager(max_workers=2), runner, queue=CampaignQueue(path), worker=worker)
+        instance.runs = runs
+        return instance
+
+    first, second = make("web-1"), make("web-2")
+    try:
+        job = first.submit({"campaign_id": "c1", "resume": False}, 10, owner="a@example.com")
+        wait_for(lambda: job.status == "running")
+
+        # Another process starting up leaves a campaign it does not hold alone
+        second.start()
+        time.sleep(0.2)
+        assert not second.runs and not second._entries
+
+        # The first process stops renewing its claim: the second takes over
+        time.sleep(0.5)
+        second._wake.set()
+        wait_for(lambda: len(second.runs) == 1)
+        assert second.runs[0]["resume"] is True
+
+        # The first one notices, stops sending and leaves the row alone
+        first._wake.set()
+        wait_for(lambda: job.status == "cancelled")
+        time.sleep(0.1)
+        [row] = second.queue.active()
+        assert row["status"] == "running"
+
+        release.set()
+        wait_for(lambda: not second.queue.active())
+    finally:
+        release.set()
+        first.queue.close()
+        second.queue.close()
+
+
+def test_queue_created_before_claims_gains_lease_columns(tmp_path):
+    path = str(tmp_path / "campaigns.db")
+    conn = sqlite3.connect(path)
+    conn.execute(
+        "CREATE TABLE campaigns (job_id TEXT PRIMARY KEY, owner TEXT, priority TEXT NOT NULL, send_window TEXT, "
+        "total INTEGER NOT NULL, spec TEXT NOT NULL, status TEXT NOT NULL, created_at REAL NOT NULL, "
+        "updated_at REAL NOT NULL, results TEXT, error TEXT)"
+    )
+    conn.execute("INSERT INTO campaigns VALUES ('j1', NULL, 'normal', NULL, 3, '{}', 'running', 1, 1, NULL, NULL)")
+    conn.commit()
+    conn.close()
+
+    queue = CampaignQueue(path)
+    try:
+        [row] = queue.claim("web-1", 60)
+        assert row["job_id"] == "j1"
+        assert queue.claim("web-2", 60) == []
+        assert queue.renew("web-1", 60) == {"j1"}
+    finally:
+        queue.close()
@@ -0,0 +1,119 @@
+import threading
+import uuid
+
+import pytest
+
+from pathra_preshana.scheduler import FairShare
+from pathra_preshana.sender_pool import PooledEmailSender, SMTPAccount
+
+
+def account(port, name=None, **options):
+    name = name or f"account-{uuid.uuid4().hex[:8]}"
+    return SMTPAccount(name, f"{name}@example.com", "secret", smtp_server="127.0.0.1", smtp_port=port, **options)
+
+
+def send_in_thread(sender, recipients, **options):
+    """Run a bulk send, failing the test instead of hanging if it never ends"""
+    outcome = {}
+    thread = threading.Thread(target=lambda: outcome.update(
+        sender.send_bulk_emails(recipients, "Hi", "<p>Hello {name}</p>", **options)), daemon=True)
+    thread.start()
+    thread.join(20)
+    assert not thread.is_alive(), "the send never finished"
+    return outcome
+
+
+def recipients(count):
+    return [{"email": f"u{number}@example.com", "name": f"User {number}"} for number in range(count)]
+
+
+@pytest.mark.parametrize("max_retries", [0, 2])
+def test_pool_of_unreachable_accounts_fails_instead_of_waiting(sender_env, max_retries):
+    sender = PooledEmailSender([account(1)], workers=1, max_retries=max_retries)
+    results = []
+
+    summary = send_in_thread(sender, recipients(2), on_result=results.append)
+
+    assert summary["success"] == 0 and summary["failed"] == 2
+    assert summary["failures"]["transient"] == 2
+    assert [result["attempts"] for result in results] == [max_retries + 1] * 2
+
+
+def test_unreachable_account_is_left_for_a_reachable_one(smtp_sink, sender_env):
+    dead, live = account(1, "dead"), account(smtp_sink.port, "live")
+    sender = PooledEmailSender([dead, live], workers=2, max_retries=3)
+
+    summary = send_in_thread(sender, recipients(10))
+
+    assert summary["success"] == 10
+    assert summary["accounts"]["live"]["sent"] == 10
+    assert len(smtp_sink.messages) == 10
+
+
+def test_sends_are_spread_over_accounts(smtp_sink, sender_env):
+    accounts = [account(smtp_sink.port, f"relay-{number}", connections=2) for number in range(2)]
+    sender = PooledEmailSender(accounts, max_retries=0)
+    results = []
+
+    summary = send_in_thread(sender, recipients(40), on_result=results.append)
+
+    assert summary["success"] == 40
+    assert all(summary["accounts"][name]["sent"] for name in ("relay-0", "relay-1"))
+    assert {result["account"] for result in results} == {"relay-0", "relay-1"}
+
+
+def test_accounts_over_quota_fail_the_rest_as_quota(smtp_sink, sender_env):
+    accounts = [account(smtp_sink.port, rate_per_day=3), account(smtp_sink.port, rate_per_day=2)]
+    sender = PooledEmailSender(accounts, workers=1, max_retries=0)
+
+    summary = send_in_thread(sender, recipients(8))
+
+    assert summary["success"] == 5
+    assert summary["failures"]["quota"] == 3
+
+
+class CountingLimiter:
+    """Wrapper recording the turns taken at an account's limiter"""
+
+    def __init__(self, inner):
+        self.inner = inner
+        self.acquired = 0
+
+    def acquire(self, count=1):
+        self.acquired += count
+        return self.inner.acquire(count)
+
+    def succeeded(self):
+        self.inner.succeeded()
+
+    def throttled(self):
+        self.inner.throttled()
+
+    def remaining_today(self):
+        return self.inner.remaining_today()
+
+
+def test_every_account_is_paced_through_the_shared_limiter(smtp_sink, sender_env):
+    accounts = [account(smtp_sink.port, f"relay-{number}", connections=2) for number in range(2)]
+    sender = PooledEmailSender(accounts, max_retries=0)
+    wrappers = []
+    sender.share_rate_limiter(lambda inner: wrappers.append(CountingLimiter(inner)) or wrappers[-1])
+
+    summary = send_in_thread(sender, recipients(20))
+
+    assert summary["success"] == 20
+    assert len(wrappers) == 2
+    assert sum(wrapper.acquired for wrapper in wrappers) == 20
+    assert all(wrapper.acquired for wrapper in wrappers)
+
+
+def test_pooled_campaign_takes_turns_through_a_fair_share(smtp_sink, sender_env):
+    share = FairShare()
+    share.join("job", "owner@example.com")
+    sender = PooledEmailSender([account(smtp_sink.port, connections=2)], max_retries=0)
+    sender.share_rate_limiter(lambda inner: share.limiter("job", inner, threading.Event()))
+
+    summary = send_in_thread(sender, recipients(10))
+
+    assert summary["success"] == 10
+    share.leave("job")
@@ -0,0 +1,63 @@
+import pytest
+
+from pathra_preshana.rate_limit import RateLimiter
+from pathra_preshana.scheduler import FairShare
+from pathra_preshana.shared_rate_limit import SharedRateLimiter
+
+
+@pytest.fixture
+def processes(tmp_path):
+    """Two processes' limiters for one account, sharing a database"""
+    made = []
+
+    def make(**limits):
+        pair = [SharedRateLimiter(RateLimiter(key="sender@example.com", **limits), str(tmp_path / "queue.db"))
+                for _ in range(2)]
+        made.extend(pair)
+        return pair
+
+    yield make
+    for limiter in made:
+        limiter.close()
+
+
+def test_daily_quota_holds_across_processes(processes):
+    first, second = processes(per_day=5)
+
+    # Waits, for the pacing of the quota over the day, but is counted
+    assert first.reserve(3) is not None
+    assert second.reserve(3) is None
+    assert second.reserve(2) is not None
+    assert first.remaining_today() == second.remaining_today() == 0
+    assert not first.acquire()
+
+
+def test_rate_holds_across_processes(processes):
+    first, second = processes(per_second=2)
+
+    waits = [limiter.reserve() for limiter in (first, second) * 3]
+
+    # One burst of two, then a slot every half second whichever process asks
+    assert waits == pytest.approx([0.0, 0.0, 0.5, 1.0, 1.5, 2.0], abs=0.05)
+
+
+def test_quota_is_paced_across_processes_and_not_again_by_fair_share(processes):
+    # A burst of 1/24 of the quota, then one message every half hour
+    first, second = processes(per_day=48)
+
+    assert [first.reserve(), second.reserve()] == [0.0, 0.0]
+    assert second.reserve() == pytest.approx(1800, abs=1)
+    assert FairShare()._pace(first, 1) == 0.0
+
+
+def test_accounts_do_not_share_limits(tmp_path):
+    path = str(tmp_path / "queue.db")
+    first = SharedRateLimiter(RateLimiter(per_day=1, key="a@example.com"), path)
+    second = SharedRateLimiter(RateLimiter(per_day=1, key="b@example.com"), path)
+    try:
+        assert first.reserve() == 0.0
+        assert second.reserve() == 0.0
+        assert first.reserve() is None
+    finally:
+        first.close()
+        second.close()
@@ -0,0 +1,55 @@
+import smtplib
+
+import pytest
+
+from benchmarks.smtp_sink import SMTPSink
+from pathra_preshana.smtp_session import SMTPSession, smtp_error_code
+
+
+def send(session, count, start=0):
+    for i in range(start, start + count):
+        session.sendmail("sender@example.com", [f"u{i}@example.com"], f"Subject: {i}\r\n\r\nHi\r\n".encode())
+
+
+def test_one_login_is_reused_for_many_messages(smtp_sink):
+    with SMTPSession("127.0.0.1", smtp_sink.port, "user", "secret") as session:
+        send(session, 5)
+
+    assert session.sessions_opened == 1
+    assert smtp_sink.stats.snapshot()["logins"] == 1
+    assert len(smtp_sink.messages) == 5
+
+
+def test_connection_is_recycled_after_its_message_cap(smtp_sink):
+    with SMTPSession("127.0.0.1", smtp_sink.port, "user", "secret", max_messages_per_connection=2) as session:
+        send(session, 5)
+
+    assert session.sessions_opened == 3
+    assert smtp_sink.stats.snapshot()["connections"] == 3
+    assert len(smtp_sink.messages) == 5
+
+
+def test_reconnects_when_the_server_hung_up_between_messages():
+    with SMTPSink(keep_messages=True, max_messages_per_connection=2) as sink:
+        with SMTPSession("127.0.0.1", sink.port, "user", "secret") as session:
+            send(session, 5)
+
+        assert session.sessions_opened == 3
+        assert len(sink.messages) == 5
+
+
+def test_hang_up_after_data_is_not_sent_again():
+    with SMTPSink(keep_messages=True, error_rate=1.0, error_phase="drop") as sink:
+        with SMTPSession("127.0.0.1", sink.port, "user", "secret") as session:
+            with pytest.raises(smtplib.SMTPServerDisconnected) as error:
+                send(session, 1)
+
+            assert smtp_error_code(error.value) == "disconnect"
+            assert len(sink.messages) == 1
+
+            # The session recovers for the next message
+            sink.error_rate = 0
+            send(session, 1, start=1)
+
+        assert len(sink.messages) == 2
+        assert session.sessions_opened == 2
@@ -0,0 +1,81 @@
+import time
+
+import pytest
+
+from pathra_preshana.task_queue import MAX_TASK_ATTEMPTS, TaskQueue
+
+
+@pytest.fixture
+def task_queue(tmp_path):
+    task_queue = TaskQueue(str(tmp_path / "queue.db"))
+    yield task_queue
+    task_queue.close()
+
+
+def expire(seconds=0.1):
+    time.sleep(seconds)
+
+
+def test_expired_lease_is_taken_over(task_queue):
+    task_queue.put("job", "owner@example.com", "normal", [{"chunk": 0}])
+
+    first = task_queue.lease("w1", visibility_timeout=0.05)
+    assert first.spec == {"chunk": 0} and first.attempts == 1
+    assert task_queue.lease("w2", visibility_timeout=60) is None
+
+    expire()
+    second = task_queue.lease("w2", visibility_timeout=60)
+    assert second.task_id == first.task_id and second.attempts == 2
+
+    # The first worker lost its lease: it must stop and cannot settle the task
+    assert not task_queue.renew(first, "w1", 60)
+    task_queue.finish(first, "w1", "done")
+    assert task_queue.job_tasks("job")[0]["status"] == "leased"
+
+    assert task_queue.renew(second, "w2", 60, progress={"sent": 3})
+    assert task_queue.job_tasks("job")[0]["progress"] == {"sent": 3}
+    task_queue.finish(second, "w2", "done", results={"success": 3})
+    assert task_queue.job_tasks("job")[0]["status"] == "done"
+    assert not task_queue.has_unfinished("job")
+
+
+def test_live_lease_is_not_handed_out_twice(task_queue):
+    task_queue.put("job", None, "normal", [{"chunk": 0}])
+
+    assert task_queue.lease("w1", visibility_timeout=60) is not None
+    assert task_queue.lease("w2", visibility_timeout=60) is None
+
+
+def test_task_lost_too_often_is_failed(task_queue):
+    task_queue.put("job", None, "normal", [{"chunk": 0}])
+
+    for attempt in range(1, MAX_TASK_ATTEMPTS + 1):
+        task = task_queue.lease(f"w{attempt}", visibility_timeout=0.05)
+        assert task.attempts == attempt
+        expire()
+
+    assert task_queue.lease("w0", visibility_timeout=60) is None
+    assert task_queue.job_tasks("job")[0]["status"] == "failed"
+    assert task_queue.job_tasks("job")[0]["error"]
+
+
+def test_cancel_drops_queued_tasks_and_stops_leased_ones(task_queue):
+    task_queue.put("job", None, "normal", [{"chunk": 0}, {"chunk": 1}])
+    leased = task_queue.lease("w1", visibility_timeout=60)
+
+    task_queue.cancel("job")
+
+    assert not task_queue.renew(leased, "w1", 60)
+    task_queue.finish(leased, "w1", "queued")
+    assert [task["status"] for task in task_queue.job_tasks("job")] == ["cancelled", "cancelled"]
+    assert task_queue.lease("w2", visibility_timeout=60) is None
+
+
+def test_fewest_tasks_in_flight_then_priority_go_first(task_queue):
+    task_queue.put("a", "ann@example.com", "normal", [{"chunk": 0}, {"chunk": 1}])
+    task_queue.put("b", "bob@example.com", "low", [{"chunk": 0}])
+    task_queue.put("c", "ann@example.com", "high", [{"chunk": 0}])
+
+    order = [task_queue.lease(f"w{i}", visibility_timeout=60).job_id for i in range(4)]
+
+    assert order == ["c", "b", "a", "a"]
@@ -0,0 +1,58 @@
+import pytest
+
+from pathra_preshana.templating import CompiledTemplate, compile_template
+
+
+def test_render_fills_every_placeholder():
+    template = CompiledTemplate("<p>Hi {name}, welcome to {company}. Bye {name}</p>")
+
+    assert template.fields == ["name", "company"]
+    assert template.render({"name": "Ann", "company": "Acme"}) == "<p>Hi Ann, welcome to Acme. Bye Ann</p>"
+    assert template.segments == ["<p>Hi ", ", welcome to ", ". Bye ", "</p>"]
+    assert template.slot_fields == ["name", "company", "name"]
+
+
+def test_css_braces_are_not_placeholders():
+    template = CompiledTemplate("<style>body { margin: 0; } p {color:red}</style>{name}")
+
+    assert template.fields == ["name"]
+    assert template.render({"name": "Ann"}) == "<style>body { margin: 0; } p {color:red}</style>Ann"
+
+
+def test_values_are_escaped_when_asked():
+    values = {"name": "<b>Ann</b> & co"}
+
+    assert CompiledTemplate("{name}").render(values) == "<b>Ann</b> & co"
+    assert CompiledTemplate("{name}", escape=True).render(values) == "&lt;b&gt;Ann&lt;/b&gt; &amp; co"
+
+
+def test_empty_values_render_as_nothing():
+    assert CompiledTemplate("Hi {name}!").render({"name": None}) == "Hi !"
+
+
+def test_missing_field_is_a_value_error():
+    with pytest.raises(ValueError, match="company"):
+        CompiledTemplate("{company}").render({"name": "Ann"})
+
+
+def test_validate_names_unknown_fields():
+    template = CompiledTemplate("{name} at {company} in {city}")
+
+    template.validate(["name", "company", "city", "email"])
+    with pytest.raises(ValueError, match=r"\{company\}, \{city\}"):
+        template.validate(["name", "email"])
+
+
+def test_static_and_literal_templates():
+    static = CompiledTemplate("<p>Same for everyone</p>")
+    literal = CompiledTemplate.literal("Already {rendered}")
+
+    assert static.is_static and static.render({}) == "<p>Same for everyone</p>"
+    assert literal.is_static and literal.render({}) == "Already {rendered}"
+
+
+def test_compile_template_accepts_compiled_templates():
+    template = CompiledTemplate("{name}")
+
+    assert compile_template(template) is template
+    assert compile_template("{name}", escape=True).render({"name": "<"}) == "&lt;"
@@ -0,0 +1,38 @@
+import email
+import os
+import threading
+import time
+
+from pathra_preshana import rate_limit, shared_rate_limit
+from pathra_preshana.campaigns import chunk_specs, get_task_queue
+from pathra_preshana.scheduler import FairShare
+from pathra_preshana.worker import run_task
+
+from tests.test_campaigns import campaign_spec, write_campaign
+
+
+def test_workers_share_the_daily_quota(tmp_path, campaign_env, monkeypatch):
+    monkeypatch.setenv("SMTP_RATE_PER_DAY", "100000")
+    monkeypatch.setenv("CAMPAIGN_QUEUE_PATH", str(tmp_path / "queue.db"))
+    path = write_campaign(tmp_path, ["a@example.com", "b@example.com", "c@example.com", "d@example.com"])
+    queue = get_task_queue()
+    # Other workers have left three messages of today's quota
+    limiter = shared_rate_limit.SharedRateLimiter(rate_limit.RateLimiter(key=os.environ["GMAIL_USER"]))
+    limiter._conn.execute("INSERT INTO send_quota VALUES (?, ?, ?)",
+                          (limiter.account, time.time() - 3600, 100000 - 3))
+    limiter.close()
+    queue.put("job1", "ann@example.com", "normal", chunk_specs(campaign_spec(path), 4, chunk_size=2))
+
+    for worker in ("w1", "w2"):
+        # Each task on a fresh process, with nothing remembered in memory
+        monkeypatch.setattr(rate_limit, "_limiters", {})
+        monkeypatch.setattr(shared_rate_limit, "_shared", {})
+        task = queue.lease(worker, visibility_timeout=60)
+        run_task(queue, task, worker, 60, threading.Event(), FairShare())
+
+    assert len(campaign_env.messages) == 3
+    tasks = queue.job_tasks("job1")
+    assert [task["status"] for task in tasks] == ["done", "done"]
+    assert [task["results"]["success"] for task in tasks] == [2, 1]
+    received = sorted(email.message_from_bytes(message)["To"] for message in campaign_env.messages)
+    assert received == ["a@example.com", "b@example.com", "c@example.com"]